@@ -0,0 +1,292 @@
+'''Reproducible throughput benchmarks of the link budget code
+
+Run from the repository root:
+    python benchmarks/benchmark.py -o results.json
+    python benchmarks/benchmark.py --compare results.json
+
+Every benchmark reports a rate (higher is better) measured as the best of several repeats,
+so results are comparable between releases on the same machine.'''
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "code")
+sys.path.insert(0, CODE_DIR)
+
+import numpy as np
+import core
+import engine
+import vectorized as vec
+from acm import simulate_acm_pass
+from batch_io import format_csv_chunk, CsvChunkWriter
+from budget_graph import BudgetGraph
+from ephemeris import margin_vs_date, date_range
+from fastpath import ParsedInput, calculate_link_budget_fast
+from interference import calculate_interference
+from linkbudget import cold_start_budget
+from network import Network, simulate_network
+from optimizer import optimize
+from sensitivity import margin_sensitivity
+from service import BudgetService, latency_targets, load_test, evaluate_scenarios
+from storage import simulate_mission_storage
+from sweep import run_sweep
+
+### REFERENCE SCENARIO ###
+reference_inputs = dict(transmitter_sc_power=10, transmitter_gs_power=400, transmitter_LF=0.8, receiver_LF=0.7,
+                        downlink_freq=8.4, sc_TAR=221/240, antenna_sc_diam=1.0, antenna_gs_diam=10.0, orbit_alt=700,
+                        sc_pointing_offset_angle=0.1, uplink_datarate_req=1000, PL_SW_angle=20, PL_pixel_size=0.5,
+                        PL_bpp=8, PL_duty_cycle=50, PL_downlink_time=6)
+
+def reference_batch(size, seed=0):
+    '''Reference scenario with frequency, diameters and powers varied over size points (fixed seed)'''
+    rng = np.random.default_rng(seed)
+    return dict(reference_inputs,
+                downlink_freq=rng.uniform(1, 30, size),
+                antenna_sc_diam=rng.uniform(0.2, 3, size),
+                antenna_gs_diam=rng.uniform(2, 30, size),
+                transmitter_sc_power=rng.uniform(1, 100, size))
+
+### MEASUREMENT ###
+benchmarks = {}
+# Directory of the files the benchmarks write, removed after the run (see run_benchmarks)
+scratch_dir = None
+
+def benchmark(name, unit):
+    '''Register a function returning (operations, callable) as benchmark name, reported in unit
+
+    A function may return a dictionary as third item, whose entries (e.g. latencies) are added to the result
+    after the runs.'''
+    def register(function):
+        benchmarks[name] = (function, unit)
+        return function
+    return register
+
+def measure(operations, run, repeat=5):
+    '''Best rate [operations/s] of several runs'''
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return operations / best
+
+### CORE FUNCTIONS: SCALAR VS. BATCHED ###
+scalar_calls = 20000
+batch_size = 10**6
+core_function_args = {
+    "val_to_dB": ((1234.5,), lambda b: (b["transmitter_sc_power"],)),
+    "transmitter_gain": ((8.4, 1.0, 0.55), lambda b: (b["downlink_freq"], b["antenna_sc_diam"], 0.55)),
+    "pointing_loss": ((8.4, 1.0, 0.1), lambda b: (b["downlink_freq"], b["antenna_sc_diam"], 0.1)),
+    "space_loss": ((8.4, 700, 6371.0), lambda b: (b["downlink_freq"], 700, 6371.0)),
+    "space_loss_DS": ((8.4, 149.28*10**6, 237.97*10**6, 40), lambda b: (b["downlink_freq"], 149.28*10**6, 237.97*10**6, 40)),
+    "required_data_rate": ((8, 20, 0.5, 700, 50, 6, 1, 398600, 6371.0),
+                           lambda b: (8, 20, 0.5, b["antenna_gs_diam"] * 100, 50, 6, 1, 398600, 6371.0)),
+}
+
+def register_core_benchmarks():
+    for name, (scalar_args, batch_args) in core_function_args.items():
+        def scalar(function=getattr(core, name), args=scalar_args):
+            return scalar_calls, lambda: [function(*args) for _ in range(scalar_calls)]
+        def batched(function=getattr(vec, name), batch_args=batch_args):
+            args = batch_args(reference_batch(batch_size))
+            return batch_size, lambda: function(*args)
+        benchmark(f"core.{name}.scalar", "calls/s")(scalar)
+        benchmark(f"core.{name}.batched", "points/s")(batched)
+
+register_core_benchmarks()
+
+### FULL BUDGET EVALUATION ###
+@benchmark("budget.scalar_engine", "points/s")
+def budget_scalar_engine():
+    inputs = engine.LinkBudgetInput(**reference_inputs)
+    return 2000, lambda: [engine.calculate_link_budget(inputs) for _ in range(2000)]
+
+@benchmark("budget.scalar_fused", "points/s")
+def budget_scalar_fused():
+    inputs = ParsedInput(reference_inputs)
+    return 2000, lambda: [calculate_link_budget_fast(inputs) for _ in range(2000)]
+
+@benchmark("budget.graph_single_input_change", "points/s")
+def budget_graph_update():
+    graph = BudgetGraph(**reference_inputs)
+    powers = [str(p) for p in range(1, 2001)]
+    def run():
+        for power in powers:
+            graph.set(transmitter_sc_power=power)
+            graph.get("M_downlink")
+    return len(powers), run
+
+@benchmark("budget.batched", "points/s")
+def budget_batched():
+    batch = reference_batch(batch_size)
+    return batch_size, lambda: vec.calculate_link_budget_batch(batch)
+
+@benchmark("sensitivity.batched", "points/s")
+def sensitivity_batched():
+    batch = reference_batch(batch_size)
+    return batch_size, lambda: margin_sensitivity(batch)
+
+@benchmark("optimizer.designs", "designs/s")
+def optimizer_designs():
+    return 256 * 50, lambda: optimize(reference_inputs, population=256, generations=50, islands=1, workers=1, seed=0)
+
+@benchmark("acm.pass_steps", "steps/s")
+def acm_pass_steps():
+    return 86400, lambda: simulate_acm_pass(reference_inputs, 86400, step=1.0)
+
+@benchmark("interference.pairs", "pairs/s")
+def interference_pairs():
+    # Co-channel interferers around the reference carriers, few of them pruned
+    rng = np.random.default_rng(0)
+    size = 4096
+    interferers = {"link": np.where(rng.random(size) < 0.5, "uplink", "downlink"),
+                   "power": rng.uniform(1, 100, size), "freq": rng.uniform(7.7, 8.5, size),
+                   "bandwidth": rng.uniform(1e7, 1e9, size), "antenna_diam": rng.uniform(0.5, 5, size),
+                   "distance": rng.uniform(500, 40000, size), "tx_offset_angle": rng.uniform(0, 90, size),
+                   "rx_offset_angle": rng.uniform(0, 90, size)}
+    inputs = {**reference_inputs, "antenna_gs_diam": np.linspace(2, 20, 256)}
+    return 256 * size, lambda: calculate_interference(inputs, interferers)
+
+@benchmark("storage.mission_days", "days/s")
+def storage_mission_days():
+    return 30, lambda: simulate_mission_storage(reference_inputs, 30 * 86400, capacity=64e9, step=10.0)
+
+@benchmark("network.pair_steps", "pair-steps/s")
+def network_pair_steps():
+    rng = np.random.default_rng(0)
+    satellites = {"antenna_sc_diam": rng.uniform(0.3, 2, 300), "orbit_alt": rng.uniform(500, 1200, 300),
+                  "raan": rng.uniform(0, 360, 300), "arg_latitude": rng.uniform(0, 360, 300)}
+    stations = {"antenna_gs_diam": rng.uniform(2, 15, 30), "temp_sys_downlink": rng.uniform(100, 300, 30),
+                "gs_latitude": rng.uniform(-70, 70, 30), "gs_longitude": rng.uniform(-180, 180, 30)}
+    network = Network(reference_inputs, satellites, stations)
+    return 300 * 30 * 360, lambda: simulate_network(network, 3600, step=10.0)
+
+@benchmark("ephemeris.margin_vs_date", "dates/s")
+def ephemeris_margin_vs_date():
+    inputs = dict(reference_inputs, target_body="Mars")
+    dates = date_range("1950-01-01", "2100-01-01")
+    margin_vs_date(inputs, dates[:1])
+    return len(dates), lambda: margin_vs_date(inputs, dates)
+
+### SWEEP AND EXPORT ###
+@benchmark("sweep.per_core", "points/s")
+def sweep_per_core():
+    axes = {"downlink_freq": np.linspace(1, 30, 100), "antenna_gs_diam": np.linspace(1, 30, 100),
+            "modulation_coding": vec.coding_names}
+    points = 100 * 100 * len(vec.coding_names)
+    path = os.path.join(scratch_dir, "sweep.csv")
+    return points, lambda: run_sweep(reference_inputs, axes, path, workers=1)
+
+@benchmark("sweep.per_core_precomputed", "points/s")
+def sweep_per_core_precomputed():
+    axes = {"downlink_freq": np.linspace(1, 30, 100), "antenna_gs_diam": np.linspace(1, 30, 100),
+            "gs_elevation_angle": np.linspace(5, 90, 20)}
+    path = os.path.join(scratch_dir, "sweep.csv")
+    return 100 * 100 * 20, lambda: run_sweep(reference_inputs, axes, path, workers=1, precompute=True)
+
+@benchmark("export.csv", "rows/s")
+def export_csv():
+    columns = vec.flatten_result(vec.calculate_link_budget_batch(reference_batch(100000)))
+    path = os.path.join(scratch_dir, "export.csv")
+    def run():
+        with CsvChunkWriter(path, list(columns)) as writer:
+            writer.write(format_csv_chunk(columns))
+    return 100000, run
+
+### COLD START ###
+@benchmark("cli.cold_start", "starts/s")
+def cli_cold_start():
+    args = [sys.executable, os.path.join(CODE_DIR, "linkbudget.py"), "compute"]
+    for field, value in reference_inputs.items():
+        args += [f"--{field}", str(value)]
+    return 1, lambda: subprocess.run(args, check=True, stdout=subprocess.DEVNULL)
+
+### SERVICE ###
+@benchmark("service.single_scenario", "calls/s")
+def service_single_scenario():
+    scenarios = [reference_inputs]
+    return 2000, lambda: [evaluate_scenarios(scenarios) for _ in range(2000)]
+
+@benchmark("service.requests", "requests/s")
+def service_requests():
+    ports = []
+    ready = threading.Event()
+    def serve():
+        asyncio.run(BudgetService().serve(port=0, ready=lambda port: (ports.append(port), ready.set())))
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+    latencies = {}
+    def run():
+        latencies.update(asyncio.run(load_test(reference_inputs, port=ports[0], requests=2048, concurrency=32)))
+        del latencies["requests/s"]
+    return 2048, run, latencies
+
+### RUNNER ###
+def run_benchmarks(selected=None, repeat=5):
+    '''Run the (selected) benchmarks, returns {name: {"value": rate, "unit": unit}}'''
+    global scratch_dir
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        for name, (function, unit) in benchmarks.items():
+            if selected and not any(name.startswith(prefix) for prefix in selected):
+                continue
+            operations, run, *extra = function()
+            results[name] = {"value": measure(operations, run, repeat), "unit": unit}
+            for metrics in extra:
+                results[name].update(metrics)
+            print(f"{name:<45}{results[name]['value']:>16.1f} {unit}", file=sys.stderr)
+    scratch_dir = None
+    return results
+
+def compare(results, baseline, tolerance):
+    '''List the benchmarks whose rate dropped by more than tolerance (fraction) against the baseline'''
+    regressions = []
+    for name, result in results.items():
+        if name in baseline["results"]:
+            reference = baseline["results"][name]["value"]
+            if result["value"] < (1 - tolerance) * reference:
+                regressions.append(f"{name}: {result['value']:.1f} {result['unit']} vs. {reference:.1f} (baseline)")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput benchmarks of the link budget code")
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown (default: 0.2)")
+    parser.add_argument("--repeat", type=int, default=5, help="repeats per benchmark, the best one counts")
+    parser.add_argument("--only", nargs="+", help="only run benchmarks starting with these prefixes")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, args.repeat)
+    report = {"python": platform.python_version(),
+              "numpy": np.__version__,
+              "platform": platform.platform(),
+              "cpu_count": os.cpu_count(),
+              "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    failures = []
+    if "cli.cold_start" in results and 1 / results["cli.cold_start"]["value"] > cold_start_budget:
+        failures.append(f"cli.cold_start: {1000 / results['cli.cold_start']['value']:.1f} ms exceeds the {1000 * cold_start_budget:.0f} ms budget")
+    for percentile, target in latency_targets.items():
+        if percentile in results.get("service.requests", {}) and results["service.requests"][percentile] > target:
+            failures.append(f"service.requests: {percentile} latency {1000 * results['service.requests'][percentile]:.1f} ms exceeds the {1000 * target:.0f} ms target")
+    if args.compare:
+        with open(args.compare) as file:
+            failures += compare(results, json.load(file), args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
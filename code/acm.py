@@ -0,0 +1,126 @@
+import numpy as np
+from engine import LinkBudgetInput
+from orbit import iter_pass
+from vectorized import calculate_link_budget_batch, as_float, coding_names, coding_table
+
+### SCHEME STAIRCASE ###
+def scheme_staircase(names=None):
+    '''Order the coding schemes into a staircase of increasing (E_b/N_o)_req and strictly increasing code rate
+
+    Schemes that need a higher E_b/N_o than another one without a higher rate are never the best choice and
+    are dropped. Returns (scheme indices into coding_names, thresholds [dB], rates).'''
+    idx = np.array([coding_names.index(name) for name in (names or coding_names)])
+    rates, required = coding_table[idx, 0], coding_table[idx, 1]
+    # Easiest to close first, the higher rate first among equal requirements
+    order = np.lexsort((-rates, required))
+    steps = []
+    for k in order:
+        if not steps or rates[k] > rates[steps[-1]]:
+            steps.append(k)
+    steps = np.array(steps)
+    return idx[steps], required[steps], rates[steps]
+
+def select_schemes(snr, required_margin=3.0, names=None):
+    '''Pick the highest-rate scheme closing with required_margin [dB] at a channel E_b/N_o snr [dB] (array)
+
+    Returns indices into coding_names, -1 where no scheme closes. One binary search over the staircase
+    per point, so no (points x schemes) array is formed.'''
+    idx, thresholds, rates = scheme_staircase(names)
+    step = np.searchsorted(thresholds, as_float(snr) - required_margin, side="right") - 1
+    return np.where(step >= 0, idx[np.maximum(step, 0)], -1)
+
+### ACM BUDGETS ###
+class ACMResult:
+    '''Scheme chosen per point (index into coding_names, -1 if none closes) with its information data rate
+    [bit/s] and margin [dB] (NaN where no scheme closes)'''
+    def __init__(self, scheme, info_rate, margin):
+        self.scheme = scheme
+        self.info_rate = info_rate
+        self.margin = margin
+
+    @property
+    def scheme_names(self):
+        # -1 picks the trailing empty name
+        return np.array(coding_names + [""])[self.scheme]
+
+def channel_snr(inputs, channel_rate=None, result=None):
+    '''Obtain the downlink E_b/N_o [dB] at the channel (transmitted) bit rate [bit/s], and that rate
+
+    By default the channel rate is the transmitted data rate of the budget with its selected scheme, so
+    switching schemes trades information rate against the required E_b/N_o at a fixed symbol rate.'''
+    if result is None:
+        result = calculate_link_budget_batch(inputs)
+    downlink = result.downlink_data
+    # C/N_0 [dB-Hz] is the E_b/N_o plus the transmitted data rate term
+    C_N0 = downlink["SNR"][1] - downlink["1/DR"][1]
+    if channel_rate is None:
+        channel_rate = 10**(-downlink["1/DR"][1] / 10)
+    return C_N0 - 10 * np.log10(as_float(channel_rate)), channel_rate
+
+def acm_rates(snr, channel_rate, required_margin=3.0, names=None):
+    '''Select the schemes at channel E_b/N_o snr [dB] and a channel rate [bit/s], returns an ACMResult'''
+    scheme = select_schemes(snr, required_margin, names)
+    closes = scheme >= 0
+    safe = np.maximum(scheme, 0)
+    info_rate = np.where(closes, coding_table[safe, 0] * channel_rate, 0.0)
+    margin = np.where(closes, snr - coding_table[safe, 1], np.nan)
+    return ACMResult(scheme, info_rate, margin)
+
+def plan_acm(inputs, required_margin=3.0, channel_rate=None, names=None):
+    '''Choose the best scheme for every point of a batch (e.g. a sweep), returns an ACMResult
+
+    names restricts the schemes the modem supports (default: all of channel_coding_data).'''
+    if isinstance(inputs, LinkBudgetInput):
+        inputs = inputs.as_dict()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        snr, channel_rate = channel_snr(inputs, channel_rate)
+    return acm_rates(snr, channel_rate, required_margin, names)
+
+### ACM OVER A PASS ###
+def pass_snr_offset(inputs, channel_rate=None):
+    '''Obtain the offset [dB] from the downlink margin of a pass simulation (see orbit.iter_pass) to the E_b/N_o at
+    the channel rate, and that rate [bit/s]'''
+    result = calculate_link_budget_batch(inputs)
+    # E_b/N_o at the channel rate = pass margin + (E_b/N_o)_req of the budget + difference of the rate terms
+    snr, channel_rate = channel_snr(inputs, channel_rate, result)
+    return snr - result.downlink_data["M"][1], channel_rate
+
+class ACMPassResult:
+    '''Data volume [bit] of an ACM pass simulation, the time [s] spent per scheme and optionally the series'''
+    def __init__(self, data_volume, scheme_time, series=None):
+        self.data_volume = data_volume
+        self.scheme_time = scheme_time
+        self.series = series
+
+def simulate_acm_pass(inputs, duration, step=1.0, required_margin=3.0, channel_rate=None, names=None,
+                      keep_series=False, **kwargs):
+    '''Simulate a pass (see orbit.iter_pass for the orbit options) choosing the best scheme every step
+
+    The downlink E_b/N_o per step follows from the margin of the pass simulation; steps above the minimum
+    elevation use the highest-rate scheme closing with required_margin. Returns an ACMPassResult.'''
+    if isinstance(inputs, LinkBudgetInput):
+        inputs = inputs.as_dict()
+    snr_offset, channel_rate = pass_snr_offset(inputs, channel_rate)
+    min_elevation = kwargs.pop("min_elevation", 5.0)
+    kwargs.pop("required_margin", None)
+
+    data_volume = 0.0
+    scheme_steps = np.zeros(len(coding_names) + 1, dtype=np.int64)
+    series = {key: [] for key in ("time", "elevation", "scheme", "info_rate", "margin")}
+    for chunk in iter_pass(inputs, duration, step, min_elevation=min_elevation, required_margin=-np.inf, **kwargs):
+        in_view = chunk["elevation"] >= min_elevation
+        acm = acm_rates(np.where(in_view, chunk["downlink_margin"] + snr_offset, -np.inf), channel_rate,
+                        required_margin, names)
+        data_volume += float(acm.info_rate.sum() * step)
+        # Last bin counts the steps in view without a closing scheme
+        scheme_steps += np.bincount(np.where(acm.scheme >= 0, acm.scheme, len(coding_names))[in_view],
+                                    minlength=len(coding_names) + 1)
+        if keep_series:
+            for key, values in (("time", chunk["time"]), ("elevation", chunk["elevation"]), ("scheme", acm.scheme),
+                                ("info_rate", acm.info_rate), ("margin", acm.margin)):
+                series[key].append(values)
+    scheme_time = {name: float(scheme_steps[i] * step) for i, name in enumerate(coding_names) if scheme_steps[i]}
+    scheme_time["none"] = float(scheme_steps[-1] * step)
+    if keep_series:
+        series = {key: np.concatenate(values) if values else np.empty(0) for key, values in series.items()}
+    return ACMPassResult(data_volume, scheme_time, series if keep_series else None)
@@ -0,0 +1,166 @@
+import csv
+import io
+import os
+import numpy as np
+from engine import input_fields
+from vectorized import calculate_link_budget_batch, flatten_result, as_float
+
+# Input fields holding numbers, the other inputs hold target body and coding scheme names
+numeric_fields = [field for field in input_fields if field not in ("target_body", "modulation_coding")]
+
+### CHUNK READERS ###
+def iter_csv_chunks(file_path, chunk_size=65536):
+    '''Read a CSV file and yield {column: values} chunks of at most chunk_size rows (row by row without pyarrow)'''
+    try:
+        import pyarrow.csv
+    except ImportError:
+        pass
+    else:
+        yield from iter_arrow_csv_chunks(file_path, chunk_size)
+        return
+    with open(file_path, newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader)
+        rows = []
+        for row in reader:
+            rows.append(row)
+            if len(rows) == chunk_size:
+                yield dict(zip(header, zip(*rows)))
+                rows = []
+        if rows:
+            yield dict(zip(header, zip(*rows)))
+
+def iter_arrow_csv_chunks(file_path, chunk_size=65536):
+    '''Read a CSV file block by block with pyarrow and yield {column: array} chunks of at most chunk_size rows'''
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    with open(file_path, newline='') as csvfile:
+        header = next(csv.reader(csvfile))
+    # Fix the column types up front, inferring them per block could disagree between blocks
+    column_types = {name: pa.float64() if name in numeric_fields else pa.string() for name in header}
+    reader = pa_csv.open_csv(file_path, convert_options=pa_csv.ConvertOptions(column_types=column_types))
+    for batch in reader:
+        for start in range(0, batch.num_rows, chunk_size):
+            part = batch.slice(start, chunk_size)
+            yield {name: column.to_numpy(zero_copy_only=False) for name, column in zip(part.schema.names, part.columns)}
+
+def iter_parquet_chunks(file_path, chunk_size=65536):
+    '''Read a Parquet file batch by batch and yield {column: array} chunks of at most chunk_size rows'''
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet files requires the pyarrow package") from None
+    for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size):
+        yield {name: column.to_numpy(zero_copy_only=False) for name, column in zip(batch.schema.names, batch.columns)}
+
+def iter_input_chunks(file_path, chunk_size=65536):
+    '''Pick the chunk reader from the file extension'''
+    if os.path.splitext(file_path)[1].lower() == ".parquet":
+        return iter_parquet_chunks(file_path, chunk_size)
+    return iter_csv_chunks(file_path, chunk_size)
+
+### CHUNK WRITERS ###
+def format_csv_chunk(columns):
+    '''Format a chunk of columns as CSV text (may run in worker processes)'''
+    try:
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        pass
+    else:
+        buffer = io.BytesIO()
+        pa_csv.write_csv(format_parquet_chunk(columns), buffer, pa_csv.WriteOptions(include_header=False, quoting_style="needed"))
+        return buffer.getvalue().decode()
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(zip(*(np.asarray(values).tolist() for values in columns.values())))
+    return buffer.getvalue()
+
+def format_parquet_chunk(columns):
+    '''Convert a chunk of columns to an Arrow table (may run in worker processes)'''
+    import pyarrow as pa
+    return pa.table({name: np.asarray(values) for name, values in columns.items()})
+
+class CsvChunkWriter:
+    '''Append chunks to a CSV file, chunks are first converted with the `format` function'''
+    format = staticmethod(format_csv_chunk)
+
+    def __init__(self, file_path, column_names):
+        self.file = open(file_path, 'w', newline='')
+        csv.writer(self.file).writerow(column_names)
+
+    def write(self, chunk):
+        self.file.write(chunk)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ParquetChunkWriter:
+    '''Append chunks as row groups of a Parquet file, chunks are first converted with the `format` function'''
+    format = staticmethod(format_parquet_chunk)
+
+    def __init__(self, file_path, column_names):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing Parquet files requires the pyarrow package") from None
+        self.pq = pq
+        self.file_path = file_path
+        self.writer = None
+
+    def write(self, chunk):
+        # The schema is only known once the first chunk has been converted
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.file_path, chunk.schema)
+        self.writer.write_table(chunk)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def open_chunk_writer(file_path, column_names):
+    '''Pick the chunk writer from the file extension'''
+    if os.path.splitext(file_path)[1].lower() == ".parquet":
+        return ParquetChunkWriter(file_path, column_names)
+    return CsvChunkWriter(file_path, column_names)
+
+### BATCH PIPELINE ###
+def evaluate_chunk(chunk, keys=None):
+    '''Compute the budgets of a chunk of scenarios, returns the input columns followed by the result terms'''
+    columns = {}
+    for name, values in chunk.items():
+        # Numeric inputs are written back as numbers, other columns (names, ids, ...) are passed through
+        if name in numeric_fields:
+            columns[name] = as_float(values)
+        else:
+            columns[name] = np.asarray(values)
+    columns.update(flatten_result(calculate_link_budget_batch(columns), keys))
+    return columns
+
+def run_batch(input_path, output_path, chunk_size=65536, keys=None):
+    '''Stream scenarios from a CSV/Parquet file through the budget calculation into a CSV/Parquet file
+
+    Only one chunk is held in memory at a time. Returns the number of scenarios processed.'''
+    rows = 0
+    writer = None
+    try:
+        for chunk in iter_input_chunks(input_path, chunk_size):
+            columns = evaluate_chunk(chunk, keys)
+            if writer is None:
+                writer = open_chunk_writer(output_path, list(columns))
+            writer.write(writer.format(columns))
+            rows += len(next(iter(columns.values())))
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
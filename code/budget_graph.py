@@ -0,0 +1,112 @@
+from core import*
+from engine import (input_fields, uplink_terms, downlink_terms, LinkBudgetResult, tabulate, body_space_loss,
+                    atmosphere_loss, default_sys_temp)
+
+### TERM DEFINITIONS ###
+def effective_temp(temp_sys, freq_GHz, uplink=True, gs_elevation_angle="", link_availability=99.9):
+    '''Use the given system noise temperature, or the default value when the field is left empty'''
+    if temp_sys in (None, ""):
+        return default_sys_temp(freq_GHz, uplink, gs_elevation_angle, link_availability)
+    return temp_sys
+
+# Data format: term name: (function, names of the inputs/terms passed as its arguments)
+budget_terms = {
+    # Shared intermediates
+    "freq_uplink": (uplink_freq_GHz, ("downlink_freq", "sc_TAR")),
+    "code_rate": (lambda coding: channel_coding_data[coding][0], ("modulation_coding",)),
+    "SNR_req": (lambda coding: channel_coding_data[coding][1], ("modulation_coding",)),
+    "L_TX": (lambda LF: val_to_dB(float(LF)), ("transmitter_LF",)),
+    "L_RX": (lambda LF: val_to_dB(float(LF)), ("receiver_LF",)),
+    "L_boltzmann": (lambda: val_to_dB(float(boltzmann_const)), ()),
+    # Uplink
+    "P_GS": (lambda P: val_to_dB(float(P)), ("transmitter_gs_power",)),
+    "G_GS_TX": (transmitter_gain, ("freq_uplink", "antenna_gs_diam", "antenna_gs_eff")),
+    "L_GS_pointing_out_up": (pointing_loss, ("freq_uplink", "antenna_gs_diam", "gs_pointing_offset_angle")),
+    "L_GS_space": (body_space_loss, ("freq_uplink", "target_body", "orbit_alt", "elong_angle")),
+    "L_GS_atm": (atmosphere_loss, ("freq_uplink", "gs_elevation_angle", "link_availability")),
+    "L_GS_pointing_in_up": (pointing_loss, ("freq_uplink", "antenna_sc_diam", "sc_pointing_offset_angle")),
+    "G_GS_RX": (transmitter_gain, ("freq_uplink", "antenna_sc_diam", "antenna_sc_eff")),
+    "L_GS_DR": (lambda DR, code_rate: val_to_dB(float(DR) / code_rate), ("uplink_datarate_req", "code_rate")),
+    "T_sys_up": (lambda T, freq, el, av: effective_temp(T, freq, True, el, av),
+                 ("temp_sys_uplink", "freq_uplink", "gs_elevation_angle", "link_availability")),
+    "L_GS_sys_temp": (lambda T: val_to_dB(1/float(T)), ("T_sys_up",)),
+    "SNR_uplink": (lambda P, L_TX, G_TX, L_pt_out, L_s, L_atm, L_pt_in, L_RX, G_RX, L_DR, L_k, L_T:
+                   P + L_TX + G_TX - L_pt_out + L_s - L_atm - L_pt_in + L_RX + G_RX - L_DR - L_k + L_T,
+                   ("P_GS", "L_TX", "G_GS_TX", "L_GS_pointing_out_up", "L_GS_space", "L_GS_atm", "L_GS_pointing_in_up",
+                    "L_RX", "G_GS_RX", "L_GS_DR", "L_boltzmann", "L_GS_sys_temp")),
+    "M_uplink": (lambda SNR, SNR_req: round(SNR - SNR_req, 5), ("SNR_uplink", "SNR_req")),
+    # Downlink
+    "P_SC": (lambda P: val_to_dB(float(P)), ("transmitter_sc_power",)),
+    "G_SC_TX": (transmitter_gain, ("downlink_freq", "antenna_sc_diam", "antenna_sc_eff")),
+    "L_SC_pointing_out_down": (pointing_loss, ("downlink_freq", "antenna_sc_diam", "sc_pointing_offset_angle")),
+    "L_SC_space": (body_space_loss, ("downlink_freq", "target_body", "orbit_alt", "elong_angle")),
+    "L_SC_atm": (atmosphere_loss, ("downlink_freq", "gs_elevation_angle", "link_availability")),
+    "L_SC_pointing_in_down": (pointing_loss, ("downlink_freq", "antenna_gs_diam", "gs_pointing_offset_angle")),
+    "G_SC_RX": (transmitter_gain, ("downlink_freq", "antenna_gs_diam", "antenna_gs_eff")),
+    "L_SC_DR": (lambda bpp, SW, pixel, alt, duty, t_dl, code_rate, body:
+                required_data_rate(bpp, SW, pixel, alt, duty, t_dl, code_rate, celestial_body_data[body][0], celestial_body_data[body][1]),
+                ("PL_bpp", "PL_SW_angle", "PL_pixel_size", "orbit_alt", "PL_duty_cycle", "PL_downlink_time", "code_rate", "target_body")),
+    "T_sys_down": (lambda T, freq, el, av: effective_temp(T, freq, False, el, av),
+                   ("temp_sys_downlink", "downlink_freq", "gs_elevation_angle", "link_availability")),
+    "L_SC_sys_temp": (lambda T: val_to_dB(1/float(T)), ("T_sys_down",)),
+    "SNR_downlink": (lambda P, L_TX, G_TX, L_pt_out, L_s, L_atm, L_pt_in, L_RX, G_RX, L_DR, L_k, L_T:
+                     P + L_TX + G_TX - L_pt_out + L_s - L_atm - L_pt_in + L_RX + G_RX - L_DR - L_k + L_T,
+                     ("P_SC", "L_TX", "G_SC_TX", "L_SC_pointing_out_down", "L_SC_space", "L_SC_atm", "L_SC_pointing_in_down",
+                      "L_RX", "G_SC_RX", "L_SC_DR", "L_boltzmann", "L_SC_sys_temp")),
+    "M_downlink": (lambda SNR, SNR_req: round(SNR - SNR_req, 5), ("SNR_downlink", "SNR_req")),
+}
+
+### INCREMENTAL EVALUATION ###
+class BudgetGraph:
+    '''Link budget as a dependency graph of cached terms, only terms depending on a changed input are recomputed'''
+    def __init__(self, **inputs):
+        self.values = {"target_body": "Earth", "modulation_coding": "Uncoded", "antenna_sc_eff": 0.55,
+                       "antenna_gs_eff": 0.55, "gs_pointing_offset_angle": 0.05, "elong_angle": "",
+                       "temp_sys_uplink": None, "temp_sys_downlink": None, "gs_elevation_angle": "",
+                       "link_availability": 99.9}
+        self.cache = {}
+        # Number of times each term was (re)computed
+        self.evaluations = dict.fromkeys(budget_terms, 0)
+        # Reverse edges: every term that (indirectly) depends on a name
+        self.dependents = {name: set() for name in list(input_fields) + list(budget_terms)}
+        for term in budget_terms:
+            stack = [term]
+            while stack:
+                for dep in budget_terms[stack.pop()][1]:
+                    self.dependents[dep].add(term)
+                    if dep in budget_terms:
+                        stack.append(dep)
+        self.set(**inputs)
+
+    def set(self, **inputs):
+        '''Update input values, dropping the cached terms that depend on the ones that changed'''
+        for name, value in inputs.items():
+            if name not in input_fields:
+                raise KeyError(name)
+            if name in self.values and self.values[name] == value:
+                continue
+            self.values[name] = value
+            for term in self.dependents[name]:
+                self.cache.pop(term, None)
+
+    def get(self, name):
+        '''Obtain an input or term value, computing (and caching) missing terms first'''
+        if name not in budget_terms:
+            return self.values[name]
+        if name not in self.cache:
+            function, deps = budget_terms[name]
+            self.cache[name] = function(*(self.get(dep) for dep in deps))
+            self.evaluations[name] += 1
+        return self.cache[name]
+
+    def result(self):
+        '''Tabulate the uplink and downlink data like engine.calculate_link_budget'''
+        uplink_values = [self.get("P_GS"), self.get("L_TX"), self.get("G_GS_TX"), -self.get("L_GS_pointing_out_up"),
+                         self.get("L_GS_space"), -self.get("L_GS_atm"), -self.get("L_GS_pointing_in_up"), self.get("G_GS_RX"), self.get("L_RX"),
+                         -self.get("L_GS_DR"), -self.get("L_boltzmann"), self.get("L_GS_sys_temp"),
+                         self.get("SNR_uplink"), self.get("SNR_req"), self.get("M_uplink")]
+        downlink_values = [self.get("P_SC"), self.get("L_TX"), self.get("G_SC_TX"), -self.get("L_SC_pointing_out_down"),
+                           self.get("L_SC_space"), -self.get("L_SC_atm"), -self.get("L_SC_pointing_in_down"), self.get("G_SC_RX"), self.get("L_RX"),
+                           -self.get("L_SC_DR"), -self.get("L_boltzmann"), self.get("L_SC_sys_temp"),
+                           self.get("SNR_downlink"), self.get("SNR_req"), self.get("M_downlink")]
+        return LinkBudgetResult(tabulate(uplink_terms, uplink_values), tabulate(downlink_terms, downlink_values))
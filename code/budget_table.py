@@ -0,0 +1,115 @@
+import numpy as np
+from engine import LinkBudgetResult, uplink_terms, downlink_terms
+
+### COLUMN LAYOUT ###
+# Result columns "<link>_<key>" in the row order of the uplink/downlink tables
+# Data format: column name, link, key, description
+budget_columns = ([(f"uplink_{key}", "uplink", key, desc) for key, desc in uplink_terms]
+                  + [(f"downlink_{key}", "downlink", key, desc) for key, desc in downlink_terms])
+
+def column_names(keys=None):
+    '''Names of the result columns, optionally only those of the given term keys (e.g. ("M",))'''
+    return [name for name, link, key, desc in budget_columns if keys is None or key in keys]
+
+### COLUMNAR RESULTS ###
+class BudgetTable:
+    '''Batch results as a record batch: one contiguous float column per result term
+
+    values is a (columns, rows) array whose rows are the columns of budget_columns (or the subset of the
+    given keys) and whose columns are budgets (flattened in C order for multi-dimensional batches), 8 bytes
+    per term and budget instead of the dictionaries and tuples of LinkBudgetResult. Slicing rows returns
+    views, filtering a new table. Export goes straight from the columns to CSV or Parquet; .npy files
+    hold a structured array with one field per column.'''
+    def __init__(self, names, values):
+        self.names = list(names)
+        self.values = values
+
+    @classmethod
+    def from_result(cls, result, keys=None, dtype=float):
+        '''Copy a batch LinkBudgetResult (or the terms of the given keys) into a new table'''
+        names = column_names(keys)
+        columns = {}
+        for prefix, table in (("uplink", result.uplink_data), ("downlink", result.downlink_data)):
+            for key, (desc, values) in table.items():
+                if f"{prefix}_{key}" in names:
+                    columns[f"{prefix}_{key}"] = values
+        shape = np.broadcast_shapes(*(np.shape(values) for values in columns.values()))
+        values = np.empty((len(names), int(np.prod(shape))), dtype=dtype)
+        for i, name in enumerate(names):
+            values[i] = np.broadcast_to(columns[name], shape).reshape(-1)
+        return cls(names, values)
+
+    @classmethod
+    def concatenate(cls, tables):
+        return cls(tables[0].names, np.concatenate([table.values for table in tables], axis=1))
+
+    def __len__(self):
+        return self.values.shape[1]
+
+    def __getitem__(self, index):
+        '''A column (by name) or the rows of an index, slice or mask as a table'''
+        if isinstance(index, str):
+            return self.values[self.names.index(index)]
+        if isinstance(index, (int, np.integer)):
+            index = slice(index, index + 1 or None)
+        return BudgetTable(self.names, self.values[:, index])
+
+    def margin(self, link="downlink"):
+        '''Obtain the uplink, downlink or (for "both") the smaller of the two margins [dB] per row'''
+        if link == "both":
+            return np.minimum(self["uplink_M"], self["downlink_M"])
+        return self[f"{link}_M"]
+
+    def filter(self, min_margin=0.0, link="both"):
+        '''Keep the rows whose margin of link is at least min_margin [dB]'''
+        return self[self.margin(link) >= min_margin]
+
+    def columns(self):
+        '''Obtain {column name: array view} of the table, e.g. for the batch_io chunk writers'''
+        return dict(zip(self.names, self.values))
+
+    def to_result(self):
+        '''Convert to a LinkBudgetResult with {key: (description, column)} tables (no copy)'''
+        tables = {"uplink": {}, "downlink": {}}
+        for name, link, key, desc in budget_columns:
+            if name in self.names:
+                tables[link][key] = (desc, self[name])
+        return LinkBudgetResult(tables["uplink"], tables["downlink"])
+
+    def row(self, i, decimals=5):
+        '''Obtain budget i as a LinkBudgetResult of rounded floats, as computed by the scalar engine'''
+        tables = {"uplink": {}, "downlink": {}}
+        for name, link, key, desc in budget_columns:
+            if name in self.names:
+                tables[link][key] = (desc, round(float(self[name][i]), decimals))
+        return LinkBudgetResult(tables["uplink"], tables["downlink"])
+
+    ### EXPORT ###
+    def to_records(self):
+        '''Obtain the table as a structured array with one field per column'''
+        records = np.empty(len(self), dtype=[(name, self.values.dtype) for name in self.names])
+        for name, values in self.columns().items():
+            records[name] = values
+        return records
+
+    @classmethod
+    def from_records(cls, records):
+        names = list(records.dtype.names)
+        return cls(names, np.stack([records[name] for name in names]) if names else np.empty((0, len(records))))
+
+    def save_npy(self, file_path):
+        np.save(file_path, self.to_records())
+
+    @classmethod
+    def load_npy(cls, file_path):
+        return cls.from_records(np.load(file_path))
+
+    def write(self, file_path, chunk_size=65536):
+        '''Write the table to a CSV or Parquet file (by extension) in chunks of rows, or to .npy'''
+        if file_path.lower().endswith(".npy"):
+            self.save_npy(file_path)
+            return
+        from batch_io import open_chunk_writer
+        with open_chunk_writer(file_path, self.names) as writer:
+            for start in range(0, len(self), chunk_size):
+                writer.write(writer.format(self[start:start + chunk_size].columns()))
@@ -2,8 +2,6 @@ import math as m
 import csv
 import sys
 import os
-from tkinter import filedialog
-import pyperclip as pclip
 
 ### CONSTANTS ###
 v_light = 3 * 10**8
@@ -30,8 +28,10 @@ channel_coding_data = {"Uncoded": [1, 10.5],
                        "LDPC: r=3/4": [3/4, 0.5]}
 
 ### GUI UTILITY FUNCTIONS ###
+# tkinter and pyperclip are imported when first used, so headless processes that only need the math never load them
 def generate_bibtex(title, version):
     '''Generate a BibTeX entry straight to clipboard'''
+    import pyperclip as pclip
     citation_content = f"""
     @software{{link_margin_calculator,
     author       = {{Adam Moëc}},
@@ -52,6 +52,7 @@ def resource_path(relative_path):
 
 def write_to_csv(uplink_data, downlink_data):
     '''Write loss/gain data to csv file'''
+    from tkinter import filedialog
     file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")])
     # Ask user for file path, and check if they cancelled the dialog
     if not file_path:
@@ -0,0 +1,225 @@
+from core import*
+
+### INPUT FIELDS ###
+# Names of all link budget inputs, in the order of the GUI entry fields
+input_fields = ["target_body",
+                "transmitter_sc_power",
+                "transmitter_gs_power",
+                "transmitter_LF",
+                "receiver_LF",
+                "downlink_freq",
+                "sc_TAR",
+                "antenna_sc_diam",
+                "antenna_sc_eff",
+                "antenna_gs_diam",
+                "antenna_gs_eff",
+                "orbit_alt",
+                "elong_angle",
+                "sc_pointing_offset_angle",
+                "gs_pointing_offset_angle",
+                "uplink_datarate_req",
+                "PL_SW_angle",
+                "PL_pixel_size",
+                "PL_bpp",
+                "PL_duty_cycle",
+                "PL_downlink_time",
+                "modulation_coding",
+                "temp_sys_uplink",
+                "temp_sys_downlink",
+                "gs_elevation_angle",
+                "link_availability"]
+
+# Version of the budget model, part of the keys of stored results (see store.py);
+# increase it with every change that alters the computed budgets
+model_version = "1.1"
+
+# Data format: key, description (row order of the uplink/downlink tables)
+uplink_terms = [("P_GS", "GS power"),
+                ("L_TX", "Transmitter loss"),
+                ("G_TX", "Transmitter gain"),
+                ("L_GS_pointing", "GS pointing loss"),
+                ("L_space", "Space loss"),
+                ("L_atm", "Atmospheric loss"),
+                ("L_SC_pointing", "S/C pointing loss"),
+                ("G_RX", "Receiver gain"),
+                ("L_RX", "Receiver loss"),
+                ("1/DR", "Required data rate"),
+                ("1/k", "Boltzmann constant"),
+                ("1/T_sys", "System noise temperature"),
+                ("SNR", "Received signal-to-noise ratio"),
+                ("SNR_req", "Required signal-to-noise ratio"),
+                ("M", "Link margin")]
+
+downlink_terms = [("P_SC", "S/C power"),
+                  ("L_TX", "Transmitter loss"),
+                  ("G_TX", "Transmitter gain"),
+                  ("L_SC_pointing", "S/C pointing loss"),
+                  ("L_space", "Space loss"),
+                  ("L_atm", "Atmospheric loss"),
+                  ("L_GS_pointing", "GS pointing loss"),
+                  ("G_RX", "Receiver gain"),
+                  ("L_RX", "Receiver loss"),
+                  ("1/DR", "Required data rate"),
+                  ("1/k", "Boltzmann constant"),
+                  ("1/T_sys", "System noise temperature"),
+                  ("SNR", "Received signal-to-noise ratio"),
+                  ("SNR_req", "Required signal-to-noise ratio"),
+                  ("M", "Link margin")]
+
+### INPUT/RESULT CONTAINERS ###
+class LinkBudgetInput:
+    '''All inputs of the link budget, named after the GUI entry fields (values may be numbers or numeric strings)'''
+    def __init__(self, transmitter_sc_power, transmitter_gs_power, transmitter_LF, receiver_LF, downlink_freq, sc_TAR,
+                 antenna_sc_diam, antenna_gs_diam, orbit_alt, sc_pointing_offset_angle, uplink_datarate_req,
+                 PL_SW_angle, PL_pixel_size, PL_bpp, PL_duty_cycle, PL_downlink_time,
+                 target_body="Earth", modulation_coding="Uncoded", antenna_sc_eff=0.55, antenna_gs_eff=0.55,
+                 gs_pointing_offset_angle=0.05, elong_angle="", temp_sys_uplink=None, temp_sys_downlink=None,
+                 gs_elevation_angle="", link_availability=99.9):
+        self.target_body = target_body
+        self.transmitter_sc_power = transmitter_sc_power
+        self.transmitter_gs_power = transmitter_gs_power
+        self.transmitter_LF = transmitter_LF
+        self.receiver_LF = receiver_LF
+        self.downlink_freq = downlink_freq
+        self.sc_TAR = sc_TAR
+        self.antenna_sc_diam = antenna_sc_diam
+        self.antenna_sc_eff = antenna_sc_eff
+        self.antenna_gs_diam = antenna_gs_diam
+        self.antenna_gs_eff = antenna_gs_eff
+        self.orbit_alt = orbit_alt
+        self.elong_angle = elong_angle
+        self.sc_pointing_offset_angle = sc_pointing_offset_angle
+        self.gs_pointing_offset_angle = gs_pointing_offset_angle
+        self.uplink_datarate_req = uplink_datarate_req
+        self.PL_SW_angle = PL_SW_angle
+        self.PL_pixel_size = PL_pixel_size
+        self.PL_bpp = PL_bpp
+        self.PL_duty_cycle = PL_duty_cycle
+        self.PL_downlink_time = PL_downlink_time
+        self.modulation_coding = modulation_coding
+        # The atmosphere is only modelled when the GS elevation angle is given
+        self.gs_elevation_angle = gs_elevation_angle
+        self.link_availability = link_availability
+        # System noise temperatures default to the same values the GUI pre-fills
+        if temp_sys_uplink is None:
+            temp_sys_uplink = default_sys_temp(uplink_freq_GHz(downlink_freq, sc_TAR), True, gs_elevation_angle, link_availability)
+        if temp_sys_downlink is None:
+            temp_sys_downlink = default_sys_temp(downlink_freq, False, gs_elevation_angle, link_availability)
+        self.temp_sys_uplink = temp_sys_uplink
+        self.temp_sys_downlink = temp_sys_downlink
+
+    def as_dict(self):
+        '''Return the inputs as a {field: value} dictionary'''
+        return {field: getattr(self, field) for field in input_fields}
+
+class LinkBudgetResult:
+    '''Uplink and downlink tables in the {key: (description, value [dB])} format used by the GUI'''
+    def __init__(self, uplink_data, downlink_data):
+        self.uplink_data = uplink_data
+        self.downlink_data = downlink_data
+
+    @property
+    def link_margin_uplink(self):
+        return self.uplink_data['M'][1]
+
+    @property
+    def link_margin_downlink(self):
+        return self.downlink_data['M'][1]
+
+### LINK BUDGET CALCULATION ###
+def calculate_link_budget(inputs):
+    '''Calculate the uplink and downlink budgets of a LinkBudgetInput without any GUI'''
+    body = inputs.target_body
+    code_rate, SNR_req = channel_coding_data[inputs.modulation_coding]
+    freq_uplink = uplink_freq_GHz(inputs.downlink_freq, inputs.sc_TAR)
+    freq_downlink = inputs.downlink_freq
+
+    # UPLINK #
+    # Obtain ground station transmitter power in dB
+    P_GS = val_to_dB(float(inputs.transmitter_gs_power))
+    L_GS_TX = val_to_dB(float(inputs.transmitter_LF))
+    G_GS_TX = transmitter_gain(freq_uplink, inputs.antenna_gs_diam, inputs.antenna_gs_eff)
+    L_GS_pointing_out_up = pointing_loss(freq_uplink, inputs.antenna_gs_diam, inputs.gs_pointing_offset_angle)
+    L_GS_space = body_space_loss(freq_uplink, body, inputs.orbit_alt, inputs.elong_angle)
+    L_GS_atm = atmosphere_loss(freq_uplink, inputs.gs_elevation_angle, inputs.link_availability)
+    L_GS_pointing_in_up = pointing_loss(freq_uplink, inputs.antenna_sc_diam, inputs.sc_pointing_offset_angle)
+    L_GS_RX = val_to_dB(float(inputs.receiver_LF))
+    G_GS_RX = transmitter_gain(freq_uplink, inputs.antenna_sc_diam, inputs.antenna_sc_eff)
+    L_GS_DR = val_to_dB(float(inputs.uplink_datarate_req) / code_rate)
+    L_boltzmann = val_to_dB(float(boltzmann_const))
+    L_GS_sys_temp = val_to_dB(1/float(inputs.temp_sys_uplink))
+
+    # Link margin calculation (difference between SNR_uplink and SNR_uplink_req)
+    SNR_uplink = P_GS + L_GS_TX + G_GS_TX - L_GS_pointing_out_up + L_GS_space - L_GS_atm - L_GS_pointing_in_up + L_GS_RX + G_GS_RX - L_GS_DR - L_boltzmann + L_GS_sys_temp
+    link_margin_uplink = round((SNR_uplink - SNR_req), 5)
+
+    # Tabulate the uplink data
+    uplink_values = [P_GS, L_GS_TX, G_GS_TX, -L_GS_pointing_out_up, L_GS_space, -L_GS_atm, -L_GS_pointing_in_up,
+                     G_GS_RX, L_GS_RX, -L_GS_DR, -L_boltzmann, L_GS_sys_temp, SNR_uplink, SNR_req, link_margin_uplink]
+    uplink_data = tabulate(uplink_terms, uplink_values)
+
+    # DOWNLINK #
+    # Obtain spacecraft transmitter power in dB
+    P_SC = val_to_dB(float(inputs.transmitter_sc_power))
+    L_SC_TX = val_to_dB(float(inputs.transmitter_LF))
+    G_SC_TX = transmitter_gain(freq_downlink, inputs.antenna_sc_diam, inputs.antenna_sc_eff)
+    L_SC_pointing_out_down = pointing_loss(freq_downlink, inputs.antenna_sc_diam, inputs.sc_pointing_offset_angle)
+    L_SC_space = body_space_loss(freq_downlink, body, inputs.orbit_alt, inputs.elong_angle)
+    L_SC_atm = atmosphere_loss(freq_downlink, inputs.gs_elevation_angle, inputs.link_availability)
+    L_SC_pointing_in_down = pointing_loss(freq_downlink, inputs.antenna_gs_diam, inputs.gs_pointing_offset_angle)
+    L_SC_RX = val_to_dB(float(inputs.receiver_LF))
+    G_SC_RX = transmitter_gain(freq_downlink, inputs.antenna_gs_diam, inputs.antenna_gs_eff)
+    L_SC_DR = required_data_rate(inputs.PL_bpp,
+                                 inputs.PL_SW_angle,
+                                 inputs.PL_pixel_size,
+                                 inputs.orbit_alt,
+                                 inputs.PL_duty_cycle,
+                                 inputs.PL_downlink_time,
+                                 code_rate,
+                                 celestial_body_data[body][0],
+                                 celestial_body_data[body][1])
+    L_SC_sys_temp = val_to_dB(1/float(inputs.temp_sys_downlink))
+
+    # Link margin calculation (difference between SNR_downlink and SNR_downlink_req)
+    SNR_downlink = P_SC + L_SC_TX + G_SC_TX - L_SC_pointing_out_down + L_SC_space - L_SC_atm - L_SC_pointing_in_down + L_SC_RX + G_SC_RX - L_SC_DR - L_boltzmann + L_SC_sys_temp
+    link_margin_downlink = round((SNR_downlink - SNR_req), 5)
+
+    # Tabulate the downlink data
+    downlink_values = [P_SC, L_SC_TX, G_SC_TX, -L_SC_pointing_out_down, L_SC_space, -L_SC_atm, -L_SC_pointing_in_down,
+                       G_SC_RX, L_SC_RX, -L_SC_DR, -L_boltzmann, L_SC_sys_temp, SNR_downlink, SNR_req, link_margin_downlink]
+    downlink_data = tabulate(downlink_terms, downlink_values)
+
+    return LinkBudgetResult(uplink_data, downlink_data)
+
+def tabulate(terms, values):
+    '''Build a {key: (description, value [dB])} table, values rounded as displayed in the GUI'''
+    return {key: (desc, round(val, 5)) for (key, desc), val in zip(terms, values)}
+
+def body_space_loss(freq_GHz, target_body, altitude, elong_angle):
+    '''Select between the near Earth, Moon and deep space L_space equations'''
+    if target_body == "Earth":
+        return space_loss(freq_GHz, altitude, celestial_body_data[target_body][1])
+    elif target_body == "Moon":
+        return space_loss(freq_GHz, celestial_body_data[target_body][2], 0)
+    else:
+        return space_loss_DS(freq_GHz, celestial_body_data["Earth"][2], celestial_body_data[target_body][2], elong_angle)
+
+# The propagation models need NumPy, so they are only imported once the atmosphere is modelled
+def atmosphere_loss(freq_GHz, gs_elevation_angle, link_availability):
+    '''Obtain the atmospheric loss [dB] of the GS path, zero when no GS elevation angle is given'''
+    if gs_elevation_angle in ("", None):
+        return 0.0
+    from propagation import atmospheric_loss
+    return float(atmospheric_loss(float(freq_GHz), float(gs_elevation_angle), float(link_availability)))
+
+def default_sys_temp(freq_GHz, uplink, gs_elevation_angle, link_availability):
+    '''Obtain the default system noise temperature: the literature value, or the frequency-dependent model
+    including the sky noise of the atmosphere when the GS elevation angle is given'''
+    if gs_elevation_angle in ("", None):
+        return sys_temp(freq_GHz, uplink)
+    from propagation import system_noise_temperature
+    try:
+        attenuation = atmosphere_loss(freq_GHz, gs_elevation_angle, link_availability)
+        return float(system_noise_temperature(float(freq_GHz), uplink, attenuation))
+    except ValueError:
+        return ""
@@ -0,0 +1,187 @@
+import numpy as np
+from engine import LinkBudgetInput
+from orbit import contact_windows
+from vectorized import calculate_link_budget_batch, free_space_loss, as_float
+
+### CONSTANTS ###
+AU = 149597870.7
+# Epoch of the orbital elements (J2000.0, 2000-01-01 12:00 TT)
+J2000 = np.datetime64("2000-01-01T12:00")
+# Keplerian elements of the planets (J2000 ecliptic, JPL approximate positions of the planets, valid 1800-2050)
+# Data format: a [AU], e [-], I [deg], mean longitude L [deg], longitude of perihelion [deg], longitude of
+# ascending node [deg]; second row: rates per Julian century. Earth stands for the Earth-Moon barycentre.
+orbital_elements = {"Mercury": [[0.38709927, 0.20563593, 7.00497902, 252.25032350, 77.45779628, 48.33076593],
+                                [0.00000037, 0.00001906, -0.00594749, 149472.67411175, 0.16047689, -0.12534081]],
+                    "Venus": [[0.72333566, 0.00677672, 3.39467605, 181.97909950, 131.60246718, 76.67984255],
+                              [0.00000390, -0.00004107, -0.00078890, 58517.81538729, 0.00268329, -0.27769418]],
+                    "Earth": [[1.00000261, 0.01671123, -0.00001531, 100.46457166, 102.93768193, 0.0],
+                              [0.00000562, -0.00004392, -0.01294668, 35999.37244981, 0.32327364, 0.0]],
+                    "Mars": [[1.52371034, 0.09339410, 1.84969142, -4.55343205, -23.94362959, 49.55953891],
+                             [0.00001847, 0.00007882, -0.00813131, 19140.30268499, 0.44441088, -0.29257343]],
+                    "Jupiter": [[5.20288700, 0.04838624, 1.30439695, 34.39644051, 14.72847983, 100.47390909],
+                                [-0.00011607, -0.00013253, -0.00183714, 3034.74612775, 0.21252668, 0.20469106]],
+                    "Saturn": [[9.53667594, 0.05386179, 2.48599187, 49.95424423, 92.59887831, 113.66242448],
+                               [-0.00125060, -0.00050991, 0.00193609, 1222.49362201, -0.41897216, -0.28867794]],
+                    "Uranus": [[19.18916464, 0.04725744, 0.77263783, 313.23810451, 170.95427630, 74.01692503],
+                               [-0.00196176, -0.00004397, -0.00242939, 428.48202785, 0.40805281, 0.04240589]],
+                    "Neptune": [[30.06992276, 0.00859048, 1.77004347, -55.12002969, 44.96476227, 131.78422574],
+                                [0.00026291, 0.00005105, 0.00035372, 218.45945325, -0.32241464, -0.00508664]]}
+# Mean geocentric lunar orbit: semi-major axis [km], eccentricity [-], anomalistic month [d], mean anomaly at J2000 [deg]
+moon_orbit = [384400.0, 0.0549, 27.554550, 134.963]
+
+# Dates covered by the cached distance tables (within the validity of orbital_elements), dates outside are
+# evaluated directly
+table_span = (np.datetime64("1850-01-01"), np.datetime64("2050-01-01"))
+# Sun-Earth-probe angle [deg] below which the link is considered in solar conjunction
+conjunction_angle = 3.0
+
+### ORBITAL MECHANICS ###
+def days_since_J2000(dates):
+    '''Obtain the days [d] from J2000 to dates (datetime64 or ISO date strings)'''
+    return (np.asarray(dates, dtype="datetime64[m]") - J2000) / np.timedelta64(1, "D")
+
+def solve_kepler(M, e, iterations=6):
+    '''Obtain the eccentric anomaly [rad] for mean anomalies M [rad] by Newton iteration (e < 0.3)'''
+    E = M + e * np.sin(M)
+    for _ in range(iterations):
+        E = E - (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+    return E
+
+def heliocentric_position(body, days):
+    '''Obtain the heliocentric ecliptic position [km] of a planet at days [d] from J2000, shape (len(days), 3)'''
+    elements, rates = np.array(orbital_elements[body])
+    T = np.asarray(days, dtype=float)[..., None] / 36525
+    a, e, I, L, long_peri, long_node = np.moveaxis(elements + rates * T, -1, 0)
+    I, long_node = np.radians(I), np.radians(long_node)
+    arg_peri = np.radians(long_peri) - long_node
+    M = np.radians((L - long_peri + 180) % 360 - 180)
+    E = solve_kepler(M, e)
+    # Position in the orbital plane, rotated to the ecliptic frame
+    x = a * (np.cos(E) - e)
+    y = a * np.sqrt(1 - e**2) * np.sin(E)
+    cos_w, sin_w = np.cos(arg_peri), np.sin(arg_peri)
+    cos_O, sin_O = np.cos(long_node), np.sin(long_node)
+    cos_I = np.cos(I)
+    return AU * np.stack([(cos_w * cos_O - sin_w * sin_O * cos_I) * x + (-sin_w * cos_O - cos_w * sin_O * cos_I) * y,
+                          (cos_w * sin_O + sin_w * cos_O * cos_I) * x + (-sin_w * sin_O + cos_w * cos_O * cos_I) * y,
+                          sin_w * np.sin(I) * x + cos_w * np.sin(I) * y], axis=-1)
+
+def moon_distance(days):
+    '''Obtain the Earth-Moon distance [km] of the mean lunar orbit at days [d] from J2000'''
+    a, e, period, M_0 = moon_orbit
+    E = solve_kepler(np.radians(M_0) + 2 * np.pi * np.asarray(days, dtype=float) / period, e)
+    return a * (1 - e * np.cos(E))
+
+def body_geometry(body, days):
+    '''Obtain the Earth-target distance [km], Sun-Earth-probe angle [deg] and the elongation angle [deg] of the
+    elong_angle input (angle at the Sun between Earth and target) at days [d] from J2000
+
+    For the Moon the angles are NaN (no solar conjunction is modelled).'''
+    if body == "Moon":
+        distance = moon_distance(days)
+        return distance, np.full(np.shape(distance), np.nan), np.full(np.shape(distance), np.nan)
+    if body not in orbital_elements or body == "Earth":
+        raise KeyError(f"no ephemeris for target body {body!r}")
+    earth = heliocentric_position("Earth", days)
+    target = heliocentric_position(body, days)
+    line_of_sight = target - earth
+    distance = np.linalg.norm(line_of_sight, axis=-1)
+    d_earth_sun = np.linalg.norm(earth, axis=-1)
+    d_sc_sun = np.linalg.norm(target, axis=-1)
+    sep = np.einsum("...k,...k->...", line_of_sight, -earth) / (distance * d_earth_sun)
+    elong = np.einsum("...k,...k->...", earth, target) / (d_earth_sun * d_sc_sun)
+    return distance, np.degrees(np.arccos(np.clip(sep, -1, 1))), np.degrees(np.arccos(np.clip(elong, -1, 1)))
+
+### DISTANCE TABLES ###
+class DistanceTable:
+    '''Daily Earth-target geometry of a body over table_span, stored as float32 (~1 MB per body for 200 years)
+
+    Lookups interpolate linearly between the days, within 0.01 dB of space loss for all bodies.'''
+    def __init__(self, body, span=table_span):
+        self.body = body
+        self.start = days_since_J2000(span[0])
+        self.days = np.arange(self.start, days_since_J2000(span[1]) + 1)
+        distance, sep, elong = body_geometry(body, self.days)
+        self.values = np.stack([distance, sep, elong]).astype(np.float32)
+
+    def covers(self, days):
+        return np.size(days) == 0 or (np.min(days) >= self.days[0] and np.max(days) <= self.days[-1])
+
+    def lookup(self, days):
+        '''Obtain (distance [km], Sun-Earth-probe angle [deg], elongation angle [deg]) at days [d] from J2000'''
+        days = np.asarray(days, dtype=float)
+        # Days are equally spaced, so the interpolation index follows from the date directly
+        position = days - self.start
+        i = np.clip(position.astype(np.intp), 0, len(self.days) - 2)
+        u = position - i
+        values = self.values[:, i] * (1 - u) + self.values[:, i + 1] * u
+        return values[0], values[1], values[2]
+
+# Tables built so far, by target body
+distance_tables = {}
+
+def earth_target_geometry(body, dates):
+    '''Obtain (distance [km], Sun-Earth-probe angle [deg], elongation angle [deg]) of a target body at dates
+
+    Dates within table_span are looked up from the cached table of the body (built on first use), others
+    are evaluated from the orbital elements directly.'''
+    days = days_since_J2000(dates)
+    if body not in distance_tables:
+        distance_tables[body] = DistanceTable(body)
+    table = distance_tables[body]
+    if table.covers(days):
+        return table.lookup(days)
+    return body_geometry(body, days)
+
+### MARGIN VS. DATE ###
+class EphemerisResult:
+    '''Margin-vs-date series of a deep-space budget, with the solar conjunction windows [(start, end) dates]'''
+    def __init__(self, dates, distance, sep_angle, elong_angle, uplink_margin, downlink_margin, conjunctions):
+        self.dates = dates
+        self.distance = distance
+        self.sep_angle = sep_angle
+        self.elong_angle = elong_angle
+        self.uplink_margin = uplink_margin
+        self.downlink_margin = downlink_margin
+        self.conjunctions = conjunctions
+
+    def columns(self):
+        '''The series as {column: array}, e.g. for batch_io.open_chunk_writer'''
+        return {"date": self.dates.astype(str), "distance": self.distance, "sep_angle": self.sep_angle,
+                "elong_angle": self.elong_angle, "uplink_margin": self.uplink_margin,
+                "downlink_margin": self.downlink_margin}
+
+def date_range(start, stop, step_days=1):
+    '''Obtain the dates from start up to (excluding) stop every step_days days'''
+    return np.arange(np.datetime64(start, "D"), np.datetime64(stop, "D"), np.timedelta64(step_days, "D"))
+
+def margin_vs_date(inputs, dates, conjunction_angle=conjunction_angle):
+    '''Evaluate the link margins of a budget over dates with the Earth-target distance of the ephemeris
+
+    The budget is evaluated once and its space loss (over the mean distance of celestial_body_data or the
+    typed elong_angle) is swapped for the one over the distance at every date. Conjunction windows are
+    the dates with a Sun-Earth-probe angle below conjunction_angle [deg]. Returns an EphemerisResult.'''
+    if isinstance(inputs, LinkBudgetInput):
+        inputs = inputs.as_dict()
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    body = inputs.get("target_body", "Earth")
+    distance, sep_angle, elong_angle = earth_target_geometry(body, dates)
+
+    # Any elongation angle will do, the space loss it gives is replaced
+    base = calculate_link_budget_batch(dict(inputs, elong_angle=0.0))
+    freq_downlink = as_float(inputs["downlink_freq"])
+    freq_uplink = freq_downlink * as_float(inputs["sc_TAR"])
+    uplink_margin = base.uplink_data["M"][1] - base.uplink_data["L_space"][1] + free_space_loss(freq_uplink, distance * 1000)
+    downlink_margin = base.downlink_data["M"][1] - base.downlink_data["L_space"][1] + free_space_loss(freq_downlink, distance * 1000)
+
+    conjunctions = []
+    if len(dates):
+        # Conjunction windows from the daily mask, as for the contact windows of a pass
+        days = (dates - dates[0]) / np.timedelta64(1, "D")
+        step = days[1] - days[0] if len(days) > 1 else 1.0
+        windows, open_start = contact_windows(days, sep_angle < conjunction_angle, step)
+        if open_start is not None:
+            windows.append((open_start, days[-1] + step))
+        conjunctions = [(dates[0] + np.timedelta64(int(start), "D"), dates[0] + np.timedelta64(int(end), "D"))
+                        for start, end in windows]
+    return EphemerisResult(dates, distance, sep_angle, elong_angle, uplink_margin, downlink_margin, conjunctions)
@@ -0,0 +1,145 @@
+import math as m
+from core import v_light, boltzmann_const, celestial_body_data, channel_coding_data, uplink_freq_GHz
+from engine import (input_fields, uplink_terms, downlink_terms, LinkBudgetInput, LinkBudgetResult, tabulate,
+                    atmosphere_loss, default_sys_temp)
+
+### CONSTANTS ###
+# Terms that do not depend on the inputs, as computed by the scalar engine
+L_boltzmann = 10 * m.log10(float(boltzmann_const))
+four_pi = 4 * m.pi
+
+# Inputs parsed as floats; the optional ones may be left empty ("" or None)
+numeric_fields = [field for field in input_fields if field not in ("target_body", "modulation_coding")]
+optional_fields = ("elong_angle", "gs_elevation_angle", "temp_sys_uplink", "temp_sys_downlink")
+
+### PARSED INPUTS ###
+class ParsedInput:
+    '''Link budget inputs validated and converted once: floats for the numeric inputs (None for empty optional
+    ones), the coding and body constants looked up and the default system noise temperatures filled in
+
+    Slotted, so a record is small and its attributes are read without a dictionary lookup.'''
+    __slots__ = numeric_fields + ["target_body", "modulation_coding", "freq_uplink", "code_rate", "SNR_req", "mu",
+                                  "body_radius", "body_distance"]
+
+    def __init__(self, inputs):
+        '''Parse a LinkBudgetInput or {field: value} dictionary (missing fields default as in LinkBudgetInput),
+        raising a ValueError naming the first invalid input'''
+        if isinstance(inputs, LinkBudgetInput):
+            inputs = inputs.as_dict()
+        values = {**parse_defaults, **inputs}
+        unknown = [field for field in values if field not in input_fields]
+        if unknown:
+            raise ValueError(f"unknown inputs {unknown}")
+        self.target_body = values["target_body"]
+        self.modulation_coding = values["modulation_coding"]
+        if self.target_body not in celestial_body_data:
+            raise ValueError(f"unknown target_body {self.target_body!r}")
+        if self.modulation_coding not in channel_coding_data:
+            raise ValueError(f"unknown modulation_coding {self.modulation_coding!r}")
+        for field in numeric_fields:
+            if field not in values:
+                raise ValueError(f"missing input {field}")
+            value = values[field]
+            if value in ("", None) and field in optional_fields:
+                setattr(self, field, None)
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{field} must be a number, got {value!r}") from None
+            if not m.isfinite(value):
+                raise ValueError(f"{field} must be finite, got {value!r}")
+            setattr(self, field, value)
+
+        self.code_rate, self.SNR_req = channel_coding_data[self.modulation_coding]
+        self.mu, self.body_radius, self.body_distance = celestial_body_data[self.target_body]
+        self.freq_uplink = uplink_freq_GHz(self.downlink_freq, self.sc_TAR)
+        if self.target_body not in ("Earth", "Moon") and self.elong_angle is None:
+            raise ValueError("elong_angle must be a number for deep-space targets")
+        # System noise temperatures default to the same values the GUI pre-fills
+        for field, freq, uplink in (("temp_sys_uplink", self.freq_uplink, True),
+                                    ("temp_sys_downlink", self.downlink_freq, False)):
+            if getattr(self, field) is None:
+                temp = default_sys_temp(freq, uplink, self.gs_elevation_angle, self.link_availability)
+                if temp == "":
+                    raise ValueError(f"no default {field} at {freq} GHz, it must be given")
+                setattr(self, field, float(temp))
+
+# Defaults of the optional inputs, as in LinkBudgetInput
+parse_defaults = {"target_body": "Earth", "modulation_coding": "Uncoded", "antenna_sc_eff": 0.55, "antenna_gs_eff": 0.55,
+                  "gs_pointing_offset_angle": 0.05, "elong_angle": "", "temp_sys_uplink": None,
+                  "temp_sys_downlink": None, "gs_elevation_angle": "", "link_availability": 99.9}
+
+### FUSED BUDGET KERNEL ###
+def slant_range(p):
+    '''S/C to GS distance [m] of the near-Earth, Moon or deep-space geometry (as engine.body_space_loss)'''
+    if p.target_body == "Earth":
+        return m.sqrt((p.orbit_alt + p.body_radius)**2 - p.body_radius**2) * 1000
+    if p.target_body == "Moon":
+        return p.body_distance * 1000
+    d_earth_sun = celestial_body_data["Earth"][2]
+    return 1000 * m.sqrt(d_earth_sun**2 + p.body_distance**2
+                         - 2 * d_earth_sun * p.body_distance * m.cos(m.radians(p.elong_angle)))
+
+def budget_values(p):
+    '''Obtain the unrounded (uplink, downlink) values [dB] of a ParsedInput in the row order of uplink_terms and
+    downlink_terms
+
+    The same equations as engine.calculate_link_budget, evaluated in the same order so the values are
+    identical, but without re-parsing the inputs per term: the wavelength, slant range and Boltzmann term
+    are computed once and shared by the gain and loss terms of each link.'''
+    log10 = m.log10
+    S = slant_range(p)
+    L_TX = 10 * log10(p.transmitter_LF)
+    L_RX = 10 * log10(p.receiver_LF)
+
+    # UPLINK #
+    f = p.freq_uplink
+    wavelength = v_light / (f * 10**9)
+    P_GS = 10 * log10(p.transmitter_gs_power)
+    G_GS_TX = 10 * log10(p.antenna_gs_eff * ((m.pi * p.antenna_gs_diam) / wavelength)**2)
+    L_GS_pointing_out_up = 12 * (p.gs_pointing_offset_angle / (21 / (f * p.antenna_gs_diam)))**2
+    L_GS_space = 10 * log10((wavelength / (four_pi * S))**2)
+    L_GS_atm = 0.0 if p.gs_elevation_angle is None else atmosphere_loss(f, p.gs_elevation_angle, p.link_availability)
+    L_GS_pointing_in_up = 12 * (p.sc_pointing_offset_angle / (21 / (f * p.antenna_sc_diam)))**2
+    G_GS_RX = 10 * log10(p.antenna_sc_eff * ((m.pi * p.antenna_sc_diam) / wavelength)**2)
+    L_GS_DR = 10 * log10(p.uplink_datarate_req / p.code_rate)
+    L_GS_sys_temp = 10 * log10(1 / p.temp_sys_uplink)
+    SNR_uplink = (P_GS + L_TX + G_GS_TX - L_GS_pointing_out_up + L_GS_space - L_GS_atm - L_GS_pointing_in_up + L_RX
+                  + G_GS_RX - L_GS_DR - L_boltzmann + L_GS_sys_temp)
+    uplink_values = (P_GS, L_TX, G_GS_TX, -L_GS_pointing_out_up, L_GS_space, -L_GS_atm, -L_GS_pointing_in_up,
+                     G_GS_RX, L_RX, -L_GS_DR, -L_boltzmann, L_GS_sys_temp, SNR_uplink, p.SNR_req, SNR_uplink - p.SNR_req)
+
+    # DOWNLINK #
+    f = p.downlink_freq
+    wavelength = v_light / (f * 10**9)
+    P_SC = 10 * log10(p.transmitter_sc_power)
+    G_SC_TX = 10 * log10(p.antenna_sc_eff * ((m.pi * p.antenna_sc_diam) / wavelength)**2)
+    L_SC_pointing_out_down = 12 * (p.sc_pointing_offset_angle / (21 / (f * p.antenna_sc_diam)))**2
+    L_SC_space = 10 * log10((wavelength / (four_pi * S))**2)
+    L_SC_atm = 0.0 if p.gs_elevation_angle is None else atmosphere_loss(f, p.gs_elevation_angle, p.link_availability)
+    L_SC_pointing_in_down = 12 * (p.gs_pointing_offset_angle / (21 / (f * p.antenna_gs_diam)))**2
+    G_SC_RX = 10 * log10(p.antenna_gs_eff * ((m.pi * p.antenna_gs_diam) / wavelength)**2)
+    # Required data rate (see core.required_data_rate)
+    alt, r = p.orbit_alt, p.body_radius
+    V_ground = m.sqrt(p.mu / (alt + r)) * (r / (r + alt)) * 1000
+    p_size = 2 * alt * 1000 * m.tan(m.radians(p.PL_pixel_size / (60 * 2)))
+    sw_width = 2 * alt * 1000 * m.tan(m.radians(p.PL_SW_angle / 2))
+    R_G = p.PL_bpp * ((sw_width * V_ground) / (p_size**2))
+    R_req = R_G * (p.PL_duty_cycle / 100) / (p.PL_downlink_time / 24)
+    L_SC_DR = 10 * log10(R_req / p.code_rate)
+    L_SC_sys_temp = 10 * log10(1 / p.temp_sys_downlink)
+    SNR_downlink = (P_SC + L_TX + G_SC_TX - L_SC_pointing_out_down + L_SC_space - L_SC_atm - L_SC_pointing_in_down
+                    + L_RX + G_SC_RX - L_SC_DR - L_boltzmann + L_SC_sys_temp)
+    downlink_values = (P_SC, L_TX, G_SC_TX, -L_SC_pointing_out_down, L_SC_space, -L_SC_atm, -L_SC_pointing_in_down,
+                       G_SC_RX, L_RX, -L_SC_DR, -L_boltzmann, L_SC_sys_temp, SNR_downlink, p.SNR_req,
+                       SNR_downlink - p.SNR_req)
+    return uplink_values, downlink_values
+
+def calculate_link_budget_fast(inputs):
+    '''Calculate the uplink and downlink budgets of a ParsedInput (or anything ParsedInput accepts), tables
+    identical to engine.calculate_link_budget'''
+    if not isinstance(inputs, ParsedInput):
+        inputs = ParsedInput(inputs)
+    uplink_values, downlink_values = budget_values(inputs)
+    return LinkBudgetResult(tabulate(uplink_terms, uplink_values), tabulate(downlink_terms, downlink_values))
@@ -1,6 +1,9 @@
 import tkinter as tk
 import tkinter.ttk as ttk
 from core import*
+from engine import*
+from budget_graph import BudgetGraph
+from jobs import BackgroundJob, job_updates
 
 
 ### PREAMBLE ###
@@ -36,110 +39,132 @@ def toggle_entry(entry, enabled_var, default):
         entry.insert(0, updated_val)
         entry.config(state="disabled")
 
+def default_temp(uplink):
+    '''System noise temperature pre-filled for the current frequency, G/S elevation angle and availability'''
+    freq = uplink_freq_GHz(downlink_freq_entry.get(), sc_TAR_entry.get()) if uplink else downlink_freq_entry.get()
+    temp = default_sys_temp(freq, uplink, gs_elevation_angle_entry.get(), link_availability_entry.get() or 99.9)
+    return temp if temp == "" else round(temp, 1)
+
+def refresh_sys_temps():
+    '''Update the pre-filled system noise temperatures'''
+    toggle_entry(temp_sys_uplink_entry, temp_sys_uplink_enabled, str(default_temp(uplink=True)))
+    toggle_entry(temp_sys_downlink_entry, temp_sys_downlink_enabled, str(default_temp(uplink=False)))
+
 ### LINK MARGIN CALCULATION FUNCTION ###
+def read_input_values():
+    '''Collect the entry field values into a {field: value} dictionary'''
+    return dict(target_body=target_body_select.get(),
+                transmitter_sc_power=transmitter_sc_power_entry.get(),
+                transmitter_gs_power=transmitter_gs_power_entry.get(),
+                transmitter_LF=transmitter_LF_entry.get(),
+                receiver_LF=receiver_LF_entry.get(),
+                downlink_freq=downlink_freq_entry.get(),
+                sc_TAR=sc_TAR_entry.get(),
+                antenna_sc_diam=antenna_sc_diam_entry.get(),
+                antenna_sc_eff=antenna_sc_eff_entry.get(),
+                antenna_gs_diam=antenna_gs_diam_entry.get(),
+                antenna_gs_eff=antenna_gs_eff_entry.get(),
+                orbit_alt=orbit_alt_entry.get(),
+                elong_angle=elong_angle_entry.get(),
+                sc_pointing_offset_angle=sc_pointing_offset_angle_entry.get(),
+                gs_pointing_offset_angle=gs_pointing_offset_angle_entry.get(),
+                uplink_datarate_req=uplink_datarate_req_entry.get(),
+                PL_SW_angle=PL_SW_angle_entry.get(),
+                PL_pixel_size=PL_pixel_size_entry.get(),
+                PL_bpp=PL_bpp_entry.get(),
+                PL_duty_cycle=PL_duty_cycle_entry.get(),
+                PL_downlink_time=PL_downlink_time_entry.get(),
+                modulation_coding=selected_modulation_coding.get(),
+                temp_sys_uplink=temp_sys_uplink_entry.get(),
+                temp_sys_downlink=temp_sys_downlink_entry.get(),
+                gs_elevation_angle=gs_elevation_angle_entry.get(),
+                link_availability=link_availability_entry.get())
+
 def calculate_link_margin():
-    '''Utilize core functions to generate link margin and output to UI'''
-    # UPLINK #
-    # Obtain ground station transmitter power in dB
-    P_GS = val_to_dB(float(transmitter_gs_power_entry.get()))
-    L_GS_TX = val_to_dB(float(transmitter_LF_entry.get()))
-    G_GS_TX = transmitter_gain(uplink_freq_GHz(downlink_freq_entry.get(), sc_TAR_entry.get()), antenna_gs_diam_entry.get(), antenna_gs_eff_entry.get())
-    L_GS_pointing_out_up = pointing_loss(uplink_freq_GHz(downlink_freq_entry.get(), sc_TAR_entry.get()), antenna_gs_diam_entry.get(), gs_pointing_offset_angle_entry.get())
-    
-    # Logic for selection between deep space and near Earth L_GX_space equations
-    if target_body_select.get() == "Earth":
-        L_GS_space = space_loss(uplink_freq_GHz(downlink_freq_entry.get(), sc_TAR_entry.get()), orbit_alt_entry.get(), celestial_body_data[target_body_select.get()][1])
-    elif target_body_select.get() == "Moon":
-        L_GS_space = space_loss(uplink_freq_GHz(downlink_freq_entry.get(), sc_TAR_entry.get()), celestial_body_data[target_body_select.get()][2], 0)
-    else:
-        L_GS_space = space_loss_DS(uplink_freq_GHz(downlink_freq_entry.get(), sc_TAR_entry.get()), celestial_body_data["Earth"][2], celestial_body_data[target_body_select.get()][2], elong_angle_entry.get())
-        
-    L_GS_pointing_in_up = pointing_loss(uplink_freq_GHz(downlink_freq_entry.get(), sc_TAR_entry.get()), antenna_sc_diam_entry.get(), sc_pointing_offset_angle_entry.get())
-    L_GS_RX = val_to_dB(float(receiver_LF_entry.get()))
-    G_GS_RX = transmitter_gain(uplink_freq_GHz(downlink_freq_entry.get(), sc_TAR_entry.get()), antenna_sc_diam_entry.get(), antenna_sc_eff_entry.get())
-    L_GS_DR = val_to_dB(float(uplink_datarate_req_entry.get()) / channel_coding_data[selected_modulation_coding.get()][0])
-    L_boltzmann = val_to_dB(float(boltzmann_const))
-    L_GS_sys_temp = val_to_dB(1/float(temp_sys_uplink_entry.get()))
-    
-    # Link margin calculation (difference between SNR_uplink and SNR_uplink_req)
-    SNR_uplink = P_GS + L_GS_TX + G_GS_TX - L_GS_pointing_out_up + L_GS_space - L_GS_pointing_in_up + L_GS_RX + G_GS_RX - L_GS_DR - L_boltzmann + L_GS_sys_temp
-    SNR_uplink_req = channel_coding_data[selected_modulation_coding.get()][1]
-    link_margin_uplink = round((SNR_uplink - SNR_uplink_req), 5)
-    
-    # Tabulate the uplink data
-    global uplink_data
-    uplink_data = {
-        'P_GS': ('GS power', round(P_GS, 5)),
-        'L_TX': ('Transmitter loss', round(L_GS_TX, 5)),
-        'G_TX': ('Transmitter gain', round(G_GS_TX, 5)),
-        'L_GS_pointing': ('GS pointing loss', round(-L_GS_pointing_out_up, 5)),
-        'L_space': ('Space loss', round(L_GS_space, 5)),
-        'L_SC_pointing': ('S/C pointing loss', round(-L_GS_pointing_in_up, 5)),
-        'G_RX': ('Receiver gain', round(G_GS_RX, 5)),
-        'L_RX': ('Receiver loss', round(L_GS_RX, 5)),
-        '1/DR': ('Required data rate', round(-L_GS_DR, 5)),
-        '1/k': ('Boltzmann constant', round(-L_boltzmann, 5)),
-        '1/T_sys': ('System noise temperature', round(L_GS_sys_temp, 5)),
-        'SNR': ('Received signal-to-noise ratio', round(SNR_uplink, 5)),
-        'SNR_req': ('Required signal-to-noise ratio', round(SNR_uplink_req, 5)),
-        'M': ('Link margin', round(link_margin_uplink, 5))
-    }
-    
-    # DOWNLINK #
-    # Obtain spacecraft transmitter power in dB
-    P_SC = val_to_dB(float(transmitter_sc_power_entry.get()))
-    L_SC_TX = val_to_dB(float(transmitter_LF_entry.get()))
-    G_SC_TX = transmitter_gain(downlink_freq_entry.get(), antenna_sc_diam_entry.get(), antenna_sc_eff_entry.get())
-    L_SC_pointing_out_down = pointing_loss(downlink_freq_entry.get(), antenna_sc_diam_entry.get(), sc_pointing_offset_angle_entry.get())
-    
-    # Logic for selection between deep space and near Earth L_GX_space equations
-    if target_body_select.get() == "Earth":
-        L_SC_space = space_loss(downlink_freq_entry.get(), orbit_alt_entry.get(), celestial_body_data[target_body_select.get()][1])
-    elif target_body_select.get() == "Moon":
-        L_SC_space = space_loss(downlink_freq_entry.get(), celestial_body_data[target_body_select.get()][2], 0)
+    '''Utilize the link budget graph to generate link margin and output to UI'''
+    budget_graph.set(**read_input_values())
+    result = budget_graph.result()
+
+    # Tabulate the uplink and downlink data
+    global uplink_data, downlink_data
+    uplink_data = result.uplink_data
+    downlink_data = result.downlink_data
+
+    link_margin_output_uplink.config(text=result.link_margin_uplink)
+    link_margin_output_downlink.config(text=result.link_margin_downlink)
+
+def update_live_margin(*args):
+    '''Recompute only the terms affected by the changed entry and show the margins as you type'''
+    budget_graph.set(**read_input_values())
+    for term, output in (("M_uplink", link_margin_output_uplink), ("M_downlink", link_margin_output_downlink)):
+        # Entries are often incomplete while typing, then no margin is shown
+        try:
+            output.config(text=budget_graph.get(term))
+        except (ValueError, TypeError, ZeroDivisionError, KeyError):
+            output.config(text="")
+
+### BACKGROUND JOB FUNCTIONS ###
+# Interval [ms] at which the event loop collects the progress of a running job
+job_poll_interval = 100
+
+def describe_progress(kind, partial):
+    '''Summarise the partial results of a sweep, pass or Monte Carlo job for the status line'''
+    if kind == "sweep":
+        text = f"{partial['points']} points, {partial['closing'] / partial['points']:.1%} closing"
+        if partial["best_point"] is not None:
+            best = ", ".join(f"{name}={value if isinstance(value, str) else f'{value:g}'}"
+                             for name, value in partial["best_point"].items())
+            text += f", margin {partial['min_margin']:.2f} to {partial['max_margin']:.2f} dB (best at {best})"
+        return text
+    if kind == "pass":
+        text = f"{partial['contact_time'] / 60:.1f} min of contact in {partial['passes']} passes"
+        if partial["contact_time"]:
+            text += f", downlink margin {partial['min_margin']:.2f} to {partial['max_margin']:.2f} dB"
+        return text
+    return "; ".join(f"{link}: mean {summary['mean']:.2f} dB, 1% {summary['percentiles'][1]:.2f} dB, "
+                     f"P(M<0) {summary['P(M<0)']:.2%}" for link, summary in partial.items() if summary["samples"])
+
+def show_job_hint():
+    '''Replace the job parameters by an example for the selected job'''
+    job_parameters_entry.delete(0, 'end')
+    job_parameters_entry.insert(0, job_parameter_hints[job_kind.get()])
+
+def start_job():
+    '''Submit the selected job with the current inputs to a background thread'''
+    global job
+    try:
+        updates = job_updates(job_kind.get(), read_input_values(), job_parameters_entry.get())
+    except (ValueError, KeyError) as err:
+        job_status_output.config(text=f"Invalid job parameters: {err}")
+        return
+    job = BackgroundJob(updates).start()
+    job_progress.config(value=0)
+    job_status_output.config(text="Running...")
+    job_start_button.config(state="disabled")
+    job_cancel_button.config(state="normal")
+    root.after(job_poll_interval, poll_job, job_kind.get())
+
+def cancel_job():
+    if job is not None:
+        job.cancel()
+        job_status_output.config(text="Cancelling...")
+
+def poll_job(kind):
+    '''Show the progress and partial results of the running job, called from the event loop'''
+    for message, value in job.poll():
+        if message == "progress":
+            done, total, partial = value
+            job_progress.config(value=100 * done / total if total else 100)
+            job_status_output.config(text=describe_progress(kind, partial))
+        elif message == "cancelled":
+            job_status_output.config(text="Cancelled: " + job_status_output.cget("text"))
+        elif message == "error":
+            job_status_output.config(text=f"Failed: {value}")
+    if job.running or not job.messages.empty():
+        root.after(job_poll_interval, poll_job, kind)
     else:
-        L_SC_space = space_loss_DS(downlink_freq_entry.get(), celestial_body_data["Earth"][2], celestial_body_data[target_body_select.get()][2], elong_angle_entry.get())
-        
-    L_SC_pointing_in_down = pointing_loss(downlink_freq_entry.get(), antenna_gs_diam_entry.get(), gs_pointing_offset_angle_entry.get())
-    L_SC_RX = val_to_dB(float(receiver_LF_entry.get()))
-    G_SC_RX = transmitter_gain(downlink_freq_entry.get(), antenna_gs_diam_entry.get(), antenna_gs_eff_entry.get())
-    L_SC_DR = required_data_rate(PL_bpp_entry.get(), 
-                                 PL_SW_angle_entry.get(), 
-                                 PL_pixel_size_entry.get(), 
-                                 orbit_alt_entry.get(), 
-                                 PL_duty_cycle_entry.get(), 
-                                 PL_downlink_time_entry.get(), 
-                                 channel_coding_data[selected_modulation_coding.get()][0],
-                                 celestial_body_data[target_body_select.get()][0],
-                                 celestial_body_data[target_body_select.get()][1])
-    L_SC_sys_temp = val_to_dB(1/float(temp_sys_downlink_entry.get()))
-        
-    # Link margin calculation (difference between SNR_downlink and SNR_downlink_req)
-    SNR_downlink= P_SC + L_SC_TX + G_SC_TX - L_SC_pointing_out_down + L_SC_space - L_SC_pointing_in_down + L_SC_RX + G_SC_RX - L_SC_DR - L_boltzmann + L_SC_sys_temp
-    SNR_downlink_req = channel_coding_data[selected_modulation_coding.get()][1]
-    link_margin_downlink = round((SNR_downlink - SNR_downlink_req), 5)
-    
-    # Tabulate the downlink data
-    global downlink_data
-    downlink_data = {
-        'P_SC': ('S/C power', round(P_SC, 5)),
-        'L_TX': ('Transmitter loss', round(L_SC_TX, 5)),
-        'G_TX': ('Transmitter gain', round(G_SC_TX, 5)),
-        'L_SC_pointing': ('S/C pointing loss', round(-L_SC_pointing_out_down, 5)),
-        'L_space': ('Space loss', round(L_SC_space, 5)),
-        'L_GS_pointing': ('GS pointing loss', round(-L_SC_pointing_in_down, 5)),
-        'G_RX': ('Receiver gain', round(G_SC_RX, 5)),
-        'L_RX': ('Receiver loss', round(L_SC_RX, 5)),
-        '1/DR': ('Required data rate', round(-L_SC_DR, 5)),
-        '1/k': ('Boltzmann constant', round(-L_boltzmann, 5)),
-        '1/T_sys': ('System noise temperature', round(L_SC_sys_temp, 5)),
-        'SNR': ('Received signal-to-noise ratio', round(SNR_downlink, 5)),
-        'SNR_req': ('Required signal-to-noise ratio', round(SNR_downlink_req, 5)),
-        'M': ('Link margin', round(link_margin_downlink, 5))
-    }
-
-    link_margin_output_uplink.config(text=link_margin_uplink)
-    link_margin_output_downlink.config(text=link_margin_downlink)
+        job_start_button.config(state="normal")
+        job_cancel_button.config(state="disabled")
 
 #### GUI LAYOUT/SETUP ###
 root = tk.Tk()
@@ -206,6 +231,8 @@ BER_exponent.set("-6")
 # Initialize uplink and downlink data
 uplink_data = []
 downlink_data = []
+budget_graph = BudgetGraph()
+job = None
 
 # Orbital target input field
 target_body_label = tk.Label(root, text="Orbital target:")
@@ -252,8 +279,8 @@ downlink_freq_entry = tk.Entry(root, validate="key", validatecommand=(vcmd, '%P'
 downlink_freq_entry.grid(row=5, column=1)
 downlink_freq_unit = tk.Label(root, text="[GHz]")
 downlink_freq_unit.grid(row=5, column=2)
-downlink_freq_entry.bind("<KeyRelease>", lambda *args: toggle_entry(temp_sys_uplink_entry, temp_sys_uplink_enabled, str(sys_temp(uplink_freq_GHz(downlink_freq_entry.get(), sc_TAR_entry.get())))), add='+')
-downlink_freq_entry.bind("<KeyRelease>", lambda *args: toggle_entry(temp_sys_downlink_entry, temp_sys_downlink_enabled, str(sys_temp(downlink_freq_entry.get(), uplink=False))), add='+')
+downlink_freq_entry.bind("<KeyRelease>", lambda *args: toggle_entry(temp_sys_uplink_entry, temp_sys_uplink_enabled, str(default_temp(uplink=True))), add='+')
+downlink_freq_entry.bind("<KeyRelease>", lambda *args: toggle_entry(temp_sys_downlink_entry, temp_sys_downlink_enabled, str(default_temp(uplink=False))), add='+')
 
 # Turn around ratio (TAR) input field
 sc_TAR_label = tk.Label(root, text="Turn around ratio:")
@@ -262,7 +289,7 @@ sc_TAR_entry = tk.Entry(root, validate="key", validatecommand=(vcmd, '%P'), widt
 sc_TAR_entry.grid(row=6, column=1)
 sc_TAR_unit = tk.Label(root, text="[-]")
 sc_TAR_unit.grid(row=6, column=2)
-sc_TAR_entry.bind("<KeyRelease>", lambda *args: toggle_entry(temp_sys_uplink_entry, temp_sys_uplink_enabled, str(sys_temp(uplink_freq_GHz(downlink_freq_entry.get(), sc_TAR_entry.get())))))
+sc_TAR_entry.bind("<KeyRelease>", lambda *args: toggle_entry(temp_sys_uplink_entry, temp_sys_uplink_enabled, str(default_temp(uplink=True))))
 
 
 # S/C antenna diameter input field
@@ -412,7 +439,7 @@ temp_sys_uplink_unit = tk.Label(root, text="[K]")
 temp_sys_uplink_unit.grid(row=23, column=2)
 temp_sys_uplink_checkbox = tk.Checkbutton(root, variable=temp_sys_uplink_enabled)
 temp_sys_uplink_checkbox.grid(row=23, column=3)
-temp_sys_uplink_enabled.trace_add("write", lambda *args: toggle_entry(temp_sys_uplink_entry, temp_sys_uplink_enabled, str(sys_temp(uplink_freq_GHz(downlink_freq_entry.get(), sc_TAR_entry.get())))))
+temp_sys_uplink_enabled.trace_add("write", lambda *args: toggle_entry(temp_sys_uplink_entry, temp_sys_uplink_enabled, str(default_temp(uplink=True))))
 
 # Downlink system noise temperature input field
 temp_sys_downlink_label = tk.Label(root, text="Downlink system noise temp.:")
@@ -423,30 +450,89 @@ temp_sys_downlink_unit = tk.Label(root, text="[K]")
 temp_sys_downlink_unit.grid(row=24, column=2)
 temp_sys_downlink_checkbox = tk.Checkbutton(root, variable=temp_sys_downlink_enabled)
 temp_sys_downlink_checkbox.grid(row=24, column=3)
-temp_sys_downlink_enabled.trace_add("write", lambda *args: toggle_entry(temp_sys_downlink_entry, temp_sys_downlink_enabled, str(sys_temp(downlink_freq_entry.get(), uplink=False))))
+temp_sys_downlink_enabled.trace_add("write", lambda *args: toggle_entry(temp_sys_downlink_entry, temp_sys_downlink_enabled, str(default_temp(uplink=False))))
+
+# GS elevation angle input field (atmospheric loss is only included when given)
+gs_elevation_angle_label = tk.Label(root, text="G/S elevation angle:")
+gs_elevation_angle_label.grid(row=25, column=0)
+gs_elevation_angle_entry = tk.Entry(root, validate="key", validatecommand=(vcmd, '%P'), width=13)
+gs_elevation_angle_entry.grid(row=25, column=1)
+gs_elevation_angle_unit = tk.Label(root, text="[°]")
+gs_elevation_angle_unit.grid(row=25, column=2)
+
+# Link availability input field
+link_availability_label = tk.Label(root, text="Link availability:")
+link_availability_label.grid(row=26, column=0)
+link_availability_entry = tk.Entry(root, validate="key", validatecommand=(vcmd, '%P'), width=13)
+link_availability_entry.grid(row=26, column=1)
+link_availability_entry.insert(0, "99.9")
+link_availability_unit = tk.Label(root, text="[%]")
+link_availability_unit.grid(row=26, column=2)
+for entry in (gs_elevation_angle_entry, link_availability_entry):
+    entry.bind("<KeyRelease>", lambda *args: refresh_sys_temps())
 
 # Output the calculated link margin
 calculate_button = tk.Button(root, text="Calculate", command=calculate_link_margin)
-calculate_button.grid(row=27, column=0)
+calculate_button.grid(row=29, column=0)
 link_margin_label_uplink=tk.Label(root, text="Link margin - Uplink")
-link_margin_label_uplink.grid(row=25, column=0)
+link_margin_label_uplink.grid(row=27, column=0)
 link_margin_output_uplink = tk.Label(root, text="", width=13)
-link_margin_output_uplink.grid(row=25, column=1)
+link_margin_output_uplink.grid(row=27, column=1)
 link_margin_output_uplink_units = tk.Label(root, text="[dB]")
-link_margin_output_uplink_units.grid(row=25, column=2)
+link_margin_output_uplink_units.grid(row=27, column=2)
 link_margin_label_downlink=tk.Label(root, text="Link margin - Downlink")
-link_margin_label_downlink.grid(row=26, column=0)
+link_margin_label_downlink.grid(row=28, column=0)
 link_margin_output_downlink = tk.Label(root, text="", width=13)
-link_margin_output_downlink.grid(row=26, column=1)
+link_margin_output_downlink.grid(row=28, column=1)
 link_margin_output_downlink_units = tk.Label(root, text="[dB]")
-link_margin_output_downlink_units.grid(row=26, column=2)
+link_margin_output_downlink_units.grid(row=28, column=2)
 
 # Citation generator
 citation_generator_button = tk.Button(root, text="Copy BibTeX citation to clipboard", command=lambda: generate_bibtex(title, version))
-citation_generator_button.grid(row=27, column=1)
+citation_generator_button.grid(row=29, column=1)
 
 # CSV file generator
 csv_generator_button = tk.Button(root, text="Save to CSV", command=lambda: write_to_csv(uplink_data, downlink_data))
-csv_generator_button.grid(row=28, column=0)
+csv_generator_button.grid(row=30, column=0)
+
+# Background jobs (sweeps, pass simulations and Monte Carlo analyses of the current inputs)
+job_kind_options = ["sweep", "pass", "monte carlo"]
+job_parameter_hints = {"sweep": "downlink_freq=1:30:100000 antenna_gs_diam=5,10,15",
+                       "pass": "duration=86400 step=1 inclination=98 gs_latitude=52",
+                       "monte carlo": "antenna_gs_diam=normal,10,0.2 samples=1000000"}
+job_kind = tk.StringVar()
+job_kind.set(job_kind_options[0])
+job_kind_label = tk.Label(root, text="Background job:")
+job_kind_label.grid(row=31, column=0)
+job_kind_option_menu = ttk.Combobox(root, textvariable=job_kind, values=job_kind_options, state="readonly", width=13)
+job_kind_option_menu.grid(row=31, column=1)
+job_start_button = tk.Button(root, text="Start", command=start_job)
+job_start_button.grid(row=31, column=2)
+job_cancel_button = tk.Button(root, text="Cancel", command=cancel_job, state="disabled")
+job_cancel_button.grid(row=31, column=3)
+job_parameters_label = tk.Label(root, text="Job parameters:")
+job_parameters_label.grid(row=32, column=0)
+job_parameters_entry = tk.Entry(root, width=50)
+job_parameters_entry.grid(row=32, column=1, columnspan=3)
+job_parameters_entry.insert(0, job_parameter_hints[job_kind.get()])
+
+job_kind.trace_add("write", lambda *args: show_job_hint())
+job_progress = ttk.Progressbar(root, maximum=100, length=150)
+job_progress.grid(row=33, column=0)
+job_status_output = tk.Label(root, text="", wraplength=400, justify="left")
+job_status_output.grid(row=33, column=1, columnspan=3)
+
+# Live link margin updates (bound last, so the noise temperature defaults are refreshed first)
+for entry in (transmitter_sc_power_entry, transmitter_gs_power_entry, transmitter_LF_entry, receiver_LF_entry,
+              downlink_freq_entry, sc_TAR_entry, antenna_sc_diam_entry, antenna_sc_eff_entry, antenna_gs_diam_entry,
+              antenna_gs_eff_entry, orbit_alt_entry, elong_angle_entry, sc_pointing_offset_angle_entry,
+              gs_pointing_offset_angle_entry, uplink_datarate_req_entry, PL_SW_angle_entry, PL_pixel_size_entry,
+              PL_bpp_entry, PL_duty_cycle_entry, PL_downlink_time_entry, temp_sys_uplink_entry, temp_sys_downlink_entry,
+              gs_elevation_angle_entry, link_availability_entry):
+    entry.bind("<KeyRelease>", update_live_margin, add='+')
+for variable in (target_body_select, selected_modulation_coding, antenna_sc_eff_enabled, antenna_gs_eff_enabled,
+                 gs_pointing_offset_enabled, temp_sys_uplink_enabled, temp_sys_downlink_enabled):
+    # Deferred until the other traces (entry toggles) have updated the entry fields
+    variable.trace_add("write", lambda *args: root.after_idle(update_live_margin))
 
 root.mainloop()
\ No newline at end of file
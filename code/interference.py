@@ -0,0 +1,198 @@
+import numpy as np
+from core import v_light
+from engine import LinkBudgetInput
+from vectorized import (calculate_link_budget_batch, transmitter_gain, pointing_loss, free_space_loss, uplink_freq_GHz,
+                        as_float, val_to_dB, batch_defaults)
+
+### CONSTANTS ###
+# Fields of an interfering transmitter, None for the required ones
+# Data format: field: default value
+interferer_fields = {"link": None, "power": None, "freq": None, "bandwidth": None, "antenna_diam": None,
+                     "antenna_eff": 0.55, "transmitter_LF": 1.0, "distance": None, "tx_offset_angle": 0.0,
+                     "rx_offset_angle": 0.0}
+# link: "uplink" (received by the S/C) or "downlink" (received by the GS), power [W], freq (carrier centre) [GHz],
+# bandwidth [Hz], antenna_diam [m], distance to the receiver [km], tx_offset_angle [deg] off the boresight of the
+# interferer towards the receiver, rx_offset_angle [deg] off the boresight of the receiver towards the interferer
+
+# Receiving antenna of each link
+# Data format: link: (diameter input, efficiency input)
+receivers = {"uplink": ("antenna_sc_diam", "antenna_sc_eff"), "downlink": ("antenna_gs_diam", "antenna_gs_eff")}
+
+# Data format: key, description (row order of the interference tables)
+interference_terms = [("C", "Received carrier power [dBW]"),
+                      ("N", "Noise power in the carrier band [dBW]"),
+                      ("I", "Interference power in the carrier band [dBW]"),
+                      ("C/N", "Carrier-to-noise ratio"),
+                      ("C/I", "Carrier-to-interference ratio"),
+                      ("C/(N+I)", "Carrier-to-noise-plus-interference ratio"),
+                      ("I/N", "Interference-to-noise ratio"),
+                      ("degradation", "Degradation of E_b/N_o by interference"),
+                      ("M", "Link margin with interference")]
+
+# Interferer x budget pairs evaluated per chunk, bounds the memory of large interferer sets (~100 MB)
+chunk_elements = 2**21
+
+### INTERFERERS ###
+def interferer_columns(interferers):
+    '''Turn a list of interferer dictionaries (or a {field: values} dictionary) into {field: array} columns,
+    filling in the defaults of interferer_fields'''
+    if isinstance(interferers, dict):
+        columns = {field: np.atleast_1d(np.asarray(values)) for field, values in interferers.items()}
+        size = len(next(iter(columns.values()))) if columns else 0
+    else:
+        size = len(interferers)
+        fields = list(dict.fromkeys(field for entry in interferers for field in entry))
+        columns = {field: np.asarray([entry.get(field, interferer_fields.get(field)) for entry in interferers])
+                   for field in fields}
+    unknown = [field for field in columns if field not in interferer_fields]
+    if unknown:
+        raise KeyError(f"unknown interferer fields {unknown}")
+    missing = [field for field, default in interferer_fields.items() if default is None and field not in columns]
+    if missing and size:
+        raise ValueError(f"interferers lack the fields {missing}")
+    for field, default in interferer_fields.items():
+        if field not in columns:
+            columns[field] = np.full(size, default)
+        elif field != "link":
+            columns[field] = as_float(columns[field])
+    columns["link"] = np.asarray(columns["link"], dtype=str)
+    invalid = sorted(set(columns["link"]) - set(receivers))
+    if invalid:
+        raise ValueError(f"unknown interferer links {invalid}, use 'uplink' or 'downlink'")
+    return columns
+
+def off_axis_gain(freq_GHz, diam, antenna_efficiency, offset_angle):
+    '''Obtain the gain [dBi] of an antenna offset_angle [deg] off boresight: its main lobe as in the budget
+    (transmitter_gain minus pointing_loss), but not below the ITU-R S.465 sidelobe envelope 32 - 25 log10(angle)
+    dBi (at least -10 dBi, from max(1 deg, 100 wavelengths/diameter) off boresight)'''
+    peak = transmitter_gain(freq_GHz, diam, antenna_efficiency)
+    main_lobe = peak - pointing_loss(freq_GHz, diam, offset_angle)
+    wavelength = v_light / (as_float(freq_GHz) * 10**9)
+    angle = np.maximum(as_float(offset_angle), np.maximum(1.0, 100 * wavelength / as_float(diam)))
+    sidelobe = np.maximum(32 - 25 * np.log10(angle), -10.0)
+    return np.maximum(main_lobe, np.minimum(sidelobe, peak))
+
+### AGGREGATE INTERFERENCE ###
+class InterferenceResult:
+    '''Uplink and downlink interference tables {key: (description, array)} in the rows of interference_terms,
+    the index of the strongest interferer per budget (-1 if none) and the interferers left per link after
+    the frequency and power pre-filtering'''
+    def __init__(self, uplink_data, downlink_data, worst, evaluated):
+        self.uplink_data = uplink_data
+        self.downlink_data = downlink_data
+        self.worst = worst
+        self.evaluated = evaluated
+
+    @property
+    def link_margin_uplink(self):
+        return self.uplink_data["M"][1]
+
+    @property
+    def link_margin_downlink(self):
+        return self.downlink_data["M"][1]
+
+def link_interference(inputs, table, link, columns, bandwidth=None, prune_level=-40.0):
+    '''Aggregate the interferers of one link into the carrier band of every budget of a batch
+
+    Returns ({key: values [dB]} of interference_terms, strongest interferer per budget, interferers evaluated).'''
+    # Carrier of the budget: C/N_0 from the E_b/N_o and transmitted data rate, noise density from k T_sys
+    SNR, DR, k, T_sys, L_RX, margin = (table[key][1] for key in ("SNR", "1/DR", "1/k", "1/T_sys", "L_RX", "M"))
+    C_N0 = SNR - DR
+    N0 = -k - T_sys
+    if bandwidth is None:
+        # Occupied band of the carrier taken as its channel bit rate (1 bit/s/Hz)
+        bandwidth = 10**(-DR / 10)
+    freq_downlink = as_float(inputs["downlink_freq"])
+    freq = uplink_freq_GHz(freq_downlink, inputs["sc_TAR"]) if link == "uplink" else freq_downlink
+    diam_field, eff_field = receivers[link]
+    shape = np.broadcast_shapes(*(np.shape(values) for values in (C_N0, N0, L_RX, margin, bandwidth, freq)),
+                                np.shape(as_float(inputs[diam_field])), np.shape(as_float(inputs[eff_field])))
+    # Budgets along axis 0, interferers along axis 1
+    def column(values):
+        return np.broadcast_to(values, shape).reshape(-1, 1)
+    C = column(C_N0 + N0)
+    N = column(N0 + val_to_dB(as_float(bandwidth)))
+    L_RX = column(L_RX)
+    bandwidth = column(as_float(bandwidth))
+    low = column(freq) * 10**9 - bandwidth / 2
+    high = column(freq) * 10**9 + bandwidth / 2
+    diam = column(as_float(inputs[diam_field]))
+    eff = column(as_float(inputs[eff_field]))
+
+    # Pre-filtering: carriers outside the band of every budget are left out, then the weakest interferers as
+    # long as their upper bounds on I/N (the largest receiving antenna pointed at them) add up to less than
+    # prune_level [dB], so the pruned interferers together stay below it however many there are
+    selected = np.flatnonzero(columns["link"] == link)
+    i_freq = columns["freq"][selected] * 10**9
+    i_half_band = columns["bandwidth"][selected] / 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Power [dBW] an isotropic antenna would receive from each interferer
+        isotropic = (val_to_dB(columns["power"][selected]) + val_to_dB(columns["transmitter_LF"][selected])
+                     + off_axis_gain(columns["freq"][selected], columns["antenna_diam"][selected],
+                                     columns["antenna_eff"][selected], columns["tx_offset_angle"][selected])
+                     + free_space_loss(columns["freq"][selected], columns["distance"][selected] * 1000))
+        largest_aperture = np.nanmax(eff * diam**2) if diam.size else np.nan
+        bound = (isotropic + transmitter_gain(columns["freq"][selected], np.sqrt(largest_aperture), 1.0)
+                 + np.nanmax(L_RX, initial=-np.inf) - np.nanmin(N, initial=np.inf))
+    overlaps = ((i_freq + i_half_band > np.nanmin(low, initial=np.inf))
+                & (i_freq - i_half_band < np.nanmax(high, initial=-np.inf)))
+    selected, isotropic, bound = selected[overlaps], isotropic[overlaps], bound[overlaps]
+    # Invalid bounds (NaN) sort last and are kept
+    order = np.argsort(np.nan_to_num(bound, nan=np.inf))
+    negligible = np.zeros(len(bound), dtype=bool)
+    with np.errstate(over="ignore"):
+        negligible[order] = np.cumsum(10**(bound[order] / 10)) < 10**(prune_level / 10)
+    selected, isotropic = selected[~negligible], isotropic[~negligible]
+
+    # Matrix evaluation over budget x interferer pairs, in chunks of interferers
+    interference = np.zeros(len(C))
+    strongest = np.zeros(len(C))
+    worst = np.full(len(C), -1)
+    step = max(1, chunk_elements // max(len(C), 1))
+    for start in range(0, len(selected), step):
+        index = selected[start:start + step]
+        i_freq = columns["freq"][index] * 10**9
+        i_bandwidth = columns["bandwidth"][index]
+        # Share of the interferer power falling into the carrier band
+        overlap = np.clip(np.minimum(high, i_freq + i_bandwidth / 2) - np.maximum(low, i_freq - i_bandwidth / 2),
+                          0.0, None) / i_bandwidth
+        G_RX = off_axis_gain(columns["freq"][index], diam, eff, columns["rx_offset_angle"][index])
+        power = 10**((isotropic[start:start + step] + G_RX + L_RX) / 10) * overlap
+        interference += power.sum(axis=1)
+        if power.shape[1]:
+            largest = power.argmax(axis=1)
+            largest_power = power[np.arange(len(C)), largest]
+            stronger = largest_power > strongest
+            strongest = np.where(stronger, largest_power, strongest)
+            worst = np.where(stronger, index[largest], worst)
+
+    with np.errstate(divide="ignore"):
+        I = val_to_dB(interference)
+    C, N = C[:, 0], N[:, 0]
+    noise = 10**(N / 10)
+    degradation = val_to_dB(1 + interference / noise)
+    values = {"C": C, "N": N, "I": I, "C/N": C - N, "C/I": C - I, "C/(N+I)": C - val_to_dB(noise + interference),
+              "I/N": I - N, "degradation": degradation, "M": np.broadcast_to(margin, shape).reshape(-1) - degradation}
+    return {key: value.reshape(shape) for key, value in values.items()}, worst.reshape(shape), len(selected)
+
+def calculate_interference(inputs, interferers, bandwidth=None, prune_level=-40.0):
+    '''Calculate C/(N+I) of the uplink and downlink of a budget (or a {field: value or array} batch) sharing its
+    bands with interfering transmitters
+
+    interferers is a list of dictionaries (or {field: values} columns) with the fields of interferer_fields.
+    Their power received in the carrier band follows from the same gain, pointing and space loss models
+    as the budget, with the sidelobe envelope of off_axis_gain far off boresight, and the share of their
+    band overlapping the carrier band (bandwidth [Hz], by default the channel bit rate). Interference
+    adds to the thermal noise, degrading E_b/N_o and the margin by 10 log10(1 + I/N). The weakest interferers
+    are left out while their I/N at best adds up to less than prune_level [dB]. Returns an InterferenceResult.'''
+    if isinstance(inputs, LinkBudgetInput):
+        inputs = inputs.as_dict()
+    inputs = {**batch_defaults, **{k: v for k, v in inputs.items() if v is not None}}
+    columns = interferer_columns(interferers)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = calculate_link_budget_batch(inputs)
+    tables, worst, evaluated = {}, {}, {}
+    for link, table in (("uplink", result.uplink_data), ("downlink", result.downlink_data)):
+        values, worst[link], evaluated[link] = link_interference(inputs, table, link, columns, bandwidth, prune_level)
+        tables[link] = {key: (desc, values[key]) for key, desc in interference_terms}
+    return InterferenceResult(tables["uplink"], tables["downlink"], worst, evaluated)
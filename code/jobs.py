@@ -0,0 +1,153 @@
+import argparse
+import queue
+import shlex
+import threading
+import numpy as np
+from linkbudget import parse_axis
+from montecarlo import iter_monte_carlo, distribution_parameters
+from orbit import iter_pass, contact_windows
+from sweep import iter_sweep, sweep_size
+
+### BACKGROUND JOBS ###
+class BackgroundJob:
+    '''Run a long computation on a background thread and hand its progress to the GUI through a queue
+
+    updates is an iterator yielding (done, total, partial results) after every chunk of work, e.g. one of
+    the *_updates functions below (whose chunks may in turn run in worker processes). The GUI thread calls
+    poll() from its event loop, so it never blocks and Tk is only touched from its own thread. cancel()
+    stops the job after the chunk in progress.'''
+    def __init__(self, updates):
+        self.updates = updates
+        self.messages = queue.Queue()
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        # Data format of the messages: ("progress", (done, total, partial)), ("done", None),
+        # ("cancelled", None) or ("error", exception)
+        try:
+            for done, total, partial in self.updates:
+                self.messages.put(("progress", (done, total, partial)))
+                if self.cancelled.is_set():
+                    self.messages.put(("cancelled", None))
+                    return
+            self.messages.put(("done", None))
+        except Exception as err:
+            self.messages.put(("error", err))
+        finally:
+            # Closing the generator shuts down its worker pool (see sweep.iter_sweep)
+            close = getattr(self.updates, "close", None)
+            if close is not None:
+                close()
+
+    def poll(self):
+        '''Obtain the messages queued since the last call, without waiting'''
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    @property
+    def running(self):
+        return self.thread.is_alive()
+
+### JOB UPDATES ###
+def sweep_updates(inputs, axes, chunk_size=65536, workers=None):
+    '''Run a sweep (see sweep.iter_sweep), yielding the points done with the running margin summary
+
+    Only the summary is kept (points, fraction closing on both links, smallest and largest margin and the
+    swept values of the best point), so memory does not grow with the sweep.'''
+    total = sweep_size(axes)
+    summary = {"points": 0, "closing": 0, "min_margin": np.inf, "max_margin": -np.inf, "best_point": None}
+    for start, stop, columns in iter_sweep(inputs, axes, chunk_size, workers):
+        with np.errstate(invalid="ignore"):
+            margin = np.minimum(columns["uplink_M"], columns["downlink_M"])
+        summary["points"] = stop
+        summary["closing"] += int(np.count_nonzero(margin >= 0))
+        if not np.isnan(margin).all():
+            i = int(np.nanargmax(margin))
+            summary["min_margin"] = min(summary["min_margin"], float(np.nanmin(margin)))
+            if margin[i] > summary["max_margin"]:
+                summary["max_margin"] = float(margin[i])
+                summary["best_point"] = {name: columns[name][i] for name in axes}
+        yield stop, total, dict(summary)
+
+def monte_carlo_updates(inputs, distributions, samples=10**7, chunk_size=2**20, seed=None, workers=None):
+    '''Run a Monte Carlo analysis (see montecarlo.iter_monte_carlo), yielding the samples done with the
+    uplink/downlink summaries so far'''
+    for done, uplink, downlink in iter_monte_carlo(inputs, distributions, samples, chunk_size, seed, workers):
+        yield done, samples, {"uplink": uplink.summary(), "downlink": downlink.summary()}
+
+def pass_updates(inputs, duration, step=1.0, chunk_size=3600, **kwargs):
+    '''Run a pass simulation (see orbit.iter_pass), yielding the simulated time [s] with the contact time [s],
+    completed passes and downlink margin range [dB] in contact so far'''
+    summary = {"contact_time": 0.0, "passes": 0, "in_contact": False, "min_margin": np.inf, "max_margin": -np.inf}
+    open_start = None
+    for chunk in iter_pass(inputs, duration, step, chunk_size=chunk_size, **kwargs):
+        windows, open_start = contact_windows(chunk["time"], chunk["contact"], step, open_start)
+        summary["passes"] += len(windows)
+        summary["in_contact"] = open_start is not None
+        summary["contact_time"] += float(np.count_nonzero(chunk["contact"]) * step)
+        margin = chunk["downlink_margin"][chunk["contact"]]
+        if margin.size:
+            summary["min_margin"] = min(summary["min_margin"], float(margin.min()))
+            summary["max_margin"] = max(summary["max_margin"], float(margin.max()))
+        yield min(float(chunk["time"][-1] + step), duration), duration, dict(summary)
+
+### JOB PARAMETERS ###
+def parse_distribution(text):
+    '''Parse a sampled input "name=distribution,parameter,..." (see montecarlo.sample)'''
+    name, _, spec = text.partition("=")
+    distribution, *parameters = spec.split(",")
+    if distribution not in distribution_parameters or len(parameters) != len(distribution_parameters[distribution]):
+        raise ValueError(f"invalid distribution '{text}'")
+    return name, (distribution, *map(float, parameters))
+
+def job_updates(kind, inputs, text):
+    '''Build the updates of a GUI job from its whitespace-separated parameters:
+
+    "sweep": axes as name=start:stop:num or name=a,b,c, optionally workers=N
+    "pass": duration=SECONDS, optionally step=SECONDS and the numeric orbit options of orbit.iter_pass
+    "monte carlo": sampled inputs as name=distribution,parameters, optionally samples=N, seed=N, workers=N
+
+    Parameters holding spaces are quoted, e.g. "modulation_coding=Uncoded,LDPC: r=3/4".'''
+    options = {}
+    specs = []
+    try:
+        tokens = shlex.split(text)
+    except ValueError as err:
+        raise ValueError(f"invalid job parameters: {err}") from None
+    for token in tokens:
+        name, _, value = token.partition("=")
+        if name in ("workers", "samples", "seed"):
+            options[name] = int(value)
+        elif kind == "pass":
+            options[name] = float(value)
+        else:
+            specs.append(token)
+    if kind == "sweep":
+        if not specs:
+            raise ValueError("no sweep axis given")
+        try:
+            axes = dict(parse_axis(spec) for spec in specs)
+        except argparse.ArgumentTypeError as err:
+            raise ValueError(str(err)) from None
+        return sweep_updates(inputs, axes, **options)
+    if kind == "pass":
+        if "duration" not in options:
+            raise ValueError("no duration given")
+        return pass_updates(inputs, **options)
+    if kind == "monte carlo":
+        if not specs:
+            raise ValueError("no sampled input given")
+        return monte_carlo_updates(inputs, dict(parse_distribution(spec) for spec in specs), **options)
+    raise ValueError(f"unknown job '{kind}'")
@@ -0,0 +1,306 @@
+import argparse
+import json
+import sys
+from engine import input_fields
+from fastpath import calculate_link_budget_fast
+
+# Cold start budget [s] of `linkbudget compute` (interpreter start-up included). Only engine/core/fastpath
+# are loaded on this path; NumPy, pyarrow, tkinter and pyperclip are imported by the subcommands that need them.
+cold_start_budget = 0.1
+
+### ARGUMENT PARSING ###
+def add_input_arguments(parser):
+    '''Add one --<field> option per link budget input'''
+    group = parser.add_argument_group("link budget inputs")
+    for field in input_fields:
+        group.add_argument(f"--{field}", default=None, metavar="VALUE")
+
+def read_inputs(args):
+    '''Collect the given --<field> options into a {field: value} dictionary'''
+    return {field: getattr(args, field) for field in input_fields if getattr(args, field) is not None}
+
+def parse_axis(text):
+    '''Parse a sweep axis "name=start:stop:num" (evenly spaced) or "name=a,b,c" (listed values)'''
+    import numpy as np
+    name, _, values = text.partition("=")
+    if name not in input_fields or not values:
+        raise argparse.ArgumentTypeError(f"invalid sweep axis '{text}'")
+    # Names may contain colons (e.g. "LDPC: r=3/4"), so ranges are only parsed for numeric inputs
+    if name in ("target_body", "modulation_coding"):
+        return name, values.split(",")
+    try:
+        if ":" in values:
+            start, stop, num = values.split(":")
+            return name, np.linspace(float(start), float(stop), int(num))
+        return name, np.array(values.split(","), dtype=float)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid sweep axis '{text}'") from None
+
+def parse_design_variable(text):
+    '''Parse a design variable "name=low:high" (continuous bounds) or "name=a,b,c" (listed names)'''
+    name, _, values = text.partition("=")
+    if name not in input_fields or not values:
+        raise argparse.ArgumentTypeError(f"invalid design variable '{text}'")
+    if name in ("target_body", "modulation_coding"):
+        return name, values.split(",")
+    try:
+        low, high = map(float, values.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid design variable '{text}'") from None
+    return name, (low, high)
+
+### SUBCOMMANDS ###
+def compute(args, parser):
+    '''Evaluate a single link budget and print the uplink/downlink tables'''
+    try:
+        result = calculate_link_budget_fast(read_inputs(args))
+    except (ValueError, ZeroDivisionError, OverflowError) as err:
+        parser.error(f"cannot compute link budget: {err}")
+    if args.json:
+        json.dump({"uplink_data": result.uplink_data, "downlink_data": result.downlink_data}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    for name, table in (("UPLINK LINK BUDGET", result.uplink_data), ("DOWNLINK LINK BUDGET", result.downlink_data)):
+        print(name)
+        for key, (desc, val) in table.items():
+            print(f"  {key:<14}{desc:<34}{val:>12} dB")
+
+def batch(args, parser):
+    '''Stream a CSV/Parquet scenario file through the batch budget calculation'''
+    from batch_io import run_batch
+    try:
+        rows = run_batch(args.input, args.output, args.chunk_size, args.terms)
+    except KeyError as err:
+        parser.error(f"scenario file lacks input column or has unknown name {err}")
+    print(f"{rows} scenarios written to {args.output}", file=sys.stderr)
+
+def sweep(args, parser):
+    '''Evaluate the link margin over the Cartesian product of the sweep axes'''
+    from sweep import run_sweep
+    if args.store is None:
+        points = run_sweep(read_inputs(args), dict(args.axis), args.output, args.chunk_size, args.workers, args.terms,
+                           args.precompute)
+    else:
+        from store import ScenarioStore
+        with ScenarioStore(args.store) as store:
+            points = run_sweep(read_inputs(args), dict(args.axis), args.output, args.chunk_size, args.workers,
+                               args.terms, args.precompute, store)
+    print(f"{points} sweep points written to {args.output}", file=sys.stderr)
+
+def ephemeris(args, parser):
+    '''Evaluate the link margins over a date range with the Earth-target distance of the ephemeris'''
+    from batch_io import open_chunk_writer
+    from ephemeris import margin_vs_date, date_range
+    try:
+        result = margin_vs_date(read_inputs(args), date_range(args.start, args.stop, args.step_days))
+    except (KeyError, ValueError) as err:
+        parser.error(f"cannot compute margins: {err}")
+    columns = result.columns()
+    with open_chunk_writer(args.output, list(columns)) as writer:
+        writer.write(writer.format(columns))
+    for start, end in result.conjunctions:
+        print(f"solar conjunction {start} to {end}", file=sys.stderr)
+    print(f"{len(result.dates)} dates written to {args.output}", file=sys.stderr)
+
+def sensitivity(args, parser):
+    '''Rank the inputs of a single budget by their effect on the link margin (tornado)'''
+    from sensitivity import margin_sensitivity
+    try:
+        result = margin_sensitivity(read_inputs(args))
+    except (KeyError, ValueError) as err:
+        parser.error(f"cannot compute sensitivities: {err}")
+    names, swings = result.tornado(args.change, link=args.link)
+    derivatives = result.derivatives(args.link)
+    rows = [(str(name), float(result.values[name]), float(derivatives[name]), float(swing))
+            for name, swing in zip(names, swings)]
+    if args.json:
+        json.dump([{"input": name, "value": value, "derivative": derivative, "swing": swing}
+                   for name, value, derivative, swing in rows], sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    print(f"{'input':<28}{'value':>14}{'dM/dx [dB/unit]':>18}{f'swing at {args.change:+.0%} [dB]':>22}")
+    for name, value, derivative, swing in rows:
+        print(f"{name:<28}{value:>14.6g}{derivative:>18.6g}{swing:>22.3f}")
+
+def optimize(args, parser):
+    '''Search the design variables for the Pareto front of margin against the cost objectives'''
+    from batch_io import open_chunk_writer
+    from optimizer import optimize as search, objective_functions
+    unknown = [name for name in args.objective if name not in objective_functions]
+    if unknown:
+        parser.error(f"unknown objectives {unknown}, choose from {list(objective_functions)}")
+    try:
+        result = search(read_inputs(args), dict(args.vary) if args.vary else None, args.objective, args.min_margin,
+                        args.population, args.generations, args.islands, args.workers, args.seed)
+    except (KeyError, ValueError) as err:
+        parser.error(f"cannot optimize: {err}")
+    columns = result.columns()
+    with open_chunk_writer(args.output, list(columns)) as writer:
+        writer.write(writer.format(columns))
+    print(f"{len(result)} Pareto-optimal designs written to {args.output}", file=sys.stderr)
+
+def storage(args, parser):
+    '''Simulate the onboard storage fill, overflow and latency over the contacts of a mission'''
+    from storage import simulate_mission_storage
+    try:
+        result, (start, end, rate) = simulate_mission_storage(read_inputs(args), args.days * 86400, args.capacity * 8e9,
+                                                              args.step, args.acm, args.generation_rate)
+    except (KeyError, ValueError) as err:
+        parser.error(f"cannot simulate storage: {err}")
+    summary = result.summary()
+    summary["contacts"] = len(start)
+    if args.json:
+        json.dump(summary, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    print(f"{'contacts':<23}{len(start):>14}")
+    for name in ("generated", "downlinked", "overflow", "backlog", "max_fill"):
+        print(f"{name + ' [GB]':<23}{summary[name] / 8e9:>14.3f}")
+    print(f"{'full time [h]':<23}{summary['full_time'] / 3600:>14.2f}")
+    print(f"{'mean latency [h]':<23}{summary['latency_mean'] / 3600:>14.2f}")
+    print(f"{'max latency [h]':<23}{summary['latency_max'] / 3600:>14.2f}")
+    for q, latency in summary["latency_percentiles"].items():
+        print(f"{f'p{q} latency [h]':<23}{latency / 3600:>14.2f}")
+
+def interference(args, parser):
+    '''Evaluate C/(N+I) of a single budget against the interfering transmitters of a CSV/Parquet file'''
+    import numpy as np
+    from batch_io import iter_input_chunks
+    from interference import calculate_interference
+    chunks = list(iter_input_chunks(args.interferers))
+    interferers = {name: np.concatenate([np.asarray(chunk[name]) for chunk in chunks]) for name in chunks[0]} if chunks else []
+    try:
+        result = calculate_interference(read_inputs(args), interferers, args.bandwidth, args.prune_level)
+    except (KeyError, ValueError) as err:
+        parser.error(f"cannot compute interference: {err}")
+    tables = {link: {key: (desc, round(float(values), 5)) for key, (desc, values) in table.items()}
+              for link, table in (("uplink_data", result.uplink_data), ("downlink_data", result.downlink_data))}
+    if args.json:
+        json.dump(tables, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    for name, link in (("UPLINK INTERFERENCE", "uplink"), ("DOWNLINK INTERFERENCE", "downlink")):
+        print(f"{name} ({result.evaluated[link]} interferers after pre-filtering, strongest: {int(result.worst[link])})")
+        for key, (desc, val) in tables[f"{link}_data"].items():
+            print(f"  {key:<14}{desc:<46}{val:>12}")
+
+def serve(args, parser):
+    '''Serve link budgets over HTTP/JSON until interrupted'''
+    from service import run_service
+    try:
+        run_service(args.host, args.port, args.max_batch, args.max_delay)
+    except KeyboardInterrupt:
+        pass
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="linkbudget", description="S/C link margin calculator (command line)")
+    parser.add_argument("--profile", default=None, metavar="PATH",
+                        help="time the budget functions and write the stats to PATH (.json, or .prom for Prometheus text)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compute_parser = subparsers.add_parser("compute", help="compute a single uplink/downlink budget")
+    add_input_arguments(compute_parser)
+    compute_parser.add_argument("--json", action="store_true", help="print the tables as JSON")
+    compute_parser.set_defaults(handler=compute)
+
+    batch_parser = subparsers.add_parser("batch", help="compute budgets for every scenario of a CSV/Parquet file")
+    batch_parser.add_argument("input", help="scenario file (.csv or .parquet), one column per input field")
+    batch_parser.add_argument("output", help="result file (.csv or .parquet)")
+    batch_parser.add_argument("--chunk-size", type=int, default=65536, help="scenarios per chunk")
+    batch_parser.add_argument("--terms", nargs="+", default=None, help="result terms to write, e.g. M G_TX (default: all)")
+    batch_parser.set_defaults(handler=batch)
+
+    sweep_parser = subparsers.add_parser("sweep", help="sweep inputs over a grid of values")
+    add_input_arguments(sweep_parser)
+    sweep_parser.add_argument("--axis", type=parse_axis, action="append", required=True,
+                              help="swept input, name=start:stop:num or name=a,b,c (repeatable)")
+    sweep_parser.add_argument("-o", "--output", required=True, help="result file (.csv or .parquet)")
+    sweep_parser.add_argument("--chunk-size", type=int, default=65536, help="points per chunk")
+    sweep_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    sweep_parser.add_argument("--terms", nargs="+", default=["M"], help="result terms to write (default: M)")
+    sweep_parser.add_argument("--precompute", action="store_true",
+                              help="tabulate the gains and losses over the sweep axes first and look them up per point")
+    sweep_parser.add_argument("--store", default=None, metavar="PATH",
+                              help="SQLite result store; chunks found there are not recomputed (resumes interrupted sweeps)")
+    sweep_parser.set_defaults(handler=sweep)
+
+    ephemeris_parser = subparsers.add_parser("ephemeris", help="deep-space link margins over a date range")
+    add_input_arguments(ephemeris_parser)
+    ephemeris_parser.add_argument("--start", required=True, help="first date (YYYY-MM-DD)")
+    ephemeris_parser.add_argument("--stop", required=True, help="end date (YYYY-MM-DD, excluded)")
+    ephemeris_parser.add_argument("--step-days", type=int, default=1, help="days between dates (default: 1)")
+    ephemeris_parser.add_argument("-o", "--output", required=True, help="result file (.csv or .parquet)")
+    ephemeris_parser.set_defaults(handler=ephemeris)
+
+    sensitivity_parser = subparsers.add_parser("sensitivity", help="rank the inputs by their effect on the margin")
+    add_input_arguments(sensitivity_parser)
+    sensitivity_parser.add_argument("--change", type=float, default=0.1,
+                                    help="relative input change of the swings (default: 0.1, i.e. 10 %%)")
+    sensitivity_parser.add_argument("--link", choices=["uplink", "downlink", "both"], default="both",
+                                    help="margin to analyse (default: both, i.e. the limiting link)")
+    sensitivity_parser.add_argument("--json", action="store_true", help="print the ranking as JSON")
+    sensitivity_parser.set_defaults(handler=sensitivity)
+
+    optimize_parser = subparsers.add_parser("optimize", help="Pareto front of margin against power and aperture")
+    add_input_arguments(optimize_parser)
+    optimize_parser.add_argument("--vary", type=parse_design_variable, action="append", default=None,
+                                 help="design variable, name=low:high or name=a,b,c (repeatable; default: powers, "
+                                      "antenna diameters, frequency and coding)")
+    optimize_parser.add_argument("--objective", nargs="+", default=["margin", "power", "aperture"],
+                                 help="objectives (default: margin power aperture)")
+    optimize_parser.add_argument("--min-margin", type=float, default=0.0, help="margin [dB] both links must close with")
+    optimize_parser.add_argument("--population", type=int, default=256, help="designs per population")
+    optimize_parser.add_argument("--generations", type=int, default=200, help="generations per population")
+    optimize_parser.add_argument("--islands", type=int, default=None, help="independent populations (default: 4)")
+    optimize_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    optimize_parser.add_argument("--seed", type=int, default=None, help="random seed")
+    optimize_parser.add_argument("-o", "--output", required=True, help="result file (.csv or .parquet)")
+    optimize_parser.set_defaults(handler=optimize)
+
+    storage_parser = subparsers.add_parser("storage", help="onboard storage and downlink backlog over a mission")
+    add_input_arguments(storage_parser)
+    storage_parser.add_argument("--days", type=float, required=True, help="mission time [days]")
+    storage_parser.add_argument("--capacity", type=float, required=True, help="onboard storage [GB]")
+    storage_parser.add_argument("--step", type=float, default=10.0, help="orbit propagation step [s] (default: 10)")
+    storage_parser.add_argument("--acm", action="store_true", help="downlink at the best closing coding scheme")
+    storage_parser.add_argument("--generation-rate", type=float, default=None,
+                                help="payload data rate [bit/s] (default: downlink information rate times "
+                                     "PL_downlink_time/24)")
+    storage_parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    storage_parser.set_defaults(handler=storage)
+
+    interference_parser = subparsers.add_parser("interference", help="C/(N+I) against interfering carriers")
+    add_input_arguments(interference_parser)
+    interference_parser.add_argument("--interferers", required=True,
+                                     help="interferer file (.csv or .parquet), one column per interferer field")
+    interference_parser.add_argument("--bandwidth", type=float, default=None,
+                                     help="carrier bandwidth [Hz] (default: the channel bit rate)")
+    interference_parser.add_argument("--prune-level", type=float, default=-40.0,
+                                     help="leave out the weakest interferers while their I/N at best adds up to "
+                                          "less than this [dB] (default: -40)")
+    interference_parser.add_argument("--json", action="store_true", help="print the tables as JSON")
+    interference_parser.set_defaults(handler=interference)
+
+    serve_parser = subparsers.add_parser("serve", help="serve budgets over HTTP/JSON (POST /budget)")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080)")
+    serve_parser.add_argument("--max-batch", type=int, default=8192, help="scenarios per coalesced batch")
+    serve_parser.add_argument("--max-delay", type=float, default=0.0, help="time [s] to wait for more requests per batch")
+    serve_parser.set_defaults(handler=serve)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.profile is None:
+        args.handler(args, parser)
+        return
+    import profiling
+    try:
+        with profiling.profile():
+            args.handler(args, parser)
+    finally:
+        profiling.write_report(args.profile)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from engine import LinkBudgetInput
+from vectorized import calculate_link_budget_batch
+
+### DISTRIBUTIONS ###
+# Data format: distribution name: names of its parameters, in the order they are given
+distribution_parameters = {"normal": ("mean", "std"),
+                           "uniform": ("low", "high"),
+                           "triangular": ("left", "mode", "right")}
+
+def sample(rng, distribution, size):
+    '''Draw size samples of a ("normal", mean, std), ("uniform", low, high) or ("triangular", left, mode, right) spec'''
+    name, *parameters = distribution
+    if name not in distribution_parameters or len(parameters) != len(distribution_parameters[name]):
+        raise ValueError(f"invalid distribution {distribution}")
+    return getattr(rng, name)(*parameters, size)
+
+### STREAMING STATISTICS ###
+class MarginStatistics:
+    '''Streaming margin statistics: moments, extremes, P(margin<0) and a fixed-bin histogram for percentiles
+
+    Memory does not grow with the number of samples. Percentiles are interpolated within a histogram bin,
+    so they are exact to within one bin width (see resolution).'''
+    def __init__(self, edges, reference=0.0):
+        self.edges = edges
+        self.reference = reference
+        # Bin 0 and the last bin count samples below/above the histogram range
+        self.counts = np.zeros(len(edges) + 1, dtype=np.int64)
+        self.n = 0
+        self.invalid = 0
+        self.negative = 0
+        # Sums relative to a reference margin, to avoid cancellation in the variance
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def resolution(self):
+        return self.edges[1] - self.edges[0]
+
+    def add(self, margins):
+        '''Add a chunk of margins, NaN margins (non-physical samples) are only counted as invalid'''
+        valid = margins[~np.isnan(margins)]
+        self.invalid += margins.size - valid.size
+        if not valid.size:
+            return
+        deviation = valid - self.reference
+        self.n += valid.size
+        self.negative += np.count_nonzero(valid < 0)
+        self.sum += deviation.sum()
+        self.sum_sq += np.dot(deviation, deviation)
+        self.min = min(self.min, valid.min())
+        self.max = max(self.max, valid.max())
+        self.counts += np.bincount(np.searchsorted(self.edges, valid, side="right"), minlength=self.counts.size)
+
+    def merge(self, other):
+        '''Combine with statistics over the same histogram edges'''
+        self.counts += other.counts
+        self.n += other.n
+        self.invalid += other.invalid
+        self.negative += other.negative
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        '''Obtain the q-th percentile [dB] from the histogram'''
+        rank = q / 100 * self.n
+        cumulative = np.cumsum(self.counts)
+        idx = min(int(np.searchsorted(cumulative, rank, side="left")), self.counts.size - 1)
+        # Samples outside the histogram range are only known by their extremes
+        if idx == 0:
+            return self.min
+        if idx == self.counts.size - 1:
+            return self.max
+        below = cumulative[idx - 1]
+        fraction = (rank - below) / self.counts[idx] if self.counts[idx] else 0.0
+        value = self.edges[idx - 1] + fraction * self.resolution
+        return float(min(max(value, self.min), self.max))
+
+    def summary(self, percentiles=(1, 5, 50, 95, 99)):
+        '''Obtain mean, std, min, max, percentiles and P(margin<0) as a dictionary ({"samples": 0} without valid
+        samples)'''
+        if self.n == 0:
+            return {"samples": 0}
+        mean = self.sum / self.n
+        return {"samples": self.n,
+                "invalid": self.invalid,
+                "mean": float(self.reference + mean),
+                "std": float(np.sqrt(max(self.sum_sq / self.n - mean**2, 0.0))),
+                "min": float(self.min),
+                "max": float(self.max),
+                "percentiles": {q: self.percentile(q) for q in percentiles},
+                "P(M<0)": float(self.negative / self.n)}
+
+### MONTE CARLO ENGINE ###
+def margin_samples(inputs, distributions, size, seed):
+    '''Evaluate size sampled budgets, returns the uplink and downlink margin arrays'''
+    rng = np.random.default_rng(seed)
+    batch = dict(inputs)
+    for field, distribution in distributions.items():
+        batch[field] = sample(rng, distribution, size)
+    # Non-physical samples (negative powers, efficiencies, ...) give NaN margins
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = calculate_link_budget_batch(batch)
+    shape = (size,)
+    return np.broadcast_to(result.uplink_data["M"][1], shape), np.broadcast_to(result.downlink_data["M"][1], shape)
+
+def chunk_statistics(inputs, distributions, size, seed, edges):
+    '''Evaluate one chunk of samples into (uplink, downlink) MarginStatistics'''
+    stats = []
+    for margins, (link_edges, reference) in zip(margin_samples(inputs, distributions, size, seed), edges):
+        link_stats = MarginStatistics(link_edges, reference)
+        link_stats.add(margins)
+        stats.append(link_stats)
+    return stats
+
+def histogram_edges(margins, bins):
+    '''Choose histogram edges around the margins of a pilot chunk, padded on both sides by their spread'''
+    margins = margins[~np.isnan(margins)]
+    if not margins.size:
+        return np.linspace(-1.0, 1.0, bins + 1), 0.0
+    low, high = margins.min(), margins.max()
+    pad = max(high - low, 1e-6)
+    return np.linspace(low - pad, high + pad, bins + 1), float(margins.mean())
+
+_worker_run = None
+
+def _init_worker(inputs, distributions, edges):
+    global _worker_run
+    _worker_run = (inputs, distributions, edges)
+
+def _run_chunk(task):
+    inputs, distributions, edges = _worker_run
+    size, seed = task
+    return chunk_statistics(inputs, distributions, size, seed, edges)
+
+def iter_monte_carlo(inputs, distributions, samples=10**7, chunk_size=2**20, seed=None, workers=1, bins=100000):
+    '''Sample the budget in chunks and yield (samples done, uplink MarginStatistics, downlink MarginStatistics)
+
+    distributions maps input fields to distribution specs (see sample), the other inputs stay fixed.
+    Every chunk draws from its own child of SeedSequence(seed), so a seeded run gives the same result
+    for any number of worker processes. Memory is bounded by chunk_size and the histogram size.'''
+    if isinstance(inputs, LinkBudgetInput):
+        inputs = inputs.as_dict()
+    if samples < 1:
+        raise ValueError(f"samples must be at least 1, got {samples}")
+    sizes = [min(chunk_size, samples - start) for start in range(0, samples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    # The pilot (first) chunk fixes the histogram range shared by all chunks
+    pilot = margin_samples(inputs, distributions, sizes[0], seeds[0])
+    edges = [histogram_edges(margins, bins) for margins in pilot]
+    totals = []
+    for margins, (link_edges, reference) in zip(pilot, edges):
+        link_stats = MarginStatistics(link_edges, reference)
+        link_stats.add(margins)
+        totals.append(link_stats)
+    done = sizes[0]
+    yield done, totals[0], totals[1]
+
+    tasks = list(zip(sizes[1:], seeds[1:]))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(inputs, distributions, edges)
+        for task in tasks:
+            for total, link_stats in zip(totals, _run_chunk(task)):
+                total.merge(link_stats)
+            done += task[0]
+            yield done, totals[0], totals[1]
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(inputs, distributions, edges)) as pool:
+        # At most two chunks per worker in flight, merged in submission order
+        remaining = iter(tasks)
+        pending = [pool.submit(_run_chunk, task) for _, task in zip(range(2 * workers), remaining)]
+        sizes = [task[0] for task in tasks]
+        try:
+            while pending:
+                stats = pending.pop(0).result()
+                task = next(remaining, None)
+                if task is not None:
+                    pending.append(pool.submit(_run_chunk, task))
+                for total, link_stats in zip(totals, stats):
+                    total.merge(link_stats)
+                done += sizes.pop(0)
+                yield done, totals[0], totals[1]
+        finally:
+            # An analysis abandoned midway (e.g. a cancelled GUI job) drops its queued chunks
+            pool.shutdown(cancel_futures=True)
+
+def run_monte_carlo(inputs, distributions, samples=10**7, chunk_size=2**20, seed=None, workers=1,
+                    percentiles=(1, 5, 50, 95, 99), bins=100000):
+    '''Run the Monte Carlo margin analysis, returns {"uplink": summary, "downlink": summary}'''
+    for done, uplink, downlink in iter_monte_carlo(inputs, distributions, samples, chunk_size, seed, workers, bins):
+        pass
+    return {"uplink": uplink.summary(percentiles), "downlink": downlink.summary(percentiles)}
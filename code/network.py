@@ -0,0 +1,199 @@
+import numpy as np
+from core import celestial_body_data
+from engine import LinkBudgetInput, input_fields
+from orbit import body_rotation_period, circular_orbit_position, ground_station_position, look_angles
+from propagation import atmospheric_loss
+from vectorized import (calculate_link_budget_batch, free_space_loss, lookup_index, as_float, batch_defaults,
+                        coding_names, coding_table)
+
+### CONSTANTS ###
+# Orbit and site parameters of the satellites and stations besides the link budget inputs, with their defaults
+# Data format: field: default value
+orbit_fields = {"inclination": 98.0, "raan": 0.0, "arg_latitude": 0.0}
+site_fields = {"gs_latitude": 52.0, "gs_longitude": 4.4, "min_elevation": 5.0}
+# Pair-steps evaluated per time chunk of the contact simulation, bounds its memory (~100 MB)
+chunk_elements = 2**21
+
+### NETWORK DEFINITION ###
+def as_columns(entries, base_inputs, extra_fields):
+    '''Turn a list of satellite/station dictionaries (or a {field: values} dictionary) into {field: array} columns
+
+    Fields missing from an entry are taken from base_inputs (or the defaults of extra_fields).'''
+    if isinstance(entries, dict):
+        columns = {field: np.asarray(values) for field, values in entries.items()}
+    else:
+        fields = list(dict.fromkeys(field for entry in entries for field in entry))
+        defaults = {**batch_defaults, **extra_fields, **base_inputs}
+        columns = {field: np.asarray([entry.get(field, defaults.get(field)) for entry in entries]) for field in fields}
+    unknown = [field for field in columns if field not in input_fields and field not in extra_fields]
+    if unknown:
+        raise KeyError(f"unknown fields {unknown}")
+    return columns
+
+class Network:
+    '''N satellites and M ground stations sharing the inputs of a base budget
+
+    satellites and stations are lists of dictionaries (or {field: values} dictionaries) with the inputs in
+    which they differ, e.g. antenna_sc_diam and orbit_alt per satellite, antenna_gs_diam, antenna_gs_eff,
+    gs_pointing_offset_angle and temp_sys_downlink per station. Besides the link budget inputs, satellites
+    may give their orbit (orbit_fields) and stations their site (site_fields). Satellite inputs are laid
+    out along the first and station inputs along the second axis, so every budget term broadcasts to an
+    (N, M) matrix over the satellite x station pairs.'''
+    def __init__(self, base_inputs, satellites, stations, satellite_names=None, station_names=None):
+        if isinstance(base_inputs, LinkBudgetInput):
+            base_inputs = base_inputs.as_dict()
+        self.base_inputs = dict(base_inputs)
+        self.satellites = as_columns(satellites, self.base_inputs, orbit_fields)
+        self.stations = as_columns(stations, self.base_inputs, site_fields)
+        shared = set(self.satellites) & set(self.stations)
+        if shared:
+            raise ValueError(f"fields {sorted(shared)} given for both satellites and stations")
+        self.shape = (self.size(self.satellites, satellites), self.size(self.stations, stations))
+        self.satellite_names = list(satellite_names or (f"SC{i + 1}" for i in range(self.shape[0])))
+        self.station_names = list(station_names or (f"GS{j + 1}" for j in range(self.shape[1])))
+
+    @staticmethod
+    def size(columns, entries):
+        return len(next(iter(columns.values()))) if columns else len(entries)
+
+    def satellite(self, field):
+        '''Values of a satellite field as an (N, 1) column, the base value if not given per satellite'''
+        if field in self.satellites:
+            return self.satellites[field][:, None]
+        return self.base_inputs.get(field, orbit_fields.get(field, batch_defaults.get(field)))
+
+    def station(self, field):
+        '''Values of a station field as a (1, M) row, the base value if not given per station'''
+        if field in self.stations:
+            return self.stations[field][None, :]
+        return self.base_inputs.get(field, site_fields.get(field, batch_defaults.get(field)))
+
+    def inputs(self):
+        '''Batch inputs with the satellite fields along axis 0 and the station fields along axis 1'''
+        inputs = dict(self.base_inputs)
+        inputs.update({field: self.satellite(field) for field in self.satellites if field in input_fields})
+        inputs.update({field: self.station(field) for field in self.stations if field in input_fields})
+        return inputs
+
+    def budget(self):
+        '''Evaluate the (worst-case geometry) budget of every satellite x station pair in one vectorized pass
+
+        Returns a LinkBudgetResult whose tables hold (N, M) arrays.'''
+        result = calculate_link_budget_batch(self.inputs())
+        for table in (result.uplink_data, result.downlink_data):
+            for key, (desc, values) in table.items():
+                table[key] = (desc, np.broadcast_to(values, self.shape))
+        return result
+
+    def margin_matrix(self, link="downlink"):
+        '''Obtain the (N, M) link margin [dB] of the worst-case geometry budget'''
+        result = self.budget()
+        return (result.uplink_data if link == "uplink" else result.downlink_data)["M"][1]
+
+### CONTACT SIMULATION ###
+class NetworkResult:
+    '''Per satellite x station pair statistics of a network simulation, all (N, M) arrays
+
+    contact_time [s] and passes count the steps in contact (elevation and downlink margin above their
+    minimum), data_volume [bit] is the volume at the budgeted downlink rate, min_margin/mean_margin [dB]
+    the downlink margin over the contacts (NaN for pairs without contact).'''
+    def __init__(self, network, budget_margin, contact_time, passes, data_volume, min_margin, mean_margin,
+                 coverage_time, max_in_view):
+        self.network = network
+        self.budget_margin = budget_margin
+        self.contact_time = contact_time
+        self.passes = passes
+        self.data_volume = data_volume
+        self.min_margin = min_margin
+        self.mean_margin = mean_margin
+        self.coverage_time = coverage_time
+        self.max_in_view = max_in_view
+
+    def station_summary(self, required_margin=0.0):
+        '''Summarise the contacts per ground station, returns {station name: {statistic: value}}
+
+        coverage_time [s] is the time with at least one satellite in contact, data_volume [bit] assumes
+        the station can track every satellite in contact at once (an upper bound otherwise).'''
+        summary = {}
+        for j, name in enumerate(self.network.station_names):
+            in_contact = self.contact_time[:, j] > 0
+            summary[name] = {"closing_links": int(np.count_nonzero(self.budget_margin[:, j] >= required_margin)),
+                             "satellites_in_contact": int(np.count_nonzero(in_contact)),
+                             "passes": int(self.passes[:, j].sum()),
+                             "contact_time": float(self.contact_time[:, j].sum()),
+                             "coverage_time": float(self.coverage_time[j]),
+                             "max_in_view": int(self.max_in_view[j]),
+                             "data_volume": float(self.data_volume[:, j].sum()),
+                             "min_margin": float(np.min(self.min_margin[in_contact, j])) if in_contact.any() else np.nan}
+        return summary
+
+    def satellite_summary(self):
+        '''Summarise the contacts per satellite, returns {satellite name: {statistic: value}}'''
+        return {name: {"stations_in_contact": int(np.count_nonzero(self.contact_time[i] > 0)),
+                       "passes": int(self.passes[i].sum()),
+                       "contact_time": float(self.contact_time[i].sum()),
+                       "data_volume": float(self.data_volume[i].sum())}
+                for i, name in enumerate(self.network.satellite_names)}
+
+def simulate_network(network, duration, step=10.0, required_margin=0.0, atmosphere=False):
+    '''Propagate all satellites over [0, duration) s against all stations and collect pair contact statistics
+
+    As in orbit.iter_pass, the budget is evaluated once per pair and per step only the space loss (and
+    with atmosphere=True the atmospheric loss) is re-evaluated, here for all (step, satellite, station)
+    triples of a time chunk at once. Returns a NetworkResult.'''
+    inputs = network.inputs()
+    body = network.base_inputs.get("target_body", "Earth")
+    mu, body_radius = celestial_body_data[body][:2]
+    N, M = network.shape
+
+    base = network.budget()
+    freq_downlink = as_float(inputs["downlink_freq"])
+    downlink_base = base.downlink_data["M"][1] - base.downlink_data["L_space"][1]
+    if atmosphere:
+        downlink_base = downlink_base - base.downlink_data["L_atm"][1]
+    availability = as_float(inputs.get("link_availability", 99.9))
+    # Information rate [bit/s] the downlink of every pair is dimensioned for
+    code_rate = coding_table[lookup_index(inputs.get("modulation_coding", "Uncoded"), coding_names), 0]
+    info_rate = 10**(-base.downlink_data["1/DR"][1] / 10) * code_rate
+
+    # Satellite orbit parameters as (N,) and station sites as (M,) arrays
+    altitude = as_float(network.satellite("orbit_alt")).reshape(-1)
+    orbit = [as_float(network.satellite(field)).reshape(-1) for field in orbit_fields]
+    latitude, longitude, min_elevation = (as_float(network.station(field)).reshape(-1) for field in site_fields)
+
+    steps = int(np.ceil(duration / step))
+    contact_steps = np.zeros((N, M), dtype=np.int64)
+    passes = np.zeros((N, M), dtype=np.int64)
+    margin_sum = np.zeros((N, M))
+    min_margin = np.full((N, M), np.inf)
+    coverage_steps = np.zeros(M, dtype=np.int64)
+    max_in_view = np.zeros(M, dtype=np.int64)
+    previous = np.zeros((N, M), dtype=bool)
+    chunk_steps = max(1, chunk_elements // (N * M))
+    for start in range(0, steps, chunk_steps):
+        t = step * np.arange(start, min(start + chunk_steps, steps))
+        # Positions of shape (T, N, 3) and (T, M, 3), look angles of shape (T, N, M)
+        sc = circular_orbit_position(t[:, None], altitude, *orbit, mu, body_radius)
+        gs = ground_station_position(t[:, None], latitude, longitude, body_radius, body_rotation_period[body])
+        elevation, slant_range = look_angles(sc[:, :, None, :], gs[:, None, :, :])
+        downlink_margin = downlink_base + free_space_loss(freq_downlink, slant_range * 1000)
+        if atmosphere:
+            downlink_margin -= atmospheric_loss(freq_downlink, elevation, availability)
+        contact = (elevation >= min_elevation) & (downlink_margin >= required_margin)
+
+        # Reduce over the time axis, passes start where a pair enters contact (carried across chunks)
+        contact_steps += np.count_nonzero(contact, axis=0)
+        passes += np.count_nonzero(contact & ~np.concatenate([previous[None], contact[:-1]]), axis=0)
+        previous = contact[-1]
+        margin_sum += np.where(contact, downlink_margin, 0.0).sum(axis=0)
+        min_margin = np.minimum(min_margin, np.where(contact, downlink_margin, np.inf).min(axis=0))
+        in_view = np.count_nonzero(contact, axis=1)
+        coverage_steps += np.count_nonzero(in_view, axis=0)
+        max_in_view = np.maximum(max_in_view, in_view.max(axis=0))
+
+    contact_time = contact_steps * step
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_margin = np.where(contact_steps > 0, margin_sum / contact_steps, np.nan)
+    min_margin = np.where(contact_steps > 0, min_margin, np.nan)
+    return NetworkResult(network, base.downlink_data["M"][1], contact_time, passes, info_rate * contact_time,
+                         min_margin, mean_margin, coverage_steps * step, max_in_view)
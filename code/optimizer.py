@@ -0,0 +1,237 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from engine import LinkBudgetInput
+from vectorized import calculate_link_budget_batch, as_float, coding_names
+
+### OBJECTIVES ###
+def aperture_area(diam):
+    return np.pi / 4 * as_float(diam)**2
+
+# Data format: objective name: (function of (inputs, uplink margin, downlink margin), "min" or "max")
+objective_functions = {"margin": (lambda inputs, uplink, downlink: np.minimum(uplink, downlink), "max"),
+                       "uplink_margin": (lambda inputs, uplink, downlink: uplink, "max"),
+                       "downlink_margin": (lambda inputs, uplink, downlink: downlink, "max"),
+                       "sc_power": (lambda inputs, uplink, downlink: as_float(inputs["transmitter_sc_power"]), "min"),
+                       "gs_power": (lambda inputs, uplink, downlink: as_float(inputs["transmitter_gs_power"]), "min"),
+                       "power": (lambda inputs, uplink, downlink: as_float(inputs["transmitter_sc_power"])
+                                 + as_float(inputs["transmitter_gs_power"]), "min"),
+                       "sc_aperture": (lambda inputs, uplink, downlink: aperture_area(inputs["antenna_sc_diam"]), "min"),
+                       "gs_aperture": (lambda inputs, uplink, downlink: aperture_area(inputs["antenna_gs_diam"]), "min"),
+                       "aperture": (lambda inputs, uplink, downlink: aperture_area(inputs["antenna_sc_diam"])
+                                    + aperture_area(inputs["antenna_gs_diam"]), "min")}
+
+# Design variables searched by default
+# Data format: input field: (lower, upper) bounds, or a list of names for categorical inputs
+default_variables = {"transmitter_sc_power": (0.5, 100.0),
+                     "transmitter_gs_power": (10.0, 2000.0),
+                     "antenna_sc_diam": (0.1, 3.0),
+                     "antenna_gs_diam": (1.0, 35.0),
+                     "downlink_freq": (1.0, 30.0),
+                     "modulation_coding": coding_names}
+
+# Independent populations searched by default, fixed so a seeded search does not depend on the machine
+default_islands = 4
+
+### DESIGN ENCODING ###
+class DesignSpace:
+    '''Map between the inputs of the design variables and genes: continuous variables as values in [0, 1]
+    (log-scaled over positive bounds), categorical ones as indices into their list of names'''
+    def __init__(self, variables):
+        self.variables = variables
+        self.continuous = [name for name, bounds in variables.items() if isinstance(bounds, tuple)]
+        self.categorical = [name for name in variables if name not in self.continuous]
+
+    def decode(self, genes, choices):
+        '''Obtain {field: values} of a population of genes (designs x continuous) and choices (designs x categorical)'''
+        inputs = {}
+        for i, name in enumerate(self.continuous):
+            low, high = self.variables[name]
+            if low > 0:
+                inputs[name] = low * (high / low)**genes[:, i]
+            else:
+                inputs[name] = low + (high - low) * genes[:, i]
+        for i, name in enumerate(self.categorical):
+            inputs[name] = np.asarray(self.variables[name])[choices[:, i]]
+        return inputs
+
+    def random(self, rng, size):
+        return (rng.random((size, len(self.continuous))),
+                rng.integers(0, [len(self.variables[name]) for name in self.categorical] or 1,
+                             (size, len(self.categorical))))
+
+### PARETO RANKING ###
+def dominance(objectives, violation):
+    '''Obtain the matrix D[i, j] of design i dominating design j (objectives minimised, designs x objectives)
+
+    Feasible designs (violation 0) dominate infeasible ones, infeasible designs are ordered by their violation.'''
+    better_equal = (objectives[:, None, :] <= objectives[None, :, :]).all(axis=-1)
+    better = (objectives[:, None, :] < objectives[None, :, :]).any(axis=-1)
+    feasible = violation == 0
+    both_feasible = feasible[:, None] & feasible[None, :]
+    return np.where(both_feasible, better_equal & better,
+                    (feasible[:, None] & ~feasible[None, :]) | (~both_feasible & (violation[:, None] < violation[None, :])))
+
+def pareto_ranks(objectives, violation):
+    '''Obtain the non-dominated front (0 = Pareto front) of every design, peeling the fronts off one by one'''
+    dominates = dominance(objectives, violation)
+    dominated_by = dominates.sum(axis=0)
+    ranks = np.full(len(objectives), -1)
+    rank = 0
+    while (ranks < 0).any():
+        front = (dominated_by == 0) & (ranks < 0)
+        ranks[front] = rank
+        dominated_by -= dominates[front].sum(axis=0)
+        # Front members are not counted again
+        dominated_by[front] = -1
+        rank += 1
+    return ranks
+
+def crowding_distance(objectives, ranks):
+    '''Obtain the crowding distance of every design within its front (infinite at the ends of a front)'''
+    distance = np.zeros(len(objectives))
+    for rank in np.unique(ranks):
+        members = np.flatnonzero(ranks == rank)
+        for values in objectives[members].T:
+            order = np.argsort(values)
+            spread = values[order[-1]] - values[order[0]]
+            distance[members[order[[0, -1]]]] = np.inf
+            if len(order) > 2 and spread > 0:
+                distance[members[order[1:-1]]] += (values[order[2:]] - values[order[:-2]]) / spread
+    return distance
+
+### EVOLUTION ###
+class Evaluation:
+    '''Evaluate populations of designs on top of base inputs: objectives to minimise and margin violations'''
+    def __init__(self, base_inputs, space, objectives, min_margin):
+        self.base_inputs = base_inputs
+        self.space = space
+        self.objectives = objectives
+        self.min_margin = min_margin
+
+    def __call__(self, genes, choices):
+        '''Obtain (inputs, objective matrix (designs x objectives, minimised), violation, uplink, downlink margins)'''
+        inputs = {**self.base_inputs, **self.space.decode(genes, choices)}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = calculate_link_budget_batch(inputs)
+        shape = (len(genes),)
+        uplink = np.broadcast_to(result.uplink_data["M"][1], shape)
+        downlink = np.broadcast_to(result.downlink_data["M"][1], shape)
+        values = []
+        for name in self.objectives:
+            function, sense = objective_functions[name]
+            value = np.broadcast_to(function(inputs, uplink, downlink), shape)
+            values.append(-value if sense == "max" else value)
+        # Designs below the minimum margin (or non-physical ones) are infeasible
+        violation = np.nan_to_num(np.maximum(self.min_margin - np.minimum(uplink, downlink), 0.0), nan=np.inf)
+        objectives = np.nan_to_num(np.stack(values, axis=-1), nan=np.inf)
+        return inputs, objectives, violation, uplink, downlink
+
+def select(rng, ranks, crowding, size):
+    '''Binary tournament: the lower rank wins, then the larger crowding distance'''
+    a, b = rng.integers(0, len(ranks), (2, size))
+    a_wins = (ranks[a] < ranks[b]) | ((ranks[a] == ranks[b]) & (crowding[a] >= crowding[b]))
+    return np.where(a_wins, a, b)
+
+def offspring(rng, space, genes, choices, ranks, crowding, mutation_scale):
+    '''Create a new population by tournament selection, blend crossover and mutation'''
+    size = len(genes)
+    first, second = select(rng, ranks, crowding, size), select(rng, ranks, crowding, size)
+    # Blend crossover, children may lie somewhat beyond their parents
+    alpha = rng.uniform(-0.25, 1.25, genes.shape)
+    child_genes = genes[first] + alpha * (genes[second] - genes[first])
+    mutate = rng.random(genes.shape) < 1 / max(genes.shape[1], 1)
+    child_genes = np.clip(child_genes + mutate * rng.normal(0, mutation_scale, genes.shape), 0.0, 1.0)
+    # Categorical genes are inherited from either parent and occasionally redrawn
+    child_choices = np.where(rng.random(choices.shape) < 0.5, choices[first], choices[second])
+    redraw = rng.random(choices.shape) < 1 / max(choices.shape[1] + genes.shape[1], 1)
+    child_choices = np.where(redraw, space.random(rng, size)[1], child_choices)
+    return child_genes, child_choices
+
+def evolve(base_inputs, variables, objectives, min_margin=0.0, population=256, generations=200, seed=None):
+    '''Evolve one population (NSGA-II: non-dominated sorting with crowding distance), every generation evaluated
+    as one vectorized batch. Returns the final population as (genes, choices, ranks).'''
+    rng = np.random.default_rng(seed)
+    space = DesignSpace(variables)
+    evaluate = Evaluation(base_inputs, space, objectives, min_margin)
+    genes, choices = space.random(rng, population)
+    _, values, violation, _, _ = evaluate(genes, choices)
+    ranks = pareto_ranks(values, violation)
+    crowding = crowding_distance(values, ranks)
+    for generation in range(generations):
+        # Mutation steps shrink from 10 % to 1 % of the (scaled) variable ranges
+        mutation_scale = 0.1 - 0.09 * generation / max(generations - 1, 1)
+        child_genes, child_choices = offspring(rng, space, genes, choices, ranks, crowding, mutation_scale)
+        _, child_values, child_violation, _, _ = evaluate(child_genes, child_choices)
+        genes = np.concatenate([genes, child_genes])
+        choices = np.concatenate([choices, child_choices])
+        values = np.concatenate([values, child_values])
+        violation = np.concatenate([violation, child_violation])
+        # Parents and children compete, the best fronts survive, the least crowded within the last one
+        ranks = pareto_ranks(values, violation)
+        crowding = crowding_distance(values, ranks)
+        survivors = np.lexsort((-crowding, ranks))[:population]
+        genes, choices, values, violation = genes[survivors], choices[survivors], values[survivors], violation[survivors]
+        ranks, crowding = ranks[survivors], crowding[survivors]
+    return genes, choices, ranks
+
+### PARALLEL ISLANDS ###
+def _run_island(task):
+    return evolve(*task)
+
+class ParetoResult:
+    '''Pareto-optimal designs: their design inputs, objectives (as named, unnegated) and margins [dB], ordered
+    by the first objective'''
+    def __init__(self, designs, objectives, uplink_margin, downlink_margin):
+        self.designs = designs
+        self.objectives = objectives
+        self.uplink_margin = uplink_margin
+        self.downlink_margin = downlink_margin
+
+    def __len__(self):
+        return len(self.uplink_margin)
+
+    def columns(self):
+        '''The front as {column: array}, e.g. for batch_io.open_chunk_writer'''
+        return {**self.designs, **{name: values for name, values in self.objectives.items() if name not in self.designs},
+                "uplink_M": self.uplink_margin, "downlink_M": self.downlink_margin}
+
+def optimize(base_inputs, variables=None, objectives=("margin", "power", "aperture"), min_margin=0.0, population=256,
+             generations=200, islands=None, workers=None, seed=None):
+    '''Search the design variables (see default_variables) for the Pareto front of the objectives (names of
+    objective_functions) among designs closing both links with min_margin [dB]
+
+    islands independent populations (default_islands by default) evolve in a process pool of `workers` processes
+    (all cores by default), each from its own child of SeedSequence(seed), so a seeded search with the same
+    islands gives the same front for any number of workers.
+    Their final populations are merged and the non-dominated designs returned as a ParetoResult (empty if no
+    design closes).'''
+    if isinstance(base_inputs, LinkBudgetInput):
+        base_inputs = base_inputs.as_dict()
+    variables = variables or default_variables
+    objectives = list(objectives)
+    workers = workers or os.cpu_count() or 1
+    islands = islands or default_islands
+    tasks = [(base_inputs, variables, objectives, min_margin, population, generations, child)
+             for child in np.random.SeedSequence(seed).spawn(islands)]
+    if workers == 1 or islands == 1:
+        finals = [_run_island(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, islands)) as pool:
+            finals = list(pool.map(_run_island, tasks))
+
+    # Merge the fronts of the islands and keep the designs no other island improves on
+    space = DesignSpace(variables)
+    genes = np.concatenate([final[0][final[2] == 0] for final in finals])
+    choices = np.concatenate([final[1][final[2] == 0] for final in finals])
+    inputs, values, violation, uplink, downlink = Evaluation(base_inputs, space, objectives, min_margin)(genes, choices)
+    front = (pareto_ranks(values, violation) == 0) & (violation == 0)
+    # Duplicated designs (e.g. the same design found by several islands) are kept once
+    _, unique = np.unique(values[front], axis=0, return_index=True)
+    keep = np.flatnonzero(front)[unique]
+    keep = keep[np.argsort(values[keep, 0], kind="stable")]
+    designs = {name: np.asarray(inputs[name])[keep] for name in variables}
+    named = {}
+    for i, name in enumerate(objectives):
+        named[name] = -values[keep, i] if objective_functions[name][1] == "max" else values[keep, i]
+    return ParetoResult(designs, named, uplink[keep], downlink[keep])
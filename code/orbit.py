@@ -0,0 +1,161 @@
+import numpy as np
+from core import celestial_body_data
+from engine import LinkBudgetInput
+from propagation import atmospheric_loss
+from vectorized import calculate_link_budget_batch, free_space_loss, lookup_index, as_float, coding_names, coding_table
+
+### CONSTANTS ###
+# Data format: sidereal rotation period [h], negative for retrograde rotation
+body_rotation_period = {"Mercury": 1407.6,
+                        "Venus": -5832.5,
+                        "Earth": 23.9345,
+                        "Moon": 655.72,
+                        "Mars": 24.6229,
+                        "Jupiter": 9.925,
+                        "Saturn": 10.656,
+                        "Uranus": -17.24,
+                        "Neptune": 16.11}
+
+### GEOMETRY FUNCTIONS ###
+def circular_orbit_position(t, altitude, inclination, raan, arg_latitude, mu, body_radius):
+    '''Obtain the inertial S/C position [km] on a circular orbit at times t [s], shape (len(t), 3)
+
+    The orbit parameters may be arrays broadcasting against t, e.g. t[:, None] and one value per satellite
+    give positions of shape (len(t), satellites, 3).'''
+    a = body_radius + altitude
+    # Mean motion [rad/s] and argument of latitude along the orbit
+    n = np.sqrt(mu / a**3)
+    u = np.radians(arg_latitude) + n * t
+    i = np.radians(inclination)
+    raan = np.radians(raan)
+    cos_u, sin_u = np.cos(u), np.sin(u)
+    return np.expand_dims(a, -1) * np.stack([cos_u * np.cos(raan) - sin_u * np.cos(i) * np.sin(raan),
+                                              cos_u * np.sin(raan) + sin_u * np.cos(i) * np.cos(raan),
+                                              sin_u * np.sin(i)], axis=-1)
+
+def ground_station_position(t, latitude, longitude, body_radius, rotation_period):
+    '''Obtain the inertial GS position [km] at times t [s] (body-fixed and inertial frames coincide at t=0)'''
+    lat = np.radians(latitude)
+    lon = np.radians(longitude) + 2 * np.pi * t / (rotation_period * 3600)
+    return body_radius * np.stack([np.cos(lat) * np.cos(lon),
+                                   np.cos(lat) * np.sin(lon),
+                                   np.sin(lat) * np.ones_like(lon)], axis=-1)
+
+def look_angles(sc_position, gs_position):
+    '''Obtain the elevation [deg] and slant range [km] of the S/C as seen from the GS'''
+    line_of_sight = sc_position - gs_position
+    slant_range = np.linalg.norm(line_of_sight, axis=-1)
+    # Elevation is measured from the local horizontal plane (GS position is the local vertical)
+    sin_el = np.einsum("...k,...k->...", line_of_sight, gs_position) / (slant_range * np.linalg.norm(gs_position, axis=-1))
+    return np.degrees(np.arcsin(np.clip(sin_el, -1, 1))), slant_range
+
+### PASS SIMULATION ###
+class PassResult:
+    '''Margin-vs-time series of a pass simulation, with contact windows [(start, end) s] and data volume [bit]'''
+    def __init__(self, time, elevation, slant_range, uplink_margin, downlink_margin, contacts, data_volume):
+        self.time = time
+        self.elevation = elevation
+        self.slant_range = slant_range
+        self.uplink_margin = uplink_margin
+        self.downlink_margin = downlink_margin
+        self.contacts = contacts
+        self.data_volume = data_volume
+
+    @property
+    def contact_time(self):
+        return sum(end - start for start, end in self.contacts)
+
+def iter_pass(inputs, duration, step=1.0, inclination=98.0, raan=0.0, arg_latitude=0.0, gs_latitude=52.0,
+              gs_longitude=4.4, min_elevation=5.0, required_margin=0.0, chunk_size=86400, atmosphere=False):
+    '''Propagate the orbit of a link budget over [0, duration) s and yield one dictionary per chunk of time steps
+
+    Every chunk holds the time, elevation [deg], slant range [km] and uplink/downlink margins [dB] per
+    step, plus a boolean "contact" mask (GS elevation and downlink margin both above their minimum).
+    The budget is evaluated once; per step only the space loss is re-evaluated for the actual slant range,
+    and with atmosphere=True the atmospheric loss (at link_availability) for the actual elevation.
+    The system noise temperature stays that of the budget.'''
+    if isinstance(inputs, LinkBudgetInput):
+        inputs = inputs.as_dict()
+    body = inputs.get("target_body", "Earth")
+    mu, body_radius = celestial_body_data[body][:2]
+    altitude = float(inputs["orbit_alt"])
+
+    # Budget for the fixed (worst-case horizon) geometry of calculate_link_margin
+    base = calculate_link_budget_batch(inputs)
+    freq_downlink = as_float(inputs["downlink_freq"])
+    freq_uplink = freq_downlink * as_float(inputs["sc_TAR"])
+    uplink_base = base.uplink_data["M"][1] - base.uplink_data["L_space"][1]
+    downlink_base = base.downlink_data["M"][1] - base.downlink_data["L_space"][1]
+    availability = as_float(inputs.get("link_availability", 99.9))
+    if atmosphere:
+        uplink_base = uplink_base - base.uplink_data["L_atm"][1]
+        downlink_base = downlink_base - base.downlink_data["L_atm"][1]
+
+    for start in range(0, int(np.ceil(duration / step)), chunk_size):
+        t = step * np.arange(start, min(start + chunk_size, int(np.ceil(duration / step))))
+        sc = circular_orbit_position(t, altitude, inclination, raan, arg_latitude, mu, body_radius)
+        gs = ground_station_position(t, gs_latitude, gs_longitude, body_radius, body_rotation_period[body])
+        elevation, slant_range = look_angles(sc, gs)
+        # Swap the fixed space loss for the one over the actual S/C to GS distance
+        uplink_margin = uplink_base + free_space_loss(freq_uplink, slant_range * 1000)
+        downlink_margin = downlink_base + free_space_loss(freq_downlink, slant_range * 1000)
+        if atmosphere:
+            uplink_margin -= atmospheric_loss(freq_uplink, elevation, availability)
+            downlink_margin -= atmospheric_loss(freq_downlink, elevation, availability)
+        yield {"time": t,
+               "elevation": elevation,
+               "slant_range": slant_range,
+               "uplink_margin": uplink_margin,
+               "downlink_margin": downlink_margin,
+               "contact": (elevation >= min_elevation) & (downlink_margin >= required_margin)}
+
+def contact_windows(time, contact, step, open_start=None):
+    '''Turn a boolean contact mask into [(start, end)] windows, carrying a window still open from a previous chunk
+
+    Returns (windows, open_start), where open_start is the start of a window running past the last step.'''
+    edges = np.diff(contact.astype(np.int8), prepend=np.int8(open_start is not None), append=np.int8(0))
+    # Window edges fall on step boundaries, the last boundary being the end of the final step
+    boundaries = np.append(time, time[-1] + step)
+    starts = list(boundaries[edges == 1])
+    ends = list(boundaries[edges == -1])
+    if open_start is not None:
+        starts.insert(0, open_start)
+    # A window still in contact at the last step is closed by the next chunk (or the end of the simulation)
+    open_start = None
+    if contact[-1]:
+        open_start = starts.pop()
+        ends.pop()
+    return list(zip(starts, ends)), open_start
+
+def downlink_info_rate(inputs):
+    '''Obtain the information data rate [bit/s] the downlink budget is dimensioned for'''
+    base = calculate_link_budget_batch(inputs)
+    code_rate = coding_table[lookup_index(inputs.get("modulation_coding", "Uncoded"), coding_names), 0]
+    return 10**(-base.downlink_data["1/DR"][1] / 10) * code_rate
+
+def simulate_pass(inputs, duration, step=1.0, keep_series=True, **kwargs):
+    '''Simulate a circular orbit over [0, duration) s against a ground station (see iter_pass for the options)
+
+    Returns a PassResult; with keep_series=False only the contact windows and data volume are kept,
+    so weeks of 1 s steps run in bounded memory.'''
+    if isinstance(inputs, LinkBudgetInput):
+        inputs = inputs.as_dict()
+    series = {key: [] for key in ("time", "elevation", "slant_range", "uplink_margin", "downlink_margin")}
+    contacts = []
+    open_start = None
+    contact_steps = 0
+    for chunk in iter_pass(inputs, duration, step, **kwargs):
+        windows, open_start = contact_windows(chunk["time"], chunk["contact"], step, open_start)
+        contacts.extend(windows)
+        contact_steps += np.count_nonzero(chunk["contact"])
+        if keep_series:
+            for key, values in series.items():
+                values.append(chunk[key])
+    if open_start is not None:
+        contacts.append((open_start, step * np.ceil(duration / step)))
+
+    # Data volume at the budgeted downlink rate over all steps in contact
+    data_volume = float(downlink_info_rate(inputs) * contact_steps * step)
+    series = {key: np.concatenate(values) if values else np.empty(0) for key, values in series.items()}
+    return PassResult(series["time"], series["elevation"], series["slant_range"], series["uplink_margin"],
+                      series["downlink_margin"], [(float(start), float(end)) for start, end in contacts], data_volume)
@@ -0,0 +1,155 @@
+import functools
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+
+### TARGETS ###
+# Functions and methods timed by default, as "module.name" or "module.Class.method"
+default_targets = ["core.val_to_dB",
+                   "core.transmitter_gain",
+                   "core.pointing_loss",
+                   "core.space_loss",
+                   "core.space_loss_DS",
+                   "core.required_data_rate",
+                   "core.sys_temp",
+                   "engine.calculate_link_budget",
+                   "fastpath.budget_values",
+                   "vectorized.transmitter_gain",
+                   "vectorized.pointing_loss",
+                   "vectorized.free_space_loss",
+                   "vectorized.body_slant_range",
+                   "vectorized.required_data_rate",
+                   "vectorized.sys_temp",
+                   "vectorized.calculate_link_budget_batch",
+                   "vectorized.flatten_result",
+                   "propagation.atmospheric_loss",
+                   "batch_io.evaluate_chunk",
+                   "batch_io.format_csv_chunk",
+                   "batch_io.format_parquet_chunk",
+                   "batch_io.CsvChunkWriter.write",
+                   "batch_io.ParquetChunkWriter.write",
+                   "sweep.sweep_chunk"]
+
+# Directory of the modules whose references to the targets are swapped
+code_dir = os.path.dirname(os.path.abspath(__file__))
+
+### STATE ###
+# Data format: target: [calls, seconds, elements], elements summing the sizes of the returned arrays (1 otherwise)
+stats = {}
+_lock = threading.Lock()
+# Replaced references as (namespace dictionary or class, name, original), restored by disable
+_replaced = []
+
+def resolve(target):
+    '''Obtain (owner, attribute name, object) of a "module.name" or "module.Class.method" target'''
+    module_name, *path = target.split(".")
+    owner = importlib.import_module(module_name)
+    for name in path[:-1]:
+        owner = getattr(owner, name)
+    return owner, path[-1], getattr(owner, path[-1])
+
+def timed(target, function):
+    '''Wrap a function to count its calls, time and returned elements under target'''
+    entry = stats.setdefault(target, [0, 0.0, 0])
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        with _lock:
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] += getattr(result, "size", 1)
+        return result
+    return wrapper
+
+### SWITCHING ###
+def enable(targets=None):
+    '''Start timing the targets (default_targets by default)
+
+    The targets are swapped for timed wrappers in their module or class and in every module of this
+    package that imported them by name; disable() restores the originals, so disabled profiling adds no
+    overhead at all. Only the current process is measured (not the workers of parallel sweeps).'''
+    disable()
+    wrappers = {}
+    for target in targets or default_targets:
+        owner, name, original = resolve(target)
+        wrappers[id(original)] = (original, timed(target, original))
+        _replaced.append((owner, name, original))
+        setattr(owner, name, wrappers[id(original)][1])
+    # Rebind the copies made by "from module import name" (e.g. engine's "from core import*") and
+    # staticmethod references in classes (e.g. CsvChunkWriter.format)
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if path is None or os.path.dirname(os.path.abspath(path)) != code_dir:
+            continue
+        namespace = module.__dict__
+        for name, value in list(namespace.items()):
+            if id(value) in wrappers and value is wrappers[id(value)][0]:
+                _replaced.append((namespace, name, value))
+                namespace[name] = wrappers[id(value)][1]
+            elif isinstance(value, type) and value.__module__ == module.__name__:
+                for attribute, raw in list(vars(value).items()):
+                    if isinstance(raw, staticmethod) and id(raw.__func__) in wrappers:
+                        _replaced.append((value, attribute, raw))
+                        setattr(value, attribute, staticmethod(wrappers[id(raw.__func__)][1]))
+
+def disable():
+    '''Stop timing and restore the original functions (the collected stats are kept)'''
+    while _replaced:
+        owner, name, original = _replaced.pop()
+        if isinstance(owner, dict):
+            owner[name] = original
+        else:
+            setattr(owner, name, original)
+
+def reset():
+    with _lock:
+        for entry in stats.values():
+            entry[:] = [0, 0.0, 0]
+
+class profile:
+    '''Context manager timing the targets within its block: `with profile(): run_batch(...)`'''
+    def __init__(self, targets=None):
+        self.targets = targets
+
+    def __enter__(self):
+        enable(self.targets)
+        return self
+
+    def __exit__(self, *exc_info):
+        disable()
+
+### EXPORT ###
+def report():
+    '''Obtain {target: {"calls", "seconds", "elements"}} of the targets called so far, slowest first'''
+    with _lock:
+        rows = [(target, list(entry)) for target, entry in stats.items() if entry[0]]
+    return {target: {"calls": calls, "seconds": seconds, "elements": elements}
+            for target, (calls, seconds, elements) in sorted(rows, key=lambda row: -row[1][1])}
+
+def to_json():
+    return json.dumps(report(), indent=2)
+
+def to_prometheus(prefix="linkbudget"):
+    '''Format the stats in the Prometheus text exposition format'''
+    metrics = [("calls", "Calls of the instrumented function"),
+               ("seconds", "Time spent in the instrumented function (inclusive)"),
+               ("elements", "Elements of the arrays returned by the instrumented function")]
+    data = report()
+    lines = []
+    for key, help_text in metrics:
+        name = f"{prefix}_function_{key}_total"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        lines += [f'{name}{{function="{target}"}} {values[key]}' for target, values in data.items()]
+    return "\n".join(lines) + "\n"
+
+def write_report(file_path):
+    '''Write the stats to a Prometheus text file (.prom or .txt) or else JSON'''
+    text = to_prometheus() if os.path.splitext(file_path)[1].lower() in (".prom", ".txt") else to_json()
+    with open(file_path, "w") as file:
+        file.write(text)
@@ -0,0 +1,197 @@
+import numpy as np
+from engine import LinkBudgetInput, input_fields
+from propagation import atmospheric_loss, system_noise_temperature
+from vectorized import (calculate_link_budget_batch, as_float, batch_defaults, lookup_index, val_to_dB, sys_temp,
+                        body_names, body_table, EARTH, MOON)
+
+### CONSTANTS ###
+# d(10*log10(x))/dx = dB_per_neper / x
+dB_per_neper = 10 / np.log(10)
+# Inputs whose margin derivatives are computed (all numeric inputs, in the order of input_fields)
+sensitivity_variables = [field for field in input_fields if field not in ("target_body", "modulation_coding")]
+# Steps of the central differences over the tabulated atmospheric models
+# Data format: variable: step, relative to the value (True) or absolute (False)
+atmosphere_steps = {"downlink_freq": (1e-4, True),
+                    "sc_TAR": (1e-4, True),
+                    "gs_elevation_angle": (1e-3, False),
+                    "link_availability": (1e-5, False)}
+# Inputs whose relative changes (see SensitivityResult.swings) refer to another quantity than their value
+# Data format: variable: function of the value giving the reference of relative changes
+change_references = {"link_availability": lambda availability: 100 - availability}
+
+### DERIVATIVE HELPERS ###
+def pointing_loss_slope(freq_GHz, diam, pointing_offset):
+    '''Obtain d(pointing loss)/d(pointing offset) [dB/deg] of 12*(offset/a_half)^2'''
+    return 24 * pointing_offset * (freq_GHz * diam / 21)**2
+
+def atmosphere_margins(freq_uplink, freq_downlink, elevation, availability, temp_uplink, temp_downlink,
+                       clear_temp_uplink, clear_temp_downlink):
+    '''Obtain the parts of the uplink and downlink margins [dB] that follow the tabulated atmospheric models
+
+    These are minus the atmospheric loss and minus the system noise temperature in dB, the latter only where
+    it is left to its default. Without a GS elevation angle the default temperatures (clear_temp_*) are
+    piecewise constant in frequency and are passed in, so they do not vary.'''
+    atmosphere = ~np.isnan(elevation)
+    with np.errstate(invalid="ignore"):
+        L_up = np.where(atmosphere, atmospheric_loss(freq_uplink, elevation, availability), 0.0)
+        L_down = np.where(atmosphere, atmospheric_loss(freq_downlink, elevation, availability), 0.0)
+        T_up = np.where(np.isnan(temp_uplink), np.where(atmosphere, system_noise_temperature(freq_uplink), clear_temp_uplink),
+                        temp_uplink)
+        T_down = np.where(np.isnan(temp_downlink),
+                          np.where(atmosphere, system_noise_temperature(freq_downlink, False, L_down), clear_temp_downlink),
+                          temp_downlink)
+    return -L_up - val_to_dB(T_up), -L_down - val_to_dB(T_down)
+
+### SENSITIVITY ANALYSIS ###
+class SensitivityResult:
+    '''Derivatives d(margin)/d(input) [dB per input unit] of a batch, per link and input (see sensitivity_variables),
+    with the input values they were taken at and the margins [dB]'''
+    def __init__(self, uplink, downlink, values, uplink_margin, downlink_margin):
+        self.uplink = uplink
+        self.downlink = downlink
+        self.values = values
+        self.uplink_margin = uplink_margin
+        self.downlink_margin = downlink_margin
+
+    def derivatives(self, link="both"):
+        '''Obtain {input: d(margin)/d(input)} of the uplink, downlink or (for "both") the limiting link per scenario'''
+        if link == "uplink":
+            return self.uplink
+        if link == "downlink":
+            return self.downlink
+        uplink_limits = self.uplink_margin <= self.downlink_margin
+        return {name: np.where(uplink_limits, self.uplink[name], self.downlink[name]) for name in self.uplink}
+
+    def swings(self, relative_change=0.1, changes=None, link="both"):
+        '''Obtain {input: margin change [dB]} for a change of every input by relative_change of its value (or by the
+        absolute amounts of changes, {input: change}), to first order. Inputs left empty have no swing.
+
+        The link availability changes by relative_change of the outage (100 - availability) instead.'''
+        changes = changes or {}
+        swings = {}
+        for name, derivative in self.derivatives(link).items():
+            reference = change_references[name](self.values[name]) if name in change_references else self.values[name]
+            change = changes[name] if name in changes else relative_change * reference
+            swings[name] = np.where(np.isnan(self.values[name]), 0.0, derivative * change)
+        return swings
+
+    def tornado(self, relative_change=0.1, changes=None, link="both"):
+        '''Rank the inputs by the size of their swing, largest first, for every scenario of the batch
+
+        Returns (names, swings [dB]), both of the batch shape plus a last axis over the inputs.'''
+        swings = self.swings(relative_change, changes, link)
+        names = np.array(list(swings))
+        stacked = np.stack(np.broadcast_arrays(*swings.values()), axis=-1)
+        order = np.argsort(-np.abs(stacked), axis=-1, kind="stable")
+        return names[order], np.take_along_axis(stacked, order, axis=-1)
+
+def margin_sensitivity(inputs):
+    '''Obtain the derivatives of the uplink and downlink margins to every numeric input, for a whole batch at once
+
+    The margins are sums of dB terms, so every derivative follows analytically from the term that holds the
+    input (e.g. 2*10/ln(10)/D for an antenna gain, 2*L/D for a pointing loss). Only the atmospheric loss and
+    the frequency-dependent default noise temperatures are tabulated models; their derivatives are central
+    differences of those terms alone, without re-running the budget. Returns a SensitivityResult.'''
+    if isinstance(inputs, LinkBudgetInput):
+        inputs = inputs.as_dict()
+    inputs = {**batch_defaults, **{k: v for k, v in inputs.items() if v is not None}}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = calculate_link_budget_batch(inputs)
+    uplink_table, downlink_table = result.uplink_data, result.downlink_data
+    shape = np.shape(uplink_table["M"][1])
+    values = {name: np.broadcast_to(as_float(inputs[name]), shape) for name in sensitivity_variables}
+    c = dB_per_neper
+
+    freq = values["downlink_freq"]
+    TAR = values["sc_TAR"]
+    freq_uplink = freq * TAR
+    sc_diam, gs_diam = values["antenna_sc_diam"], values["antenna_gs_diam"]
+    sc_offset, gs_offset = values["sc_pointing_offset_angle"], values["gs_pointing_offset_angle"]
+    altitude = values["orbit_alt"]
+    body_idx = lookup_index(inputs["target_body"], body_names)
+    R = body_table[body_idx, 1]
+    # Pointing losses [dB] (positive) of the transmitting and receiving antennas of both links
+    L_up_out, L_up_in = -uplink_table["L_GS_pointing"][1], -uplink_table["L_SC_pointing"][1]
+    L_down_out, L_down_in = -downlink_table["L_SC_pointing"][1], -downlink_table["L_GS_pointing"][1]
+    # System noise temperatures [K] used by the budget, given or default
+    T_up = 10**(-uplink_table["1/T_sys"][1] / 10)
+    T_down = 10**(-downlink_table["1/T_sys"][1] / 10)
+
+    zero = np.zeros(shape)
+    uplink = {name: zero for name in sensitivity_variables}
+    downlink = {name: zero for name in sensitivity_variables}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Powers, loss factors and efficiencies enter as 10*log10(x)
+        uplink["transmitter_gs_power"] = c / values["transmitter_gs_power"]
+        downlink["transmitter_sc_power"] = c / values["transmitter_sc_power"]
+        for name in ("transmitter_LF", "receiver_LF", "antenna_sc_eff", "antenna_gs_eff"):
+            uplink[name] = downlink[name] = c / values[name]
+
+        # Antenna gains grow with 20*log10(D), pointing losses with D^2; each antenna serves both links
+        uplink["antenna_gs_diam"] = (2 * c - 2 * L_up_out) / gs_diam
+        downlink["antenna_gs_diam"] = (2 * c - 2 * L_down_in) / gs_diam
+        uplink["antenna_sc_diam"] = (2 * c - 2 * L_up_in) / sc_diam
+        downlink["antenna_sc_diam"] = (2 * c - 2 * L_down_out) / sc_diam
+        uplink["gs_pointing_offset_angle"] = -pointing_loss_slope(freq_uplink, gs_diam, gs_offset)
+        downlink["gs_pointing_offset_angle"] = -pointing_loss_slope(freq, gs_diam, gs_offset)
+        uplink["sc_pointing_offset_angle"] = -pointing_loss_slope(freq_uplink, sc_diam, sc_offset)
+        downlink["sc_pointing_offset_angle"] = -pointing_loss_slope(freq, sc_diam, sc_offset)
+
+        # Frequency: both antenna gains (+2 each) and the space loss (-2) go with log10(f), pointing losses with f^2
+        uplink_freq_slope = (2 * c - 2 * (L_up_out + L_up_in)) / freq_uplink
+        uplink["downlink_freq"] = uplink_freq_slope * TAR
+        uplink["sc_TAR"] = uplink_freq_slope * freq
+        downlink["downlink_freq"] = (2 * c - 2 * (L_down_out + L_down_in)) / freq
+
+        # Near-Earth space loss over S^2 = (h + R)^2 - R^2, deep-space loss over the elongation angle
+        near = body_idx == EARTH
+        deep = (body_idx != EARTH) & (body_idx != MOON)
+        space_altitude = np.where(near, -c * 2 * (altitude + R) / ((altitude + R)**2 - R**2), 0.0)
+        d_earth_sun, d_sc_sun = body_table[EARTH, 2], body_table[body_idx, 2]
+        elong = np.radians(values["elong_angle"])
+        S_squared = d_earth_sun**2 + d_sc_sun**2 - 2 * d_earth_sun * d_sc_sun * np.cos(elong)
+        space_elong = np.where(deep, -c * 2 * d_earth_sun * d_sc_sun * np.sin(elong) * np.pi / 180 / S_squared, 0.0)
+        uplink["elong_angle"] = downlink["elong_angle"] = space_elong
+
+        # Required downlink data rate ~ bpp * tan(SW/2) * V_ground / tan(pixel/2)^2 * duty / time,
+        # with V_ground ~ (R + h)^-1.5 and the swath and pixel widths ~ h
+        uplink["orbit_alt"] = space_altitude
+        downlink["orbit_alt"] = space_altitude + c * (1 / altitude + 1.5 / (R + altitude))
+        uplink["uplink_datarate_req"] = -c / values["uplink_datarate_req"]
+        downlink["PL_bpp"] = -c / values["PL_bpp"]
+        downlink["PL_duty_cycle"] = -c / values["PL_duty_cycle"]
+        downlink["PL_downlink_time"] = c / values["PL_downlink_time"]
+        downlink["PL_SW_angle"] = -c * (np.pi / 180) / np.sin(np.radians(values["PL_SW_angle"]))
+        half_pixel = np.radians(values["PL_pixel_size"] / 120)
+        downlink["PL_pixel_size"] = c * 2 * (2 / np.sin(2 * half_pixel)) * np.pi / (180 * 120)
+
+        # Noise temperatures enter as -10*log10(T), given or default
+        uplink["temp_sys_uplink"] = -c / T_up
+        downlink["temp_sys_downlink"] = -c / T_down
+
+    # Atmospheric loss and default noise temperatures over frequency, elevation and availability (constant
+    # without any GS elevation angle)
+    if not np.isnan(values["gs_elevation_angle"]).all():
+        atmosphere_inputs = {"freq_uplink": freq_uplink, "freq_downlink": freq,
+                             "elevation": values["gs_elevation_angle"], "availability": values["link_availability"],
+                             "temp_uplink": values["temp_sys_uplink"], "temp_downlink": values["temp_sys_downlink"],
+                             "clear_temp_uplink": sys_temp(freq_uplink), "clear_temp_downlink": sys_temp(freq, uplink=False)}
+        perturbed = {"downlink_freq": ("freq_uplink", "freq_downlink"), "sc_TAR": ("freq_uplink",),
+                     "gs_elevation_angle": ("elevation",), "link_availability": ("availability",)}
+        for name, (step, relative) in atmosphere_steps.items():
+            h = step * values[name] if relative else np.full(shape, step)
+            margins = []
+            for sign in (1, -1):
+                # Every input depending on the variable moves by the same relative (or absolute) step
+                changed = {key: atmosphere_inputs[key] * (1 + sign * step) if relative else atmosphere_inputs[key] + sign * h
+                           for key in perturbed[name]}
+                margins.append(atmosphere_margins(**{**atmosphere_inputs, **changed}))
+            (up_plus, down_plus), (up_minus, down_minus) = margins
+            with np.errstate(invalid="ignore", divide="ignore"):
+                uplink[name] = uplink[name] + np.nan_to_num((up_plus - up_minus) / (2 * h))
+                downlink[name] = downlink[name] + np.nan_to_num((down_plus - down_minus) / (2 * h))
+
+    uplink = {name: np.broadcast_to(value, shape) for name, value in uplink.items()}
+    downlink = {name: np.broadcast_to(value, shape) for name, value in downlink.items()}
+    values = dict(values, temp_sys_uplink=T_up, temp_sys_downlink=T_down)
+    return SensitivityResult(uplink, downlink, values, uplink_table["M"][1], downlink_table["M"][1])
@@ -0,0 +1,242 @@
+import asyncio
+import collections
+import json
+import time
+import numpy as np
+from engine import input_fields, uplink_terms, downlink_terms
+from fastpath import ParsedInput, budget_values
+from vectorized import calculate_link_budget_batch, batch_defaults, body_names, coding_names
+
+### CONSTANTS ###
+# Latency targets [s] of single-scenario requests against localhost, checked by the benchmark suite
+latency_targets = {"p50": 0.01, "p99": 0.05}
+# Inputs every scenario has to give, the others default as in the GUI
+required_fields = [field for field in input_fields if field not in batch_defaults]
+
+http_reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                500: "Internal Server Error"}
+# Batches of up to this many scenarios are evaluated one by one with the scalar kernel (fastpath.py), which
+# is faster than the fixed overhead of a NumPy batch for a handful of scenarios
+scalar_batch_limit = 8
+
+### BATCH EVALUATION ###
+def validate_scenario(scenario):
+    '''Raise a ValueError for scenarios that would fail the batch they are coalesced into
+
+    Scenarios have to be a JSON object with all required inputs, known target body and coding names and
+    numeric values for the other inputs ("" or null for the optional ones).'''
+    if not isinstance(scenario, dict):
+        raise ValueError("scenario must be a JSON object")
+    missing = [field for field in required_fields if field not in scenario]
+    unknown = [field for field in scenario if field not in input_fields]
+    if missing or unknown:
+        raise ValueError(f"missing inputs {missing}, unknown inputs {unknown}")
+    for field, names in (("target_body", body_names), ("modulation_coding", coding_names)):
+        if field in scenario and scenario[field] not in names:
+            raise ValueError(f"unknown {field} {scenario[field]!r}")
+    for field, value in scenario.items():
+        if field in ("target_body", "modulation_coding") or (field in batch_defaults and value in ("", None)):
+            continue
+        try:
+            float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number, got {value!r}") from None
+
+def evaluate_scenario_scalar(scenario):
+    '''Evaluate one scenario with the scalar kernel, rounded like the batches (numpy.round), or return None for
+    scenarios the batches evaluate to NaN (non-physical or empty inputs)'''
+    try:
+        tables = []
+        for terms, values in zip((uplink_terms, downlink_terms), budget_values(ParsedInput(scenario))):
+            # numpy.round: scaled, rounded half to even and scaled back, keeping the sign of zero
+            tables.append({key: (desc, round(value * 1e5) / 1e5 or 0.0 * value) for (key, desc), value in zip(terms, values)})
+    except (ValueError, ZeroDivisionError, OverflowError):
+        return None
+    return {"uplink_data": tables[0], "downlink_data": tables[1]}
+
+def evaluate_scenarios(scenarios):
+    '''Evaluate a list of scenario dictionaries in one vectorized batch, returns their uplink/downlink tables'''
+    if len(scenarios) <= scalar_batch_limit:
+        results = [evaluate_scenario_scalar(scenario) for scenario in scenarios]
+        if None not in results:
+            return results
+    columns = {field: [scenario.get(field, batch_defaults.get(field)) for scenario in scenarios] for field in input_fields}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = calculate_link_budget_batch(columns)
+    tables = []
+    for terms, data in ((uplink_terms, result.uplink_data), (downlink_terms, result.downlink_data)):
+        # Round whole columns at once, NaN (non-physical inputs) becomes null in JSON
+        values = [[None if v != v else v for v in np.round(np.broadcast_to(data[key][1], len(scenarios)), 5).tolist()]
+                  for key, desc in terms]
+        tables.append([{key: (desc, row[i]) for i, (key, desc) in enumerate(terms)} for row in zip(*values)])
+    return [{"uplink_data": up, "downlink_data": down} for up, down in zip(*tables)]
+
+### SERVICE ###
+class BudgetService:
+    '''HTTP/JSON link budget service coalescing concurrent requests into vectorized batches
+
+    Requests queued while a batch is being computed are evaluated together in the next batch, so batches
+    grow with the load. max_delay [s] optionally waits for more requests before starting a batch.'''
+    def __init__(self, max_batch=8192, max_delay=0.0):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = None
+        # Recent request latencies [s] and batch sizes, bounded to keep memory constant
+        self.latencies = collections.deque(maxlen=10000)
+        self.batch_sizes = collections.deque(maxlen=10000)
+
+    async def submit(self, scenarios):
+        '''Queue scenarios for the next batch and wait for their tables'''
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((scenarios, future))
+        return await future
+
+    async def batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_delay
+            while size < self.max_batch:
+                if not self.queue.empty():
+                    item = self.queue.get_nowait()
+                elif loop.time() < deadline:
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), deadline - loop.time())
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            scenarios = [scenario for item_scenarios, future in batch for scenario in item_scenarios]
+            self.batch_sizes.append(len(scenarios))
+            # Compute in a thread so the event loop keeps accepting requests meanwhile
+            try:
+                tables = await loop.run_in_executor(None, evaluate_scenarios, scenarios)
+            except Exception as err:
+                for item_scenarios, future in batch:
+                    future.set_exception(err)
+                continue
+            start = 0
+            for item_scenarios, future in batch:
+                future.set_result(tables[start:start + len(item_scenarios)])
+                start += len(item_scenarios)
+
+    def stats(self):
+        '''Latency percentiles [s] and batch sizes of the recent requests'''
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        sizes = np.array(self.batch_sizes) if self.batch_sizes else np.zeros(1)
+        return {"requests": len(self.latencies),
+                "p50": float(np.percentile(latencies, 50)),
+                "p99": float(np.percentile(latencies, 99)),
+                "mean_batch_size": float(sizes.mean()),
+                "max_batch_size": int(sizes.max())}
+
+    async def handle_request(self, method, path, body):
+        '''Route a request, returns (status, JSON-serialisable response)'''
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/stats":
+            return 200, self.stats()
+        if path != "/budget":
+            return 404, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        try:
+            data = json.loads(body)
+            # A single scenario object or a list of scenarios (bulk request)
+            scenarios = data if isinstance(data, list) else [data]
+            for scenario in scenarios:
+                validate_scenario(scenario)
+        except ValueError as err:
+            return 400, {"error": str(err)}
+        tables = await self.submit(scenarios) if scenarios else []
+        return 200, tables if isinstance(data, list) else tables[0]
+
+    async def handle_connection(self, reader, writer):
+        '''Serve HTTP/1.1 requests on one (keep-alive) connection'''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                start = time.perf_counter()
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                try:
+                    status, response = await self.handle_request(method, path, body)
+                except Exception as err:
+                    # Unexpected failures (e.g. in the batch evaluation) are reported, the connection stays usable
+                    status, response = 500, {"error": f"{type(err).__name__}: {err}"}
+                payload = json.dumps(response).encode()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                writer.write(f"HTTP/1.1 {status} {http_reasons[status]}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if path == "/budget":
+                    self.latencies.append(time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080, ready=None):
+        '''Run the service until cancelled, ready(port) is called once it accepts connections'''
+        self.queue = asyncio.Queue()
+        batcher = asyncio.create_task(self.batch_loop())
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+def run_service(host="127.0.0.1", port=8080, max_batch=8192, max_delay=0.0):
+    '''Run the link budget service in the foreground'''
+    service = BudgetService(max_batch, max_delay)
+    asyncio.run(service.serve(host, port, ready=lambda port: print(f"Serving link budgets on http://{host}:{port}/budget")))
+
+### LOAD TEST CLIENT ###
+async def load_test(scenario, host="127.0.0.1", port=8080, requests=2000, concurrency=32):
+    '''POST a scenario requests times over concurrency keep-alive connections, returns latency percentiles [s]'''
+    payload = json.dumps(scenario).encode()
+    request = (f"POST /budget HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+               f"Content-Length: {len(payload)}\r\n\r\n").encode() + payload
+    latencies = []
+
+    async def client(count):
+        reader, writer = await asyncio.open_connection(host, port)
+        for _ in range(count):
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b"\r\n":
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(requests // concurrency) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"requests/s": len(latencies) / elapsed,
+            "p50": float(np.percentile(latencies, 50)),
+            "p99": float(np.percentile(latencies, 99))}
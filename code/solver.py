@@ -0,0 +1,106 @@
+import numpy as np
+from vectorized import calculate_link_budget_batch, as_float, batch_defaults
+
+### VARIABLE DEFINITIONS ###
+# Variables entering the dB budget as exponent * 10*log10(x)
+# Data format: exponent, links whose margin depends on the variable
+linear_dB_variables = {"transmitter_sc_power": (1, ("downlink",)),
+                       "transmitter_gs_power": (1, ("uplink",)),
+                       "transmitter_LF": (1, ("uplink", "downlink")),
+                       "receiver_LF": (1, ("uplink", "downlink")),
+                       "antenna_sc_eff": (1, ("uplink", "downlink")),
+                       "antenna_gs_eff": (1, ("uplink", "downlink")),
+                       "uplink_datarate_req": (-1, ("uplink",)),
+                       "PL_bpp": (-1, ("downlink",)),
+                       "PL_duty_cycle": (-1, ("downlink",)),
+                       "PL_downlink_time": (1, ("downlink",)),
+                       "temp_sys_uplink": (-1, ("uplink",)),
+                       "temp_sys_downlink": (-1, ("downlink",))}
+
+# Variables solved numerically
+# Data format: default (lower, upper) search bounds, log-spaced search, solution wanted ("min" or "max" value that closes)
+numeric_variables = {"antenna_sc_diam": ((0.01, 100.0), True, "min"),
+                     "antenna_gs_diam": ((0.01, 100.0), True, "min"),
+                     "downlink_freq": ((0.2, 100.0), True, "min"),
+                     "sc_TAR": ((0.5, 2.0), False, "min"),
+                     "orbit_alt": ((100.0, 10**6), True, "max"),
+                     "sc_pointing_offset_angle": ((10**-4, 10.0), True, "max"),
+                     "gs_pointing_offset_angle": ((10**-4, 10.0), True, "max"),
+                     "gs_elevation_angle": ((0.0, 90.0), False, "min"),
+                     "link_availability": ((90.0, 99.999), False, "max")}
+
+### MARGIN EVALUATION ###
+def link_margin(inputs, link="both"):
+    '''Obtain the uplink, downlink or (for "both") the smaller of the two margins [dB] of a batch'''
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = calculate_link_budget_batch(inputs)
+    if link == "uplink":
+        return result.uplink_data["M"][1]
+    if link == "downlink":
+        return result.downlink_data["M"][1]
+    return np.minimum(result.uplink_data["M"][1], result.downlink_data["M"][1])
+
+### SOLVERS ###
+def solve_linear_dB(inputs, variable, target_margin, link="both"):
+    '''Solve analytically for a variable entering the budget as +-10*log10(x), considering only the links it affects'''
+    exponent, variable_links = linear_dB_variables[variable]
+    result = calculate_link_budget_batch(inputs)
+    solutions = []
+    for name, table in (("uplink", result.uplink_data), ("downlink", result.downlink_data)):
+        if name not in variable_links or link not in (name, "both"):
+            continue
+        # Current value; noise temperatures may have been left to their defaults
+        if variable == f"temp_sys_{name}":
+            current = 10**(-table["1/T_sys"][1] / 10)
+        else:
+            current = as_float(inputs[variable] if variable in inputs else batch_defaults[variable])
+        solutions.append(current * 10**((target_margin - table["M"][1]) / (10 * exponent)))
+    if not solutions:
+        raise ValueError(f"{variable} does not affect the {link} margin")
+    # The variable has to close every link: the largest value if the margin grows with it, else the smallest
+    return np.maximum.reduce(solutions) if exponent > 0 else np.minimum.reduce(solutions)
+
+def solve_numeric(inputs, variable, target_margin, link="both", bounds=None, log=None, direction=None,
+                  grid_points=64, iterations=60):
+    '''Solve numerically for the smallest ("min") or largest ("max") value within bounds that closes the link
+
+    A grid scan over the bounds brackets the first crossing of the target margin for every scenario at
+    once, after which a vectorized bisection refines all brackets together. NaN where no value closes.'''
+    default_bounds, default_log, default_direction = numeric_variables.get(variable, (None, False, "min"))
+    bounds = bounds or default_bounds
+    log = default_log if log is None else log
+    direction = direction or default_direction
+    if bounds is None:
+        raise ValueError(f"search bounds needed for {variable}")
+    shape = np.shape(link_margin(inputs, link))
+
+    # Grid scan, grid points along the first axis and scenarios along the others
+    grid = np.geomspace(*bounds, grid_points) if log else np.linspace(*bounds, grid_points)
+    if direction == "max":
+        grid = grid[::-1]
+    grid = grid.reshape((grid_points,) + (1,) * len(shape))
+    closes = link_margin({**inputs, variable: grid}, link) >= target_margin
+    closes = np.broadcast_to(closes, (grid_points,) + shape)
+    found = closes.any(axis=0)
+    first = np.argmax(closes, axis=0)
+    grid = np.broadcast_to(grid, (grid_points,) + shape)
+    inside = np.take_along_axis(grid, first[None], axis=0)[0]
+    outside = np.take_along_axis(grid, np.maximum(first - 1, 0)[None], axis=0)[0]
+    # Scenarios already closing at the bound need no refinement
+    refine = found & (first > 0)
+
+    for _ in range(iterations):
+        middle = np.sqrt(inside * outside) if log else (inside + outside) / 2
+        middle_closes = link_margin({**inputs, variable: np.where(refine, middle, inside)}, link) >= target_margin
+        inside = np.where(refine & middle_closes, middle, inside)
+        outside = np.where(refine & ~middle_closes, middle, outside)
+    return np.where(found, inside, np.nan)
+
+def solve(inputs, variable, target_margin=3.0, link="both", **kwargs):
+    '''Find the value of one input that gives the target margin [dB], for every scenario of a batch
+
+    Variables entering the dB budget linearly (powers, loss factors, efficiencies, data rate terms and
+    noise temperatures) are solved analytically, all other numeric inputs by solve_numeric.'''
+    if variable in linear_dB_variables:
+        return solve_linear_dB(inputs, variable, target_margin, link)
+    return solve_numeric(inputs, variable, target_margin, link, **kwargs)
@@ -0,0 +1,178 @@
+import numpy as np
+from engine import LinkBudgetInput
+from orbit import iter_pass, contact_windows, downlink_info_rate
+
+### CONTACT SCHEDULE ###
+def payload_generation_rate(inputs):
+    '''Obtain the mean payload data generation rate [bit/s]: the information rate the downlink budget is dimensioned
+    for (see required_data_rate) times the share PL_downlink_time/24 of the day it assumes for downlinking'''
+    return downlink_info_rate(inputs) * float(inputs["PL_downlink_time"]) / 24
+
+def contact_schedule(inputs, duration, step=1.0, acm=False, required_margin=0.0, names=None, **kwargs):
+    '''Obtain the contact windows of a mission over [0, duration) s with their mean downlink rates [bit/s]
+
+    The orbit is propagated in chunks (see orbit.iter_pass for the options), so memory only grows with the number
+    of contacts. Without acm a contact needs the downlink margin of the budget and runs at its information rate;
+    with acm=True every step uses the best scheme closing with required_margin (see acm.acm_rates) and a contact
+    lasts while any scheme closes. Returns (start [s], end [s], rate [bit/s]) arrays.'''
+    if isinstance(inputs, LinkBudgetInput):
+        inputs = inputs.as_dict()
+    min_elevation = kwargs.pop("min_elevation", 5.0)
+    if acm:
+        from acm import acm_rates, pass_snr_offset
+        snr_offset, channel_rate = pass_snr_offset(inputs)
+    else:
+        info_rate = float(downlink_info_rate(inputs))
+
+    windows = []
+    # Data volume [bit] downlinked since the start, at the start of every window
+    volume = 0.0
+    window_volumes = []
+    open_start = None
+    open_volume = 0.0
+    for chunk in iter_pass(inputs, duration, step, min_elevation=min_elevation,
+                           required_margin=-np.inf if acm else required_margin, **kwargs):
+        if acm:
+            in_view = chunk["elevation"] >= min_elevation
+            rate = acm_rates(np.where(in_view, chunk["downlink_margin"] + snr_offset, -np.inf), channel_rate,
+                             required_margin, names).info_rate
+            contact = rate > 0
+        else:
+            contact = chunk["contact"]
+            rate = np.where(contact, info_rate, 0.0)
+        # Downlinked volume at every step boundary of the chunk, to split it over the windows
+        cumulative = volume + np.concatenate([[0.0], np.cumsum(rate * step)])
+        chunk_windows, next_open = contact_windows(chunk["time"], contact, step, open_start)
+        for start, end in chunk_windows:
+            start_volume = open_volume if start == open_start else cumulative[int(round((start - chunk["time"][0]) / step))]
+            windows.append((start, end))
+            window_volumes.append(cumulative[int(round((end - chunk["time"][0]) / step))] - start_volume)
+        if next_open is not None and next_open != open_start:
+            open_volume = cumulative[int(round((next_open - chunk["time"][0]) / step))]
+        open_start = next_open
+        volume = cumulative[-1]
+    if open_start is not None:
+        windows.append((open_start, step * np.ceil(duration / step)))
+        window_volumes.append(volume - open_volume)
+
+    start, end = (np.array(values, dtype=float) for values in zip(*windows)) if windows else (np.empty(0), np.empty(0))
+    return start, end, np.array(window_volumes) / np.maximum(end - start, step)
+
+### STORAGE SIMULATION ###
+def curve_time(values, time, u, side="left"):
+    '''Obtain the earliest (side="left") or latest (side="right") time at which a non-decreasing piecewise linear
+    curve through (time, values) reaches the values u'''
+    i = np.clip(np.searchsorted(values, u, side=side), 1, len(values) - 1)
+    dv = values[i] - values[i - 1]
+    fraction = np.clip(np.divide(u - values[i - 1], dv, out=np.zeros(np.shape(u)), where=dv > 0), 0.0, 1.0)
+    return time[i - 1] + fraction * (time[i] - time[i - 1])
+
+class StorageResult:
+    '''Onboard storage over a mission: data volumes [bit], buffer fill [bit] at its breakpoints, time spent with a
+    full buffer [s] and the latency [s] from generation to ground of the downlinked data (first in, first out)'''
+    def __init__(self, generated, overflow, downlinked, time, fill, full_time, latency_mean, latency_max,
+                 latency_percentiles):
+        self.generated = generated
+        self.overflow = overflow
+        self.downlinked = downlinked
+        self.time = time
+        self.fill = fill
+        self.full_time = full_time
+        self.latency_mean = latency_mean
+        self.latency_max = latency_max
+        self.latency_percentiles = latency_percentiles
+
+    @property
+    def backlog(self):
+        '''Data [bit] still on board at the end of the mission'''
+        return float(self.fill[-1])
+
+    @property
+    def max_fill(self):
+        return float(self.fill.max())
+
+    def summary(self):
+        return {"generated": self.generated, "downlinked": self.downlinked, "overflow": self.overflow,
+                "backlog": self.backlog, "max_fill": self.max_fill, "full_time": self.full_time,
+                "latency_mean": self.latency_mean, "latency_max": self.latency_max,
+                "latency_percentiles": self.latency_percentiles}
+
+def simulate_storage(generation_rate, capacity, start, end, rate, duration, initial_fill=0.0,
+                     percentiles=(50, 90, 99), latency_samples=100001):
+    '''Simulate the onboard buffer between contact windows [start, end) s with downlink rates [bit/s]
+
+    Data is generated continuously at generation_rate [bit/s] into a buffer of capacity [bit]; data generated
+    while it is full is lost (overflow). Between events (contact start and end, buffer full or empty) the
+    fill changes linearly, so the simulation takes O(contacts) steps however long the mission is. Latencies
+    follow from the cumulative stored and downlinked volumes, evaluated at latency_samples equally spaced bits
+    (plus all breakpoints for the maximum). Returns a StorageResult.'''
+    g = float(generation_rate)
+    # Breakpoints of the piecewise linear cumulative stored volume, downlinked volume and fill
+    # Data format: time [s], stored [bit], downlinked [bit], fill [bit]
+    points = [(0.0, float(initial_fill), 0.0, float(initial_fill))]
+    overflow = 0.0
+    full_time = 0.0
+
+    def advance(t_end, r):
+        '''Advance from the last breakpoint to t_end while downlinking at rate r [bit/s]'''
+        nonlocal overflow, full_time
+        t, stored, down, fill = points[-1]
+        dt = t_end - t
+        if dt <= 0:
+            return
+        net = g - r
+        if net > 0 and fill + net * dt > capacity:
+            # Fills up, then stores only what is downlinked and loses the rest
+            t_full = t + (capacity - fill) / net
+            points.append((t_full, stored + g * (t_full - t), down + r * (t_full - t), capacity))
+            overflow += net * (t_end - t_full)
+            full_time += t_end - t_full
+            t, stored, down, fill = points[-1]
+            points.append((t_end, stored + r * (t_end - t), down + r * (t_end - t), capacity))
+        elif net < 0 and fill + net * dt < 0:
+            # Empties, then downlinks the data as it is generated
+            t_empty = t + fill / -net
+            points.append((t_empty, stored + g * (t_empty - t), down + r * (t_empty - t), 0.0))
+            t, stored, down, fill = points[-1]
+            points.append((t_end, stored + g * (t_end - t), down + g * (t_end - t), 0.0))
+        else:
+            points.append((t_end, stored + g * dt, down + r * dt, fill + net * dt))
+            if fill == capacity and net == 0:
+                full_time += dt
+
+    for window_start, window_end, window_rate in zip(start, end, rate):
+        advance(min(window_start, duration), 0.0)
+        advance(min(window_end, duration), window_rate)
+    advance(duration, 0.0)
+
+    time, stored, down, fill = (np.array(values) for values in zip(*points))
+    # FIFO: the bit u of the downlinked data was generated when stored reached u and received when down did;
+    # bits of the initial fill count from the start
+    latency_mean = latency_max = np.nan
+    latency_percentiles = {q: np.nan for q in percentiles}
+    if down[-1] > 0:
+        u = (np.arange(latency_samples) + 0.5) / latency_samples * down[-1]
+        latency = curve_time(down, time, u) - curve_time(stored, time, u)
+        # The latency jumps where either curve is flat (gaps, full buffer), its extremes lie at the breakpoints,
+        # just below (left) or above (right) them
+        breakpoints = np.concatenate([stored[stored <= down[-1]], down])
+        latency_max = float(max(latency.max(), *(
+            (curve_time(down, time, breakpoints, side) - curve_time(stored, time, breakpoints, side)).max()
+            for side in ("left", "right"))))
+        latency_mean = float(latency.mean())
+        latency_percentiles = {q: float(np.percentile(latency, q)) for q in percentiles}
+    return StorageResult(float(g * duration), float(overflow), float(down[-1]), time, fill, float(full_time),
+                         latency_mean, latency_max, latency_percentiles)
+
+def simulate_mission_storage(inputs, duration, capacity, step=10.0, acm=False, generation_rate=None, **kwargs):
+    '''Simulate the onboard storage of a mission over [0, duration) s against its actual contacts
+
+    The payload generates data at generation_rate [bit/s] (by default payload_generation_rate) into a buffer
+    of capacity [bit], downlinked during the contacts of contact_schedule (options as there). Returns
+    (StorageResult, (start, end, rate) of the contacts).'''
+    if isinstance(inputs, LinkBudgetInput):
+        inputs = inputs.as_dict()
+    if generation_rate is None:
+        generation_rate = payload_generation_rate(inputs)
+    schedule = contact_schedule(inputs, duration, step, acm, **kwargs)
+    return simulate_storage(generation_rate, capacity, *schedule, duration), schedule
@@ -0,0 +1,166 @@
+import hashlib
+import io
+import json
+import math
+import sqlite3
+import numpy as np
+from engine import input_fields, model_version
+from service import evaluate_scenarios
+from vectorized import batch_defaults
+
+### CANONICAL KEYS ###
+def canonical_inputs(inputs):
+    '''Obtain the complete inputs of a scenario in canonical form
+
+    Missing optional inputs take their defaults, numbers (or numeric strings) become floats and empty,
+    None and NaN values None, so equal budgets give equal keys however their inputs were typed.'''
+    inputs = {**batch_defaults, **{k: v for k, v in inputs.items() if v is not None}}
+    canonical = {}
+    for field in input_fields:
+        value = inputs.get(field)
+        if field in ("target_body", "modulation_coding"):
+            canonical[field] = str(value)
+        elif value == "" or value is None or (isinstance(value, float) and math.isnan(value)):
+            canonical[field] = None
+        else:
+            canonical[field] = float(value)
+    return canonical
+
+def scenario_key(inputs):
+    '''Content hash of a scenario: SHA-256 of its canonical inputs and the model version'''
+    text = json.dumps({"model_version": model_version, "inputs": canonical_inputs(inputs)}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def sweep_chunk_key(base_inputs, axes, keys, start, stop):
+    '''Content hash of the points [start, stop) of a sweep, with the terms written and the model version'''
+    digest = hashlib.sha256(json.dumps({"model_version": model_version, "base": canonical_inputs(base_inputs),
+                                        "keys": None if keys is None else list(keys), "start": start, "stop": stop},
+                                       sort_keys=True).encode())
+    for name, values in axes.items():
+        values = np.asarray(values)
+        digest.update(name.encode())
+        digest.update(values.astype(str if values.dtype.kind in "OSU" else float).tobytes())
+    return digest.hexdigest()
+
+### CHUNK SERIALISATION ###
+def pack_columns(columns):
+    '''Serialise a chunk of columns to bytes (NumPy .npz, may run in worker processes)'''
+    buffer = io.BytesIO()
+    np.savez(buffer, **{f"{i}": np.asarray(values) for i, values in enumerate(columns.values())},
+             names=np.array(list(columns)))
+    return buffer.getvalue()
+
+def unpack_columns(data):
+    with np.load(io.BytesIO(data)) as arrays:
+        return {name: arrays[f"{i}"] for i, name in enumerate(arrays["names"])}
+
+def pack_formatted(format, columns):
+    '''Worker transform of stored sweeps: the chunk in the output format plus its serialised columns'''
+    return format(columns), pack_columns(columns)
+
+### STORE ###
+class ScenarioStore:
+    '''Local SQLite store of budget results keyed by content hash, evicting the least recently used entries
+
+    Holds single scenario results (see evaluate) and sweep chunks (see sweep.run_sweep), together at most
+    max_bytes of values. Entries of other model versions are never hit and age out.'''
+    def __init__(self, path="scenarios.sqlite", max_bytes=512 * 2**20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, kind TEXT, value BLOB, "
+                                "size INTEGER, last_used INTEGER)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self.clock, self.total_bytes = self.connection.execute(
+            "SELECT COALESCE(MAX(last_used), 0), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        self.hits = 0
+        self.misses = 0
+
+    def tick(self):
+        self.clock += 1
+        return self.clock
+
+    def get_many(self, keys):
+        '''Obtain {key: value} of the stored keys among keys, marking them as recently used'''
+        found = {}
+        keys = list(keys)
+        # SQLite limits the number of query parameters, so look the keys up in slices
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            rows = self.connection.execute(f"SELECT key, value FROM entries WHERE key IN ({','.join('?' * len(part))})", part)
+            found.update(rows)
+        self.connection.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(self.tick(), key) for key in found])
+        self.connection.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def stored_keys(self, keys):
+        '''Obtain the set of the stored keys among keys, without reading their values'''
+        stored = set()
+        keys = list(keys)
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            stored.update(key for key, in self.connection.execute(
+                f"SELECT key FROM entries WHERE key IN ({','.join('?' * len(part))})", part))
+        return stored
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items, kind):
+        '''Store (key, value bytes) items, then evict the least recently used entries beyond max_bytes'''
+        for key, value in items:
+            old = self.connection.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self.total_bytes += len(value) - (old[0] if old else 0)
+            self.connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                                    (key, kind, value, len(value), self.tick()))
+        self.evict()
+        self.connection.commit()
+
+    def put(self, key, value, kind):
+        self.put_many([(key, value)], kind)
+
+    def evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        excess = self.total_bytes - self.max_bytes
+        evicted = []
+        for key, size in self.connection.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            evicted.append(key)
+            excess -= size
+            self.total_bytes -= size
+            if excess <= 0:
+                break
+        self.connection.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in evicted])
+
+    def evaluate(self, scenarios):
+        '''Obtain the uplink/downlink tables of a list of scenario dictionaries, computing only the uncached ones
+
+        The misses are evaluated together in one vectorized batch (as by the HTTP service) and stored.'''
+        keys = [scenario_key(scenario) for scenario in scenarios]
+        found = self.get_many(set(keys))
+        missing = {key: scenario for key, scenario in zip(keys, scenarios) if key not in found}
+        if missing:
+            tables = evaluate_scenarios(list(missing.values()))
+            values = [json.dumps(table).encode() for table in tables]
+            self.put_many(zip(missing, values), "scenario")
+            found.update(zip(missing, values))
+        results = []
+        for key in keys:
+            result = json.loads(found[key])
+            results.append({name: {k: tuple(v) for k, v in table.items()} for name, table in result.items()})
+        return results
+
+    def stats(self):
+        entries, = self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()
+        return {"entries": entries, "bytes": self.total_bytes, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
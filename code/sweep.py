@@ -0,0 +1,155 @@
+import functools
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from batch_io import open_chunk_writer
+from term_tables import TermTable, build_sweep_tables
+from vectorized import calculate_link_budget_batch, flatten_result, lookup_index, body_names, coding_names
+
+### SWEEP DEFINITION ###
+# Inputs given by name that are translated to lookup table indices once per sweep
+categorical_axes = {"target_body": body_names,
+                    "modulation_coding": coding_names}
+
+def sweep_size(axes):
+    '''Number of points in the Cartesian product of the sweep axes'''
+    size = 1
+    for values in axes.values():
+        size *= len(values)
+    return size
+
+def chunk_bounds(size, chunk_size):
+    '''Split the flat point index range [0, size) into (start, stop) chunks'''
+    return [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+
+def sweep_chunk(base_inputs, axes, start, stop, keys=("M",), tables=None):
+    '''Evaluate points [start, stop) of the Cartesian product of axes on top of base_inputs
+
+    tables are TermTables over (some of) the sweep axes (see build_sweep_tables), whose terms are
+    looked up per point instead of evaluated. Returns {column: array} with the swept input values
+    followed by the flattened result terms.'''
+    names = list(axes)
+    shape = [len(axes[name]) for name in names]
+    # Flat point indices are unravelled per chunk, so the full product is never materialised
+    index = np.unravel_index(np.arange(start, stop), shape)
+    inputs = dict(base_inputs)
+    columns = {}
+    for name, idx in zip(names, index):
+        values = np.asarray(axes[name])
+        columns[name] = values[idx]
+        if name in categorical_axes:
+            inputs[name] = lookup_index(values, categorical_axes[name])[idx]
+        else:
+            inputs[name] = values[idx]
+    # Tables over the same axes share their flat point index
+    flat_index = {}
+    terms = {}
+    for table in tables or ():
+        table_axes = tuple(table.axes)
+        if table_axes not in flat_index:
+            flat_index[table_axes] = np.ravel_multi_index([index[names.index(name)] for name in table_axes], table.values.shape)
+        terms[table.term] = table.at(flat_index[table_axes])
+    columns.update(flatten_result(calculate_link_budget_batch(inputs, terms), keys))
+    return columns
+
+### WORKER PROCESS STATE ###
+_worker_sweep = None
+
+def _init_worker(base_inputs, axes, keys, transform, table_paths=()):
+    '''Store the sweep definition once per worker process instead of pickling it with every chunk
+
+    Precomputed tables are opened memory-mapped, so all workers share the pages of the saved files.'''
+    global _worker_sweep
+    tables = [TermTable.load(path) for path in table_paths]
+    _worker_sweep = (base_inputs, axes, keys, transform, tables)
+
+def _run_chunk(bounds):
+    base_inputs, axes, keys, transform, tables = _worker_sweep
+    columns = sweep_chunk(base_inputs, axes, bounds[0], bounds[1], keys, tables)
+    return columns if transform is None else transform(columns)
+
+### SWEEP RUNNERS ###
+def iter_sweep(base_inputs, axes, chunk_size=65536, workers=None, keys=("M",), transform=None, precompute=False, skip=()):
+    '''Yield (start, stop, columns) for every chunk of the sweep, in order
+
+    Chunks are sharded across a process pool of `workers` processes (all cores by default,
+    in-process for workers=1). At most two chunks per worker are in flight, so memory
+    stays bounded however large the sweep is. A module-level `transform` is applied to
+    each chunk inside the worker and its return value is yielded instead of the columns.
+    With precompute=True the hot terms are first tabulated over the sweep axes they depend on
+    (in a temporary directory shared by the workers) and looked up per point.
+    Chunks starting at a point in skip are left out (e.g. those already computed).'''
+    bounds = [chunk for chunk in chunk_bounds(sweep_size(axes), chunk_size) if chunk[0] not in skip]
+    if not bounds:
+        return
+    if precompute:
+        with tempfile.TemporaryDirectory(prefix="sweep_tables_") as directory:
+            table_paths = list(build_sweep_tables(base_inputs, axes, directory).values())
+            yield from _iter_sweep(base_inputs, axes, bounds, workers, keys, transform, table_paths)
+    else:
+        yield from _iter_sweep(base_inputs, axes, bounds, workers, keys, transform, [])
+
+def _iter_sweep(base_inputs, axes, bounds, workers, keys, transform, table_paths):
+    workers = workers or os.cpu_count() or 1
+    initargs = (base_inputs, axes, keys, transform, table_paths)
+    if workers == 1 or len(bounds) == 1:
+        _init_worker(*initargs)
+        for chunk in bounds:
+            yield chunk[0], chunk[1], _run_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        pending = []
+        remaining = iter(bounds)
+        # Keep the pool busy while handing out results in submission order
+        for chunk in remaining:
+            pending.append((chunk, pool.submit(_run_chunk, chunk)))
+            if len(pending) >= 2 * workers:
+                break
+        try:
+            while pending:
+                (start, stop), future = pending.pop(0)
+                columns = future.result()
+                chunk = next(remaining, None)
+                if chunk is not None:
+                    pending.append((chunk, pool.submit(_run_chunk, chunk)))
+                yield start, stop, columns
+        finally:
+            # A sweep abandoned midway (e.g. a cancelled GUI job) drops its queued chunks
+            pool.shutdown(cancel_futures=True)
+
+def run_sweep(base_inputs, axes, file_path, chunk_size=65536, workers=None, keys=("M",), precompute=False, store=None):
+    '''Evaluate the full sweep and stream the results to a CSV/Parquet file, returns the number of points
+
+    With a store.ScenarioStore every computed chunk is also stored, and chunks found in the store are
+    written from there instead of being computed again, so an interrupted sweep resumes where it stopped.'''
+    column_names = list(sweep_chunk(base_inputs, axes, 0, 1, keys))
+    points = 0
+    with open_chunk_writer(file_path, column_names) as writer:
+        if store is None:
+            # Chunks are converted to the output format by the workers, the parent only writes them out
+            for start, stop, chunk in iter_sweep(base_inputs, axes, chunk_size, workers, keys, writer.format, precompute):
+                writer.write(chunk)
+                points = stop
+            return points
+
+        from store import sweep_chunk_key, pack_formatted, unpack_columns
+        bounds = chunk_bounds(sweep_size(axes), chunk_size)
+        chunk_keys = {start: sweep_chunk_key(base_inputs, axes, keys, start, stop) for start, stop in bounds}
+        stored = store.stored_keys(chunk_keys.values())
+        done = {start for start, key in chunk_keys.items() if key in stored}
+        computed = iter_sweep(base_inputs, axes, chunk_size, workers, keys,
+                              functools.partial(pack_formatted, writer.format), precompute, skip=done)
+        for start, stop in bounds:
+            if start in done:
+                # Read one stored chunk at a time, recomputing it if it was evicted in the meantime
+                packed = store.get(chunk_keys[start])
+                columns = unpack_columns(packed) if packed is not None else sweep_chunk(base_inputs, axes, start, stop, keys)
+                writer.write(writer.format(columns))
+            else:
+                _, _, (chunk, packed) = next(computed)
+                store.put(chunk_keys[start], packed, "sweep_chunk")
+                writer.write(chunk)
+            points = stop
+    return points
@@ -0,0 +1,224 @@
+import itertools
+import os
+import numpy as np
+from propagation import atmospheric_loss
+from vectorized import (transmitter_gain, pointing_loss, free_space_loss, body_slant_range, required_data_rate,
+                        lookup_index, as_float, batch_defaults, body_names, coding_names, body_table, coding_table)
+
+### HOT TERMS ###
+# Inputs given by name, tabulated over their lookup table indices
+categorical_fields = {"target_body": body_names,
+                      "modulation_coding": coding_names}
+# Inputs interpolated in a transformed coordinate in which the terms are closer to linear
+# Data format: input field: (transform, inverse), the transform increasing
+coordinate_transforms = {"link_availability": (lambda av: -np.log(100 - av), lambda x: 100 - np.exp(-x))}
+
+def _atmosphere(freq, elevation, availability):
+    elevation = as_float(elevation)
+    return np.where(np.isnan(elevation), 0.0, atmospheric_loss(freq, elevation, as_float(availability)))
+
+def _data_rate(PL_bpp, PL_SW_angle, PL_pixel_size, orbit_alt, PL_duty_cycle, PL_downlink_time, modulation_coding, target_body):
+    body_idx = lookup_index(target_body, body_names)
+    return required_data_rate(PL_bpp, PL_SW_angle, PL_pixel_size, orbit_alt, PL_duty_cycle, PL_downlink_time,
+                              coding_table[lookup_index(modulation_coding, coding_names), 0],
+                              body_table[body_idx, 0], body_table[body_idx, 1])
+
+# Terms of calculate_link_budget_batch that can be served from tables, as functions of the input fields
+# Data format: term name: (function, names of the input fields passed as its arguments)
+hot_terms = {
+    "G_GS_TX": (lambda f, TAR, D, eff: transmitter_gain(as_float(f) * as_float(TAR), D, eff),
+                ("downlink_freq", "sc_TAR", "antenna_gs_diam", "antenna_gs_eff")),
+    "G_GS_RX": (lambda f, TAR, D, eff: transmitter_gain(as_float(f) * as_float(TAR), D, eff),
+                ("downlink_freq", "sc_TAR", "antenna_sc_diam", "antenna_sc_eff")),
+    "G_SC_TX": (transmitter_gain, ("downlink_freq", "antenna_sc_diam", "antenna_sc_eff")),
+    "G_SC_RX": (transmitter_gain, ("downlink_freq", "antenna_gs_diam", "antenna_gs_eff")),
+    "L_GS_pointing_out_up": (lambda f, TAR, D, offset: pointing_loss(as_float(f) * as_float(TAR), D, offset),
+                             ("downlink_freq", "sc_TAR", "antenna_gs_diam", "gs_pointing_offset_angle")),
+    "L_GS_pointing_in_up": (lambda f, TAR, D, offset: pointing_loss(as_float(f) * as_float(TAR), D, offset),
+                            ("downlink_freq", "sc_TAR", "antenna_sc_diam", "sc_pointing_offset_angle")),
+    "L_SC_pointing_out_down": (pointing_loss, ("downlink_freq", "antenna_sc_diam", "sc_pointing_offset_angle")),
+    "L_SC_pointing_in_down": (pointing_loss, ("downlink_freq", "antenna_gs_diam", "gs_pointing_offset_angle")),
+    "L_GS_space": (lambda f, TAR, body, alt, elong: free_space_loss(as_float(f) * as_float(TAR), body_slant_range(body, alt, elong)),
+                   ("downlink_freq", "sc_TAR", "target_body", "orbit_alt", "elong_angle")),
+    "L_SC_space": (lambda f, body, alt, elong: free_space_loss(f, body_slant_range(body, alt, elong)),
+                   ("downlink_freq", "target_body", "orbit_alt", "elong_angle")),
+    "L_GS_atm": (lambda f, TAR, el, av: _atmosphere(as_float(f) * as_float(TAR), el, av),
+                 ("downlink_freq", "sc_TAR", "gs_elevation_angle", "link_availability")),
+    "L_SC_atm": (_atmosphere, ("downlink_freq", "gs_elevation_angle", "link_availability")),
+    "L_SC_DR": (_data_rate, ("PL_bpp", "PL_SW_angle", "PL_pixel_size", "orbit_alt", "PL_duty_cycle",
+                             "PL_downlink_time", "modulation_coding", "target_body")),
+}
+
+### TABLES ###
+class TermTable:
+    '''A budget term tabulated on a rectilinear grid of input values, evaluated by multilinear interpolation
+
+    axes maps the input fields to increasing grid values (lookup table indices for target_body and
+    modulation_coding); fields in log are interpolated in log coordinates, in which gains and space losses
+    are linear, so these are interpolated exactly, and those in coordinate_transforms in their transform.
+    error_bound [dB] is the larger of the deviation from the direct evaluation measured at the cell centres
+    and the estimate sum_k max h_k^2/8*|f_kk| over the cells of the multilinear interpolation error (h_k the
+    cell width in the interpolation coordinate), plus a 5 % margin; at the grid points the table is exact.'''
+    def __init__(self, term, axes, values, log=(), error_bound=0.0):
+        self.term = term
+        self.axes = {name: np.asarray(grid, dtype=float) for name, grid in axes.items()}
+        self.values = values
+        self.log = tuple(log)
+        self.error_bound = error_bound
+
+    def save(self, path):
+        '''Write the table to path.npy and its axes to path.axes.npz'''
+        np.save(path + ".npy", np.ascontiguousarray(self.values))
+        np.savez(path + ".axes.npz", term=self.term, names=list(self.axes), log=list(self.log),
+                 error_bound=self.error_bound, **{f"axis_{i}": grid for i, grid in enumerate(self.axes.values())})
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        '''Load a saved table, memory-mapped by default so processes opening it share its pages'''
+        with np.load(path + ".axes.npz") as data:
+            names = list(data["names"])
+            axes = {name: data[f"axis_{i}"] for i, name in enumerate(names)}
+            return cls(str(data["term"]), axes, np.load(path + ".npy", mmap_mode=mmap_mode), list(data["log"]),
+                       float(data["error_bound"]))
+
+    def coordinates(self, name, values):
+        '''Translate input values to the (log or transformed) coordinates of an axis'''
+        if name in categorical_fields:
+            values = np.asarray(values)
+            return (values if values.dtype.kind in "fiu" else lookup_index(values, categorical_fields[name])).astype(float)
+        values = as_float(values)
+        if name in coordinate_transforms:
+            with np.errstate(divide="ignore"):
+                return coordinate_transforms[name][0](values)
+        return np.log(values) if name in self.log else values
+
+    def at(self, flat_index):
+        '''Obtain the values at grid points given by their flat (C-order) index (exact, no interpolation)'''
+        return np.take(self.values.reshape(-1), flat_index)
+
+    def __call__(self, inputs):
+        '''Interpolate the term at the points of an {input field: value or array} batch, clamped to the grid'''
+        cells = []
+        for name, grid in self.axes.items():
+            value = inputs[name] if name in inputs else batch_defaults[name]
+            nodes = self.coordinates(name, grid)
+            x = np.clip(self.coordinates(name, value), nodes[0], nodes[-1])
+            if len(nodes) == 1:
+                cells.append((np.zeros(np.shape(x), dtype=np.intp), np.zeros(np.shape(x))))
+                continue
+            i = np.clip(np.searchsorted(nodes, x) - 1, 0, len(nodes) - 2)
+            cells.append((i, (x - nodes[i]) / (nodes[i + 1] - nodes[i])))
+        # Weighted sum over the 2^d corners of the cells
+        result = 0.0
+        for corner in itertools.product((0, 1), repeat=len(cells)):
+            weight = 1.0
+            index = []
+            for (i, u), upper in zip(cells, corner):
+                weight = weight * (u if upper else 1 - u)
+                index.append(np.minimum(i + upper, self.values.shape[len(index)] - 1))
+            result = result + weight * self.values[tuple(index)]
+        return result
+
+def grid_arguments(term, axes, base_inputs):
+    '''Arguments of a hot term with every axis broadcast along its own table dimension'''
+    function, fields = hot_terms[term]
+    names = list(axes)
+    inputs = {**batch_defaults, **base_inputs}
+    args = []
+    for field in fields:
+        if field in axes:
+            shape = [1] * len(names)
+            shape[names.index(field)] = len(axes[field])
+            grid = axes[field].astype(np.intp) if field in categorical_fields else axes[field]
+            args.append(np.reshape(grid, shape))
+        else:
+            args.append(inputs[field])
+    return function, args
+
+def _along(steps, ndim):
+    '''Shape grid steps to broadcast along axis 0 of an ndim-dimensional array'''
+    return steps.reshape((-1,) + (1,) * (ndim - 1))
+
+def build_term_table(term, axes, base_inputs, log=None):
+    '''Tabulate a hot term over axes {input field: grid values}, the other inputs taken from base_inputs
+
+    By default positive numeric axes are interpolated in log coordinates, link_availability in
+    -log(unavailability) (see coordinate_transforms). See TermTable for the error bound.'''
+    axes = {name: np.asarray(lookup_index(grid, categorical_fields[name]) if name in categorical_fields else grid, dtype=float)
+            for name, grid in axes.items()}
+    if log is None:
+        log = [name for name, grid in axes.items()
+               if name not in categorical_fields and name not in coordinate_transforms and grid.min() > 0]
+    shape = tuple(len(grid) for grid in axes.values())
+    function, args = grid_arguments(term, axes, base_inputs)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        values = np.ascontiguousarray(np.broadcast_to(function(*args), shape))
+    table = TermTable(term, axes, values, log)
+
+    # Cell centres along the interpolated axes, grid points along the categorical ones
+    centres = {}
+    for name, grid in axes.items():
+        if name in categorical_fields or len(grid) == 1:
+            centres[name] = grid
+        elif name in coordinate_transforms:
+            transform, inverse = coordinate_transforms[name]
+            centres[name] = inverse((transform(grid[1:]) + transform(grid[:-1])) / 2)
+        elif name in log:
+            centres[name] = np.sqrt(grid[1:] * grid[:-1])
+        else:
+            centres[name] = (grid[1:] + grid[:-1]) / 2
+    function, args = grid_arguments(term, centres, base_inputs)
+    mesh = np.meshgrid(*centres.values(), indexing="ij")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        error = np.abs(function(*args) - table({name: values for name, values in zip(centres, mesh)}))
+    measured = float(np.nanmax(error)) if np.isfinite(error).any() else 0.0
+    # The classic bound sum_k h_k^2/8*max|f_kk|, with f_kk estimated by divided second differences of the table
+    # in the interpolation coordinate, covers terms whose largest error is not at the cell centres (e.g. convex
+    # in log coordinates)
+    estimate = 0.0
+    for axis, name in enumerate(axes):
+        if name not in categorical_fields and len(axes[name]) > 2:
+            nodes = table.coordinates(name, axes[name])
+            slope = np.moveaxis(np.diff(values, axis=axis), axis, 0) / _along(np.diff(nodes), values.ndim)
+            second = 2 * np.diff(slope, axis=0) / _along(nodes[2:] - nodes[:-2], values.ndim)
+            # Second differences are centred on the interior nodes, extrapolate them to the boundary nodes
+            if len(second) > 1:
+                second = np.concatenate([2 * second[:1] - second[1:2], second, 2 * second[-1:] - second[-2:-1]])
+            else:
+                second = np.concatenate([second] * 3)
+            # Each cell takes the larger curvature of its two nodes, scaled by its own width
+            second = np.maximum(np.abs(second[:-1]), np.abs(second[1:])) * _along(np.diff(nodes), values.ndim)**2
+            if np.isfinite(second).any():
+                estimate += float(np.nanmax(second)) / 8
+    # 5 % margin for the cells between the sampled points, plus round-off of the exactly linear terms
+    table.error_bound = 1.05 * max(measured, estimate) + 1e-12
+    return table
+
+def evaluate_term_tables(tables, inputs):
+    '''Interpolate every table at the points of a batch, as the terms argument of calculate_link_budget_batch'''
+    return {table.term: table(inputs) for table in tables}
+
+### SWEEP TABLES ###
+def build_sweep_tables(base_inputs, axes, directory, max_fraction=0.125):
+    '''Tabulate every hot term over the sweep axes it depends on and save the tables to directory
+
+    The grids are the sweep values themselves, so sweep points are looked up exactly. Terms that do not
+    depend on the sweep axes or whose table would hold more than max_fraction of the sweep points are left
+    to direct evaluation.
+    Returns {term: path} of the saved tables.'''
+    size = int(np.prod([len(values) for values in axes.values()]))
+    paths = {}
+    for term, (function, fields) in hot_terms.items():
+        term_axes = {name: values for name, values in axes.items() if name in fields}
+        # Terms independent of the sweep axes are single values, cheap to evaluate directly
+        if not term_axes or int(np.prod([len(values) for values in term_axes.values()])) > max_fraction * size:
+            continue
+        # Grid values are the sweep values, so skip the interpolation error measurement
+        grid = {name: np.asarray(lookup_index(values, categorical_fields[name]) if name in categorical_fields else values, dtype=float)
+                for name, values in term_axes.items()}
+        function, args = grid_arguments(term, grid, base_inputs)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = np.broadcast_to(function(*args), tuple(len(values) for values in grid.values()))
+        paths[term] = os.path.join(directory, term)
+        TermTable(term, grid, values).save(paths[term])
+    return paths
@@ -0,0 +1,253 @@
+import numpy as np
+from core import v_light, boltzmann_const, celestial_body_data, channel_coding_data
+from engine import LinkBudgetResult, uplink_terms, downlink_terms
+from budget_table import BudgetTable
+from propagation import atmospheric_loss, system_noise_temperature
+
+### LOOKUP TABLES ###
+# Index order of the celestial bodies and coding schemes used in the lookup arrays below
+body_names = list(celestial_body_data.keys())
+coding_names = list(channel_coding_data.keys())
+# Data format: columns as in celestial_body_data / channel_coding_data, one row per body/scheme
+body_table = np.array([celestial_body_data[name] for name in body_names], dtype=float)
+coding_table = np.array([channel_coding_data[name] for name in coding_names], dtype=float)
+EARTH = body_names.index("Earth")
+MOON = body_names.index("Moon")
+
+# Values taken for inputs that are missing from a batch (the GUI defaults)
+batch_defaults = {"target_body": "Earth",
+                  "modulation_coding": "Uncoded",
+                  "antenna_sc_eff": 0.55,
+                  "antenna_gs_eff": 0.55,
+                  "gs_pointing_offset_angle": 0.05,
+                  "elong_angle": np.nan,
+                  "temp_sys_uplink": np.nan,
+                  "temp_sys_downlink": np.nan,
+                  "gs_elevation_angle": np.nan,
+                  "link_availability": 99.9}
+
+### CONVERSION FUNCTIONS ###
+def as_float(values):
+    '''Convert a scalar, list or array (numbers or numeric strings) to a float array, empty strings become NaN'''
+    try:
+        return np.asarray(values, dtype=float)
+    except ValueError:
+        values = np.asarray(values, dtype=object)
+        return np.array([float(v) if v not in ("", None) else np.nan for v in values.ravel()]).reshape(values.shape)
+
+def lookup_index(values, names):
+    '''Translate a name (or array of names) to row indices of a lookup table'''
+    if isinstance(values, str):
+        return np.asarray(names.index(values))
+    values = np.asarray(values)
+    if values.dtype.kind in "iu":
+        return values
+    # Translate every distinct name once rather than every element
+    unique, inverse = np.unique(values, return_inverse=True)
+    try:
+        unique_idx = np.array([names.index(name) for name in unique], dtype=np.intp)
+    except ValueError as err:
+        raise KeyError(str(err)) from None
+    return unique_idx[inverse].reshape(values.shape)
+
+### GAIN/LOSS FUNCTIONS ###
+def val_to_dB(num):
+    '''Simple function to translate values to dB'''
+    return 10 * np.log10(num)
+
+def uplink_freq_GHz(freq_dlink_GHz, TAR):
+    '''Obtain uplink frequency [GHz] from downlink frequency and turn around ratio (TAR)'''
+    return as_float(freq_dlink_GHz) * as_float(TAR)
+
+def pointing_loss(freq_GHz, diam, pointing_offset):
+    '''Obtain the pointing loss of the transmitter/receiver'''
+    # Half power angle calculated
+    a_half = 21 / (as_float(freq_GHz) * as_float(diam))
+    # Antenna loss [dB] calculated
+    return 12 * (as_float(pointing_offset) / a_half)**2
+
+def transmitter_gain(freq_transmitter_GHz, transmitter_diam, antenna_efficiency):
+    '''Obtain G_TX [dB] of the transmitter'''
+    # Calculate wavelength of EM radiation
+    wavelength = v_light / (as_float(freq_transmitter_GHz) * 10**9)
+    # Antenna gain [-] calculated
+    gain = as_float(antenna_efficiency) * ((np.pi * as_float(transmitter_diam)) / wavelength)**2
+    # Antenna gain [dB] calculated
+    return val_to_dB(gain)
+
+def free_space_loss(freq_transmitter_GHz, S):
+    '''Obtain the space loss [dB] over a S/C to GS distance S [m]'''
+    # Calculate lambda (wavelength)
+    wavelength = v_light / (as_float(freq_transmitter_GHz) * 10**9)
+    # Calculate space loss [dB]
+    return val_to_dB((wavelength / (4 * np.pi * S))**2)
+
+def space_loss_DS(freq_transmitter_GHz, d_earth_sun, d_sc_sun, elong_angle):
+    '''Obtain the space loss for deep space missions'''
+    d_earth_sun = as_float(d_earth_sun)
+    d_sc_sun = as_float(d_sc_sun)
+    # Calculate S (S/C to GS distance)
+    S = 1000 * np.sqrt(d_earth_sun**2 + d_sc_sun**2 - (2 * d_earth_sun * d_sc_sun * np.cos(np.radians(as_float(elong_angle)))))
+    return free_space_loss(freq_transmitter_GHz, S)
+
+def space_loss(freq_transmitter_GHz, altitude, body_radius):
+    '''Obtain the space loss for near-Earth missions (inlcuding Moon)'''
+    body_radius = as_float(body_radius)
+    # Calculate S (S/C to GS distance)
+    S = np.sqrt((as_float(altitude) + body_radius)**2 - body_radius**2) * 1000
+    return free_space_loss(freq_transmitter_GHz, S)
+
+def body_slant_range(target_body, altitude, elong_angle):
+    '''Obtain S [m] with the near Earth, Moon or deep space geometry per target body'''
+    idx = lookup_index(target_body, body_names)
+    altitude = as_float(altitude)
+    elong_angle = as_float(elong_angle)
+    # Same geometry selection as the scalar engine, without a Python branch per point
+    with np.errstate(invalid="ignore"):
+        R = body_table[idx, 1]
+        d_sc_sun = body_table[idx, 2]
+        d_earth_sun = body_table[EARTH, 2]
+        S_near = np.sqrt((altitude + R)**2 - R**2) * 1000
+        S_DS = 1000 * np.sqrt(d_earth_sun**2 + d_sc_sun**2 - (2 * d_earth_sun * d_sc_sun * np.cos(np.radians(elong_angle))))
+        return np.where(idx == EARTH, S_near, np.where(idx == MOON, d_sc_sun * 1000, S_DS))
+
+def required_data_rate(bits_per_pixel, swath_width, pixel_size, sc_alt, PL_duty_cycle, PL_downlink_time, code_rate, mu, planetary_r):
+    '''Obtain downlink required data rate'''
+    sc_alt = as_float(sc_alt)
+    mu = as_float(mu)
+    planetary_r = as_float(planetary_r)
+    # S/C velocity relative to ground calculated
+    V_ground = np.sqrt(mu / (sc_alt + planetary_r)) * (planetary_r / (planetary_r + sc_alt)) * 1000
+    # Pixel size calculated
+    p_size = 2 * sc_alt * 1000 * np.tan(np.radians(as_float(pixel_size)/(60*2)))
+    # Swath width calculated
+    sw_width = 2 * sc_alt * 1000 * np.tan(np.radians(as_float(swath_width)/2))
+    # Generated data rate calculated
+    R_G = as_float(bits_per_pixel) * ((sw_width * V_ground) / (p_size**2))
+    # Payload-required data rate calculated
+    R_req = R_G * (as_float(PL_duty_cycle)/100) / (as_float(PL_downlink_time)/24)
+    # Transmitted data rate (due to channel coding) calculated
+    R_transmitted = R_req / as_float(code_rate)
+    # Transmitted data rate [dB]
+    return val_to_dB(R_transmitted)
+
+def sys_temp(freq_GHz, uplink=True):
+    '''Obtain signal noise temperature (rough approximation from literature), NaN where core.sys_temp gives ""'''
+    freq_GHz = as_float(freq_GHz)
+    if uplink:
+        conditions = [(0.2 <= freq_GHz) & (freq_GHz <= 20), freq_GHz < 0.2]
+        choices = [614, np.nan]
+        default = 763
+    else:
+        conditions = [freq_GHz < 0.2, (0.2 < freq_GHz) & (freq_GHz <= 2), (2 < freq_GHz) & (freq_GHz <= 20)]
+        choices = [np.nan, 221, 135]
+        default = 424
+    # NaN frequencies (missing input) give NaN temperatures as well
+    return np.where(np.isnan(freq_GHz), np.nan, np.select(conditions, choices, default))
+
+### BATCH LINK BUDGET CALCULATION ###
+def calculate_link_budget_batch(inputs, terms=None):
+    '''Calculate uplink and downlink budgets for a {field: value or array} batch in one vectorized pass
+
+    Fields are those of engine.input_fields; arrays are broadcast against each other. terms may hold
+    precomputed values of the hot terms of term_tables (e.g. looked up from tables), used instead of
+    evaluating them. Returns a LinkBudgetResult whose tables hold unrounded arrays instead of scalars.'''
+    terms = terms or {}
+    inputs = {**batch_defaults, **{k: v for k, v in inputs.items() if v is not None}}
+    body_idx = lookup_index(inputs["target_body"], body_names)
+    coding_idx = lookup_index(inputs["modulation_coding"], coding_names)
+    code_rate = coding_table[coding_idx, 0]
+    SNR_req = coding_table[coding_idx, 1]
+    mu = body_table[body_idx, 0]
+    planetary_r = body_table[body_idx, 1]
+
+    freq_downlink = as_float(inputs["downlink_freq"])
+    freq_uplink = uplink_freq_GHz(freq_downlink, inputs["sc_TAR"])
+    sc_diam = as_float(inputs["antenna_sc_diam"])
+    gs_diam = as_float(inputs["antenna_gs_diam"])
+    sc_eff = as_float(inputs["antenna_sc_eff"])
+    gs_eff = as_float(inputs["antenna_gs_eff"])
+    sc_offset = as_float(inputs["sc_pointing_offset_angle"])
+    gs_offset = as_float(inputs["gs_pointing_offset_angle"])
+    orbit_alt = as_float(inputs["orbit_alt"])
+
+    # Atmospheric losses where a GS elevation angle is given, none elsewhere
+    elevation = as_float(inputs["gs_elevation_angle"])
+    availability = as_float(inputs["link_availability"])
+    atmosphere = ~np.isnan(elevation)
+    if atmosphere.any():
+        if "L_GS_atm" in terms:
+            L_GS_atm = terms["L_GS_atm"]
+        else:
+            L_GS_atm = np.where(atmosphere, atmospheric_loss(freq_uplink, elevation, availability), 0.0)
+        if "L_SC_atm" in terms:
+            L_SC_atm = terms["L_SC_atm"]
+        else:
+            L_SC_atm = np.where(atmosphere, atmospheric_loss(freq_downlink, elevation, availability), 0.0)
+        default_temp_uplink = np.where(atmosphere, system_noise_temperature(freq_uplink), sys_temp(freq_uplink))
+        default_temp_downlink = np.where(atmosphere, system_noise_temperature(freq_downlink, False, L_SC_atm),
+                                         sys_temp(freq_downlink, uplink=False))
+    else:
+        L_GS_atm = L_SC_atm = 0.0
+        default_temp_uplink = sys_temp(freq_uplink)
+        default_temp_downlink = sys_temp(freq_downlink, uplink=False)
+
+    # Missing system noise temperatures default to the values the GUI pre-fills
+    temp_sys_uplink = as_float(inputs["temp_sys_uplink"])
+    temp_sys_uplink = np.where(np.isnan(temp_sys_uplink), default_temp_uplink, temp_sys_uplink)
+    temp_sys_downlink = as_float(inputs["temp_sys_downlink"])
+    temp_sys_downlink = np.where(np.isnan(temp_sys_downlink), default_temp_downlink, temp_sys_downlink)
+
+    # Terms shared by both links
+    if "L_GS_space" not in terms or "L_SC_space" not in terms:
+        S = body_slant_range(body_idx, orbit_alt, inputs["elong_angle"])
+    L_TX = val_to_dB(as_float(inputs["transmitter_LF"]))
+    L_RX = val_to_dB(as_float(inputs["receiver_LF"]))
+    L_boltzmann = val_to_dB(boltzmann_const)
+
+    # UPLINK #
+    P_GS = val_to_dB(as_float(inputs["transmitter_gs_power"]))
+    G_GS_TX = terms["G_GS_TX"] if "G_GS_TX" in terms else transmitter_gain(freq_uplink, gs_diam, gs_eff)
+    L_GS_pointing_out_up = terms["L_GS_pointing_out_up"] if "L_GS_pointing_out_up" in terms else pointing_loss(freq_uplink, gs_diam, gs_offset)
+    L_GS_space = terms["L_GS_space"] if "L_GS_space" in terms else free_space_loss(freq_uplink, S)
+    L_GS_pointing_in_up = terms["L_GS_pointing_in_up"] if "L_GS_pointing_in_up" in terms else pointing_loss(freq_uplink, sc_diam, sc_offset)
+    G_GS_RX = terms["G_GS_RX"] if "G_GS_RX" in terms else transmitter_gain(freq_uplink, sc_diam, sc_eff)
+    L_GS_DR = val_to_dB(as_float(inputs["uplink_datarate_req"]) / code_rate)
+    L_GS_sys_temp = val_to_dB(1/temp_sys_uplink)
+    SNR_uplink = P_GS + L_TX + G_GS_TX - L_GS_pointing_out_up + L_GS_space - L_GS_atm - L_GS_pointing_in_up + L_RX + G_GS_RX - L_GS_DR - L_boltzmann + L_GS_sys_temp
+
+    # DOWNLINK #
+    P_SC = val_to_dB(as_float(inputs["transmitter_sc_power"]))
+    G_SC_TX = terms["G_SC_TX"] if "G_SC_TX" in terms else transmitter_gain(freq_downlink, sc_diam, sc_eff)
+    L_SC_pointing_out_down = terms["L_SC_pointing_out_down"] if "L_SC_pointing_out_down" in terms else pointing_loss(freq_downlink, sc_diam, sc_offset)
+    L_SC_space = terms["L_SC_space"] if "L_SC_space" in terms else free_space_loss(freq_downlink, S)
+    L_SC_pointing_in_down = terms["L_SC_pointing_in_down"] if "L_SC_pointing_in_down" in terms else pointing_loss(freq_downlink, gs_diam, gs_offset)
+    G_SC_RX = terms["G_SC_RX"] if "G_SC_RX" in terms else transmitter_gain(freq_downlink, gs_diam, gs_eff)
+    if "L_SC_DR" in terms:
+        L_SC_DR = terms["L_SC_DR"]
+    else:
+        L_SC_DR = required_data_rate(inputs["PL_bpp"], inputs["PL_SW_angle"], inputs["PL_pixel_size"], orbit_alt,
+                                     inputs["PL_duty_cycle"], inputs["PL_downlink_time"], code_rate, mu, planetary_r)
+    L_SC_sys_temp = val_to_dB(1/temp_sys_downlink)
+    SNR_downlink = P_SC + L_TX + G_SC_TX - L_SC_pointing_out_down + L_SC_space - L_SC_atm - L_SC_pointing_in_down + L_RX + G_SC_RX - L_SC_DR - L_boltzmann + L_SC_sys_temp
+
+    # Tabulate both links, broadcasting every term to the common batch shape
+    uplink_values = [P_GS, L_TX, G_GS_TX, -L_GS_pointing_out_up, L_GS_space, -L_GS_atm, -L_GS_pointing_in_up,
+                     G_GS_RX, L_RX, -L_GS_DR, -L_boltzmann, L_GS_sys_temp, SNR_uplink, SNR_req, SNR_uplink - SNR_req]
+    downlink_values = [P_SC, L_TX, G_SC_TX, -L_SC_pointing_out_down, L_SC_space, -L_SC_atm, -L_SC_pointing_in_down,
+                       G_SC_RX, L_RX, -L_SC_DR, -L_boltzmann, L_SC_sys_temp, SNR_downlink, SNR_req, SNR_downlink - SNR_req]
+    shape = np.broadcast_shapes(*(np.shape(v) for v in uplink_values + downlink_values))
+    uplink_data = {key: (desc, np.broadcast_to(val, shape)) for (key, desc), val in zip(uplink_terms, uplink_values)}
+    downlink_data = {key: (desc, np.broadcast_to(val, shape)) for (key, desc), val in zip(downlink_terms, downlink_values)}
+
+    return LinkBudgetResult(uplink_data, downlink_data)
+
+def calculate_budget_table(inputs, keys=None, terms=None):
+    '''Calculate a batch like calculate_link_budget_batch, returns the results as a BudgetTable (of the terms of keys)'''
+    return BudgetTable.from_result(calculate_link_budget_batch(inputs, terms), keys)
+
+def flatten_result(result, keys=None):
+    '''Flatten a batch LinkBudgetResult to {"uplink_<key>"/"downlink_<key>": array} columns, optionally only for keys
+
+    The columns are views of one BudgetTable, rows flattened in C order.'''
+    return BudgetTable.from_result(result, keys).columns()